@@ -1,25 +1,356 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from flask_sqlalchemy.session import Session
+from dotenv import load_dotenv
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import contextvars
+import functools
+import hashlib
+import logging
+import math
+import multiprocessing
+import numpy as np
+import orjson
 import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import analytics
+import archive
+import broker
+import changes
+import facets
+import graph_codec
+import identifiers
+import ingest
+import layout
+import metrics
+import pattern
+import search_index
+import shards
+from cache import ResponseCache
+from graph_index import AdjacencyCache
+
+# Settings can come from the environment or a backend/.env file
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider encoding with orjson.
+
+    Datetimes are written as ISO-8601 natively, matching `to_dict()`, so rows
+    read straight from the database can be serialized without converting
+    each value first.
+    """
+
+    def encode(self, obj):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        started = time.perf_counter()
+        body = self.encode(obj)
+        record_serialization(time.perf_counter() - started)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Configure CORS to allow requests from frontend
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:8080", "http://localhost:8081", "http://127.0.0.1:8080"],
         "methods": ["GET", "POST", "PUT", "DELETE"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
 # Database configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'forensilink.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'forensilink.db')
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    'pool_pre_ping': True,
+    # JSON columns (metadata, evidence data) are parsed and written with orjson
+    'json_serializer': lambda obj: orjson.dumps(obj).decode(),
+    'json_deserializer': orjson.loads
+}
+# WAL lets readers proceed while a writer commits; NORMAL sync is safe under WAL
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# Rows fetched from the database per chunk when streaming a case graph
+app.config['GRAPH_STREAM_BATCH_SIZE'] = 1000
+# Rows written per transaction by the bulk ingest endpoints
+app.config['BULK_BATCH_SIZE'] = 10000
+# Cases whose adjacency index is kept in memory for path queries
+app.config['ADJACENCY_CACHE_SIZE'] = 8
+# Cases whose typed connection index is kept in memory for pattern queries
+app.config['MATCH_CACHE_SIZE'] = 4
+# Longest a pattern query may search before returning what it found
+app.config['MATCH_TIMEOUT_SECONDS'] = 2.0
+# Most matches one pattern query may return
+app.config['MATCH_MAX_RESULTS'] = 1000
+# Memory budget for cached serialized case and graph payloads
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+# Brotli quality (0-11) for compressed responses; 5 keeps encoding fast
+app.config['BROTLI_QUALITY'] = 5
+# Full-text matches ranked per table before the newest-first cutoff
+app.config['SEARCH_RANK_WINDOW'] = 5000
+# Sampled BFS sources for approximate betweenness in graph analytics
+app.config['ANALYTICS_BETWEENNESS_SAMPLES'] = 64
+# Ideal link length of server-side layouts, in the graph view's pixels
+app.config['LAYOUT_EDGE_LENGTH'] = 150.0
+# Force-directed iterations on the coarsest level of a full layout
+app.config['LAYOUT_ITERATIONS'] = 200
+# Share of unplaced entities above which a layout is recomputed in full
+app.config['LAYOUT_INCREMENTAL_LIMIT'] = 0.5
+# Most nodes plus edges returned by a ?lod= graph or a supernode expansion
+app.config['LOD_MAX_ELEMENTS'] = 2000
+# Most changed rows returned by one /graph/changes call or /stream event
+app.config['GRAPH_CHANGES_PAGE_SIZE'] = 10000
+# Seconds between checks of the change log while /stream clients are connected
+app.config['STREAM_POLL_SECONDS'] = 0.5
+# Events a /stream client may fall behind before its backlog is dropped
+app.config['STREAM_QUEUE_SIZE'] = 64
+# Seconds between keep-alive comments on an idle /stream
+app.config['STREAM_HEARTBEAT_SECONDS'] = 15
+# Requests slower than this are logged with their slowest queries' plans; 0 disables
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 0))
+# File the slow-request log is appended to; the app logger when unset
+app.config['SLOW_REQUEST_LOG'] = os.environ.get('SLOW_REQUEST_LOG')
+# Country code given to phone numbers written without one (see identifiers.py)
+app.config['DEFAULT_COUNTRY_CODE'] = os.environ.get('DEFAULT_COUNTRY_CODE', '91').lstrip('+')
+identifiers.DEFAULT_COUNTRY_CODE = app.config['DEFAULT_COUNTRY_CODE']
+# Upper bound for ?limit= on paginated list endpoints
+app.config['MAX_PAGE_SIZE'] = 1000
+# Uploaded extractions wait here until their ingest job has read them
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(basedir, 'uploads'))
+# Archived cases, one SQLite file each
+app.config['ARCHIVE_FOLDER'] = os.environ.get('ARCHIVE_FOLDER', os.path.join(basedir, 'archive'))
+# Give each new case its own SQLite shard file, with this database as the catalog
+app.config['CASE_SHARDS'] = os.environ.get('CASE_SHARDS', 'false').lower() == 'true'
+# Hot shards of open cases, one SQLite file each
+app.config['SHARD_FOLDER'] = os.environ.get('SHARD_FOLDER', os.path.join(basedir, 'shards'))
+# Compacted, read-only shards of closed cases
+app.config['SHARD_COLD_FOLDER'] = os.environ.get('SHARD_COLD_FOLDER', os.path.join(basedir, 'shards', 'cold'))
+# gzip cold shards; they are unpacked to SHARD_COLD_FOLDER/cache while open
+app.config['SHARD_COLD_COMPRESS'] = os.environ.get('SHARD_COLD_COMPRESS', 'false').lower() == 'true'
+# Shard databases kept open at once; the least recently used is closed first
+app.config['SHARD_POOL_SIZE'] = int(os.environ.get('SHARD_POOL_SIZE', 32))
+# Rows removed per transaction when deleting, archiving or restoring a case
+app.config['CASE_JOB_CHUNK_SIZE'] = int(os.environ.get('CASE_JOB_CHUNK_SIZE', 5000))
+# Worker processes parsing uploaded extractions
+app.config['INGEST_WORKERS'] = int(os.environ.get('INGEST_WORKERS', 2))
+# Entity ids an ingest job remembers as already emitted; older ones are upserted again
+app.config['INGEST_SEEN_IDS'] = int(os.environ.get('INGEST_SEEN_IDS', 100000))
+
+# Engine of the case shard the current request or job works on (see shards.py)
+active_shard = contextvars.ContextVar('active_shard', default=None)
+
+class ShardSession(Session):
+    """Session sending every statement to the active case shard, if there is one"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = active_shard.get()
+        if bind is None and shard is not None:
+            return shard
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': ShardSession})
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply journal, sync and busy-timeout pragmas to each new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    except sqlite3.OperationalError:
+        pass  # Read-only cold shards keep their rollback journal
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.close()
+
+# Instrumentation
+registry = metrics.Registry()
+REQUEST_SECONDS = registry.histogram(
+    'forensilink_http_request_duration_seconds', 'Request latency by route (streamed bodies excluded)',
+    metrics.TIME_BUCKETS, ('method', 'route'))
+REQUESTS = registry.counter(
+    'forensilink_http_requests_total', 'Requests by route and status', ('method', 'route', 'status'))
+RESPONSE_BYTES = registry.histogram(
+    'forensilink_http_response_bytes', 'Response body size by route (streamed bodies excluded)',
+    metrics.SIZE_BUCKETS, ('method', 'route'))
+REQUEST_STATEMENTS = registry.histogram(
+    'forensilink_db_statements_per_request', 'SQL statements issued per request',
+    metrics.COUNT_BUCKETS, ('method', 'route'))
+REQUEST_DB_SECONDS = registry.histogram(
+    'forensilink_db_seconds_per_request', 'Time spent executing SQL per request',
+    metrics.TIME_BUCKETS, ('method', 'route'))
+REQUEST_SERIALIZE_SECONDS = registry.histogram(
+    'forensilink_serialize_seconds_per_request', 'Time spent encoding and compressing response bodies',
+    metrics.TIME_BUCKETS, ('method', 'route'))
+STATEMENT_SECONDS = registry.histogram(
+    'forensilink_db_statement_duration_seconds', 'SQL statement latency by operation and origin',
+    metrics.TIME_BUCKETS, ('operation', 'origin'))
+WRITE_LOCK_SECONDS = registry.histogram(
+    'forensilink_db_write_lock_seconds',
+    "Duration of the first write in each SQLite transaction, which takes the write lock "
+    "and includes any busy wait for it", metrics.TIME_BUCKETS)
+LOCK_ERRORS = registry.counter(
+    'forensilink_db_lock_errors_total', "Statements that failed with 'database is locked'")
+
+# Statements that take SQLite's write lock
+WRITE_OPERATIONS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+slow_request_log = logging.getLogger('forensilink.slow_requests')
+if app.config['SLOW_REQUEST_LOG']:
+    slow_request_log.addHandler(logging.FileHandler(app.config['SLOW_REQUEST_LOG']))
+
+class RequestStats:
+    """SQL and serialization time accumulated while one request is handled"""
+
+    # Slowest statements kept for the slow-request log
+    KEEP = 5
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.slowest = []
+
+    def add_statement(self, statement, parameters, elapsed):
+        self.statements += 1
+        self.db_seconds += elapsed
+        if app.config['SLOW_REQUEST_MS']:
+            self.slowest.append((elapsed, statement, parameters))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.KEEP:]
 
-db = SQLAlchemy(app)
+def request_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+def record_serialization(seconds):
+    stats = request_stats()
+    if stats:
+        stats.serialize_seconds += seconds
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    """Time every SQL statement, per request and per operation"""
+    elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+    operation = statement.split(None, 1)[0].upper() if statement.strip() else ''
+    stats = request_stats()
+    STATEMENT_SECONDS.observe(elapsed, operation, 'request' if has_request_context() else 'background')
+    if conn.dialect.name == 'sqlite' and operation in WRITE_OPERATIONS and not conn.info.get('write_locked'):
+        conn.info['write_locked'] = True
+        WRITE_LOCK_SECONDS.observe(elapsed)
+    if stats:
+        stats.add_statement(statement, parameters[0] if executemany and parameters else parameters, elapsed)
+
+@event.listens_for(Engine, 'commit', insert=True)
+def publish_commit(conn):
+    """Wake the /stream broker when a transaction that wrote commits"""
+    if conn.info.get('write_locked'):
+        change_broker.notify()
+        for shard_broker in list(shard_brokers.values()):
+            shard_broker.notify()
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def release_write_lock(conn):
+    conn.info.pop('write_locked', None)
+
+@event.listens_for(Engine, 'handle_error')
+def record_statement_error(context):
+    if context.connection is not None and context.connection.info.get('statement_started'):
+        context.connection.info['statement_started'].pop()
+    if 'database is locked' in str(context.original_exception):
+        LOCK_ERRORS.inc()
+
+@app.before_request
+def start_request_stats():
+    g.request_stats = RequestStats()
+
+@app.after_request
+def record_request(response):
+    """Record route metrics, and log the request if it was slow"""
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(request.method, route, response.status_code)
+    REQUEST_SECONDS.observe(elapsed, request.method, route)
+    REQUEST_STATEMENTS.observe(stats.statements, request.method, route)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, request.method, route)
+    REQUEST_SERIALIZE_SECONDS.observe(stats.serialize_seconds, request.method, route)
+    # Streamed bodies have no length yet; measuring one would buffer it whole
+    size = None if response.is_streamed else response.calculate_content_length()
+    if size is not None:
+        RESPONSE_BYTES.observe(size, request.method, route)
+    if app.config['SLOW_REQUEST_MS'] and elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+        log_slow_request(stats, route, elapsed, response)
+    return response
+
+def query_plan(statement, parameters):
+    """Plan of a SELECT as a list of lines, or None if it cannot be explained"""
+    if statement.split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+        return None
+    connection = db.session.connection()
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    try:
+        rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+    except SQLAlchemyError:
+        return None
+    return [str(row[-1]) for row in rows]
+
+def log_slow_request(stats, route, elapsed, response):
+    """Write one JSON line describing a slow request and its slowest statements"""
+    slow_request_log.warning(orjson.dumps({
+        'time': datetime.utcnow(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': route,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+        'statements': stats.statements,
+        'db_ms': round(stats.db_seconds * 1000, 1),
+        'serialize_ms': round(stats.serialize_seconds * 1000, 1),
+        'slowest': [
+            {'ms': round(seconds * 1000, 2), 'sql': ' '.join(statement.split()),
+             'plan': query_plan(statement, parameters)}
+            for seconds, statement, parameters in stats.slowest
+        ]
+    }, default=str).decode())
 
 # Models
 class Case(db.Model):
@@ -33,6 +364,10 @@ class Case(db.Model):
     officer_id = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every write to the case or its graph; keys cached responses
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # None while the case's rows are in this database, else 'hot' or 'cold' shard
+    storage = db.Column(db.String(10))
     
     # Relationships
     entities = db.relationship('Entity', backref='case', lazy=True, cascade='all, delete-orphan')
@@ -47,11 +382,17 @@ class Case(db.Model):
             'crime_type': self.crime_type,
             'officer_id': self.officer_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'storage': self.storage
         }
 
 class Entity(db.Model):
     __tablename__ = 'entities'
+    __table_args__ = (
+        db.Index('ix_entities_case_id_type', 'case_id', 'type'),
+        db.Index('ix_entities_case_id_id', 'case_id', 'id'),
+        db.Index('ix_entities_case_id_timestamp', 'case_id', 'timestamp'),
+    )
     
     id = db.Column(db.String(50), primary_key=True)
     case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), nullable=False)
@@ -76,6 +417,12 @@ class Entity(db.Model):
 
 class Connection(db.Model):
     __tablename__ = 'connections'
+    __table_args__ = (
+        db.Index('ix_connections_case_id_source', 'case_id', 'source'),
+        db.Index('ix_connections_case_id_target', 'case_id', 'target'),
+        db.Index('ix_connections_case_timeline', 'case_id', 'timestamp', 'type'),
+        db.Index('ix_connections_case_id_id', 'case_id', 'id'),
+    )
     
     id = db.Column(db.String(50), primary_key=True)
     case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), nullable=False)
@@ -98,29 +445,524 @@ class Connection(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
+# Columns of each model's API representation, in to_dict() order and named as
+# in the API; read endpoints select these instead of loading ORM objects
+API_COLUMNS = {
+    Case: [Case.id, Case.title, Case.description, Case.status, Case.crime_type,
+           Case.officer_id, Case.created_at, Case.updated_at, Case.storage],
+    Entity: [Entity.id, Entity.case_id, Entity.label, Entity.type, Entity.size, Entity.icon,
+             Entity.meta_data.label('metadata'), Entity.timestamp],
+    Connection: [Connection.id, Connection.case_id, Connection.source, Connection.target,
+                 Connection.type, Connection.weight, Connection.data, Connection.timestamp],
+}
+
+def api_select(query, model, columns=None, **execution_options):
+    """Execute an ORM query as a Core select of the model's API columns.
+
+    The statement runs on the session's connection, so rows come back as
+    plain tuples without ORM objects or identity-map bookkeeping.
+    """
+    statement = query.with_entities(*(columns or API_COLUMNS[model])).statement
+    return db.session.connection().execution_options(**execution_options).execute(statement)
+
+def api_rows(query, model, columns=None):
+    """Rows of an ORM query as API dicts"""
+    result = api_select(query, model, columns)
+    names = list(result.keys())
+    return [dict(zip(names, row)) for row in result]
+
+class CaseAnalytics(db.Model):
+    __tablename__ = 'case_analytics'
+    
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)  # Case.version the results were computed from
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Float)
+    entity_count = db.Column(db.Integer)
+    connection_count = db.Column(db.Integer)
+    component_count = db.Column(db.Integer)
+    community_count = db.Column(db.Integer)
+    betweenness_exact = db.Column(db.Boolean)
+    
+    def to_dict(self):
+        return {
+            'case_id': self.case_id,
+            'version': self.version,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None,
+            'duration_ms': self.duration_ms,
+            'entity_count': self.entity_count,
+            'connection_count': self.connection_count,
+            'component_count': self.component_count,
+            'community_count': self.community_count,
+            'betweenness_exact': self.betweenness_exact
+        }
+
+class EntityAnalytics(db.Model):
+    __tablename__ = 'entity_analytics'
+    
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), primary_key=True)
+    entity_id = db.Column(db.String(50), primary_key=True)
+    degree = db.Column(db.Integer)
+    weighted_degree = db.Column(db.Float)
+    pagerank = db.Column(db.Float)
+    betweenness = db.Column(db.Float)
+    component = db.Column(db.Integer)
+    community = db.Column(db.Integer)
+    
+    def to_dict(self):
+        return {
+            'entity_id': self.entity_id,
+            'degree': self.degree,
+            'weighted_degree': self.weighted_degree,
+            'pagerank': self.pagerank,
+            'betweenness': self.betweenness,
+            'component': self.component,
+            'community': self.community
+        }
+
+class CaseLayout(db.Model):
+    __tablename__ = 'case_layouts'
+    
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)  # Case.version the positions were computed from
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Float)
+    mode = db.Column(db.String(20))  # full, incremental
+    entity_count = db.Column(db.Integer)
+    placed_count = db.Column(db.Integer)  # Entities positioned by the latest run
+    
+    def to_dict(self):
+        return {
+            'case_id': self.case_id,
+            'version': self.version,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None,
+            'duration_ms': self.duration_ms,
+            'mode': self.mode,
+            'entity_count': self.entity_count,
+            'placed_count': self.placed_count
+        }
+
+class EntityLayout(db.Model):
+    __tablename__ = 'entity_layouts'
+    
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), primary_key=True)
+    entity_id = db.Column(db.String(50), primary_key=True)
+    x = db.Column(db.Float, nullable=False)
+    y = db.Column(db.Float, nullable=False)
+
+class EntityIdentifier(db.Model):
+    __tablename__ = 'entity_identifiers'
+    __table_args__ = (
+        db.Index('ix_entity_identifiers_case_id_entity_id', 'case_id', 'entity_id'),
+        db.Index('ix_entity_identifiers_entity_id', 'entity_id'),
+    )
+    
+    # Normalized identifier value (see identifiers.py); leads the key so lookups are one seek
+    value = db.Column(db.String(255), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)  # phone, imei, imsi, email, wallet, account, vehicle
+    entity_id = db.Column(db.String(50), primary_key=True)
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), nullable=False)
+    
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'value': self.value,
+            'entity_id': self.entity_id,
+            'case_id': self.case_id
+        }
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # ufdr_ingest or case_<action> (see CASE_JOBS)
+    case_id = db.Column(db.String(50), db.ForeignKey('cases.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    filename = db.Column(db.String(255))
+    bytes_total = db.Column(db.BigInteger)
+    bytes_read = db.Column(db.BigInteger, default=0)
+    records_read = db.Column(db.Integer, default=0)
+    entities_written = db.Column(db.Integer, default=0)
+    connections_written = db.Column(db.Integer, default=0)
+    # Rows to delete or move, for case jobs
+    rows_total = db.Column(db.Integer)
+    rows_done = db.Column(db.Integer, default=0)
+    elapsed_seconds = db.Column(db.Float)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        rows = (self.entities_written or 0) + (self.connections_written or 0) + (self.rows_done or 0)
+        if self.bytes_total:
+            progress = round((self.bytes_read or 0) / self.bytes_total, 4)
+        elif self.rows_total is not None:
+            progress = round((self.rows_done or 0) / self.rows_total, 4) if self.rows_total else 1.0
+        else:
+            progress = None
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'case_id': self.case_id,
+            'status': self.status,
+            'filename': self.filename,
+            'bytes_total': self.bytes_total,
+            'bytes_read': self.bytes_read,
+            'progress': progress,
+            'records_read': self.records_read,
+            'entities_written': self.entities_written,
+            'connections_written': self.connections_written,
+            'rows_total': self.rows_total,
+            'rows_done': self.rows_done,
+            'rows_per_second': round(rows / self.elapsed_seconds, 1) if self.elapsed_seconds else None,
+            'elapsed_seconds': self.elapsed_seconds,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+def entity_values(case_id, data):
+    """Column values for an entity posted to the API"""
+    return {
+        'id': data['id'],
+        'case_id': case_id,
+        'label': data['label'],
+        'type': data['type'],
+        'size': data.get('size', 50),
+        'icon': data.get('icon'),
+        'meta_data': data.get('metadata'),
+        'timestamp': datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None
+    }
+
+def connection_values(case_id, data):
+    """Column values for a connection posted to the API"""
+    weight = data.get('weight', 1)
+    # Paths cost 1 / weight, so only positive weights are meaningful
+    if isinstance(weight, bool) or not isinstance(weight, int) or weight <= 0:
+        raise ValueError('weight must be a positive integer')
+    return {
+        'id': data['id'],
+        'case_id': case_id,
+        'source': data['source'],
+        'target': data['target'],
+        'type': data['type'],
+        'weight': weight,
+        'data': data.get('data'),
+        'timestamp': datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None
+    }
+
+def load_adjacency_rows(case_id):
+    """(id, source, target, weight) of every connection in a case"""
+    return db.session.execute(
+        db.select(Connection.id, Connection.source, Connection.target, Connection.weight)
+        .where(Connection.case_id == case_id)
+    )
+
+adjacency_cache = AdjacencyCache(load_adjacency_rows, maxsize=app.config['ADJACENCY_CACHE_SIZE'])
+
+def load_match_rows(case_id):
+    """(id, type) of every entity and (id, source, target, type, weight, timestamp) of every connection"""
+    entities = db.session.execute(
+        db.select(Entity.id, Entity.type).where(Entity.case_id == case_id)
+    ).all()
+    connections = db.session.execute(
+        db.select(Connection.id, Connection.source, Connection.target, Connection.type,
+                  Connection.weight, Connection.timestamp)
+        .where(Connection.case_id == case_id)
+    )
+    return entities, connections
+
+match_cache = AdjacencyCache(load_match_rows, maxsize=app.config['MATCH_CACHE_SIZE'],
+                             build=lambda rows: pattern.MatchIndex(*rows))
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_MAX_BYTES'])
+registry.gauge('forensilink_response_cache_bytes', 'Bytes held by the response cache',
+               lambda: response_cache.stats()['bytes'])
+registry.read_counter('forensilink_response_cache_hits_total', 'Response cache hits',
+                      lambda: response_cache.stats()['hits'])
+registry.read_counter('forensilink_response_cache_misses_total', 'Response cache misses',
+                      lambda: response_cache.stats()['misses'])
+registry.read_counter('forensilink_response_cache_evictions_total', 'Response cache evictions',
+                      lambda: response_cache.stats()['evictions'])
+
+def bump_case_version(case_id, conn=None):
+    """Invalidate cached views of a case; call before committing a write"""
+    (conn or db.session).execute(
+        db.update(Case).where(Case.id == case_id).values(version=Case.version + 1)
+    )
+
+def case_version(case_id):
+    """(created_at, version) of a case, or None if it does not exist.
+
+    `created_at` is part of the key so a deleted and recreated case id never
+    matches payloads or ETags of its predecessor.
+    """
+    row = db.session.execute(
+        db.select(Case.created_at, Case.version).where(Case.id == case_id)
+    ).first()
+    return (row.created_at.isoformat() if row.created_at else '', row.version) if row else None
+
+# Tables a case shard holds; the catalog keeps cases, jobs and identifiers
+SHARD_TABLES = ['entities', 'connections', 'entity_analytics', 'entity_layouts', 'case_analytics', 'case_layouts']
+# Endpoints acting on the case row only, which stay on the catalog
+CATALOG_ENDPOINTS = {'update_case', 'delete_case', 'archive_case', 'restore_case', 'shard_case'}
+# POST endpoints that only read, so they may run on a cold shard
+READ_ONLY_POSTS = {'match_pattern'}
+# Case statuses while a job moves the case's rows or shard file
+SHARD_BUSY_STATUSES = {'sharding', 'compacting', 'thawing'}
+
+shard_pool = shards.ShardPool(
+    make_url(app.config['SQLALCHEMY_DATABASE_URI']).database, app.config['SHARD_POOL_SIZE'],
+    os.path.join(app.config['SHARD_COLD_FOLDER'], 'cache'), pool_size=4, max_overflow=16,
+    json_serializer=app.config['SQLALCHEMY_ENGINE_OPTIONS']['json_serializer'],
+    json_deserializer=app.config['SQLALCHEMY_ENGINE_OPTIONS']['json_deserializer']
+)
+registry.gauge('forensilink_shards_open', 'Case shard databases open in this process',
+               lambda: shard_pool.stats()['open'])
+
+def case_storage(case_id):
+    """(storage, status) of a case from the catalog; (None, None) if it does not exist"""
+    with db.engine.connect() as conn:
+        row = conn.execute(db.select(Case.storage, Case.status).where(Case.id == case_id)).first()
+    return tuple(row) if row else (None, None)
+
+def shard_engine(case_id, storage):
+    """Engine of a case's hot shard, or read-only engine of its cold one"""
+    if storage == 'hot':
+        return shard_pool.get(shards.shard_path(app.config['SHARD_FOLDER'], case_id))
+    path = shards.cold_path(app.config['SHARD_COLD_FOLDER'], case_id)
+    if path is None:
+        raise FileNotFoundError(f'No cold shard for case {case_id}')
+    return shard_pool.get(path, readonly=True)
+
+@contextmanager
+def case_scope(case_id):
+    """Run the session's statements on a case's shard, if it has one; yields its storage"""
+    storage = case_storage(case_id)[0] if case_id else None
+    token = active_shard.set(shard_engine(case_id, storage) if storage else None)
+    try:
+        yield storage
+    finally:
+        active_shard.reset(token)
+
+def create_case_shard(case_id):
+    """Create an empty hot shard for a new case.
+
+    A file left behind by a deleted case with the same id is replaced; one
+    holding another case raises FileExistsError.
+    """
+    from migrate import create_shard
+
+    path = shards.shard_path(app.config['SHARD_FOLDER'], case_id)
+    shards.check_owner(path, case_id)
+    shard_pool.release(path)
+    shards.remove(path)
+    shards.create(path, lambda conn: create_shard(conn, case_id))
+
+def remove_case_shard(path, case_id):
+    """Remove a shard file of a case, unless it holds another case"""
+    shards.check_owner(path, case_id)
+    shard_pool.release(path)
+    shards.remove(path)
+
+def drop_case_shard(case_id):
+    """Remove every shard file of a deleted case"""
+    paths = [shards.shard_path(app.config['SHARD_FOLDER'], case_id)]
+    paths += [shards.shard_path(app.config['SHARD_COLD_FOLDER'], case_id, compressed) for compressed in (False, True)]
+    for path in paths:
+        remove_case_shard(path, case_id)
+
+@app.before_request
+def route_case_shard():
+    """Send the queries of a sharded case's routes to its shard.
+
+    Writes are refused while the case is in cold storage or a job is moving
+    its rows or shard file.
+    """
+    case_id = (request.view_args or {}).get('case_id')
+    if not case_id or request.endpoint in CATALOG_ENDPOINTS:
+        return None
+    storage, status = case_storage(case_id)
+    if request.method != 'GET' and request.endpoint not in READ_ONLY_POSTS:
+        if storage == 'cold':
+            return jsonify({'error': 'Case is closed and in cold storage; reopen it to change it'}), 409
+        if status in SHARD_BUSY_STATUSES:
+            return jsonify({'error': f'Case is {status}; try again once its job completes'}), 409
+    if storage:
+        g.shard_token = active_shard.set(shard_engine(case_id, storage))
+    return None
+
+@app.teardown_request
+def leave_case_shard(exc):
+    token = g.pop('shard_token', None)
+    if token is not None:
+        active_shard.reset(token)
+
+def cached_case_response(case_id, build, media_type='application/json', encode=None, variant=None):
+    """Serve `build()` from the response cache with ETag revalidation.
+
+    Payloads are keyed by request path, media type, content encoding and case
+    version, so repeated reads of an unchanged case skip the database,
+    serializer and compressor entirely and `If-None-Match` requests get a 304.
+    `variant` is added to the key for payloads that also depend on data
+    written without a version bump, such as stored layouts.
+    Payloads are brotli- or gzip-compressed when the client accepts it.
+    """
+    encode = encode or app.json.encode
+    version = case_version(case_id)
+    if version is None:
+        return Response(encode(build()), mimetype=media_type)
+
+    encoding = graph_codec.negotiate_encoding(request.accept_encodings)
+    key = (case_id, version, request.full_path, media_type, encoding, variant)
+    payload = response_cache.get(key)
+    if payload is None:
+        body = build()
+        started = time.perf_counter()
+        payload = graph_codec.compress(encode(body), encoding, app.config['BROTLI_QUALITY'])
+        record_serialization(time.perf_counter() - started)
+        response_cache.set(key, payload)
+
+    response = Response(payload, mimetype=media_type)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    response.set_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# API field names that differ from their column names
+FIELD_ALIASES = {'meta_data': 'metadata'}
+
+def requested_fields():
+    """Names listed in ?fields=, or None when it is absent"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(',') if name.strip()]
+
+def selected_columns(model, extras=()):
+    """Resolve ?fields= to columns labelled with their API names, or None for all
+
+    Names in `extras` are accepted too; they are fields added after the query.
+    """
+    names = requested_fields()
+    if names is None:
+        return None
+
+    available = {FIELD_ALIASES.get(column.name, column.name): column
+                 for column in model.__table__.columns}
+    unknown = [name for name in names if name not in available and name not in extras]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    names = [name for name in names if name in available]
+    if 'id' not in names:
+        names.insert(0, 'id')
+    return [available[name].label(name) for name in names]
+
+def positive_arg(name, default=None):
+    """Integer query argument `name`; ValueError if it is given and below 1"""
+    value = request.args.get(name, default, type=int)
+    if value is not None and value < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return value
+
+def list_response(model, query, extras=None):
+    """Serialize a list query, honouring ?fields=, ?limit= and ?after=
+
+    Pagination is keyset-based on the primary key, so every page costs the
+    same index seek however deep it is. Without ?limit= the plain list is
+    returned as before; with it the response is `{"items", "next_cursor"}`
+    and `next_cursor` is passed back as ?after= to fetch the next page.
+    `extras` maps further field names to functions adding them to the items
+    of the page, included unless ?fields= leaves them out.
+    """
+    extras = extras or {}
+    try:
+        columns = selected_columns(model, extras)
+        limit = positive_arg('limit')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    after = request.args.get('after')
+    if after:
+        query = query.filter(model.id > after)
+    if limit is not None or after:
+        limit = min(limit or app.config['MAX_PAGE_SIZE'], app.config['MAX_PAGE_SIZE'])
+        query = query.order_by(model.id).limit(limit + 1)
+
+    items = api_rows(query, model, columns)
+
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1]['id']
+    fields = requested_fields()
+    for name, add in extras.items():
+        if fields is None or name in fields:
+            add(items)
+    if limit is None:
+        return jsonify(items)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+def add_case_stats(items):
+    """Set `stats` on case dicts: entity and connection counts by type and time span
+
+    The counts are read from the aggregates the facets triggers maintain;
+    sharded cases keep theirs in their shard.
+    """
+    case_ids = [item['id'] for item in items]
+    sharded = dict(db.session.execute(
+        db.select(Case.id, Case.storage).where(Case.id.in_(case_ids), Case.storage.is_not(None))
+    ).all()) if case_ids else {}
+    found = facets.stats(db.session.connection(), [case_id for case_id in case_ids if case_id not in sharded],
+                         live=db.engine.dialect.name != 'sqlite')
+    for case_id, storage in sharded.items():
+        with shard_engine(case_id, storage).connect() as conn:
+            # Cold shards compacted before the aggregates existed are counted
+            found.update(facets.stats(conn, [case_id], live=not facets.materialized(conn)))
+    for item in items:
+        item['stats'] = found[item['id']]
+
 # Routes
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    """API status, including a database round trip"""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except SQLAlchemyError as e:
+        return jsonify({'status': 'unhealthy', 'message': 'Database unavailable', 'error': str(e)}), 503
     return jsonify({'status': 'healthy', 'message': 'Forensi-Link API is running'})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL and cache metrics in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit, miss and eviction counters of the response cache"""
+    return jsonify(response_cache.stats())
+
 @app.route('/api/cases', methods=['GET'])
 def get_cases():
-    """Get all cases"""
-    cases = Case.query.all()
-    return jsonify([case.to_dict() for case in cases])
+    """Get all cases with their statistics (supports ?fields=, ?limit= and ?after=)"""
+    return list_response(Case, Case.query, {'stats': add_case_stats})
 
 @app.route('/api/cases/<case_id>', methods=['GET'])
 def get_case(case_id):
     """Get a specific case with its entities and connections"""
     case = Case.query.get_or_404(case_id)
-    entities = Entity.query.filter_by(case_id=case_id).all()
-    connections = Connection.query.filter_by(case_id=case_id).all()
-    
-    return jsonify({
-        'case': case.to_dict(),
-        'entities': [entity.to_dict() for entity in entities],
-        'connections': [conn.to_dict() for conn in connections]
-    })
+
+    def build():
+        return {
+            'case': case.to_dict(),
+            'entities': api_rows(Entity.query.filter_by(case_id=case_id), Entity),
+            'connections': api_rows(Connection.query.filter_by(case_id=case_id), Connection)
+        }
+
+    return cached_case_response(case_id, build)
 
 @app.route('/api/cases', methods=['POST'])
 def create_case():
@@ -137,6 +979,14 @@ def create_case():
     )
     
     db.session.add(case)
+    if app.config['CASE_SHARDS'] and db.engine.dialect.name == 'sqlite':
+        db.session.flush()
+        try:
+            create_case_shard(case.id)
+        except FileExistsError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 409
+        case.storage = 'hot'
     db.session.commit()
     
     return jsonify(case.to_dict()), 201
@@ -146,89 +996,1436 @@ def update_case(case_id):
     """Update a case"""
     case = Case.query.get_or_404(case_id)
     data = request.json
+    status = data.get('status', case.status)
+    # Closing a sharded case compacts it into the cold tier; reopening thaws it
+    tier_job = None
+    if case.storage == 'hot' and status == 'closed' and case.status != 'closed':
+        tier_job = 'compact'
+    elif case.storage == 'cold' and status != 'closed':
+        tier_job = 'thaw'
     
     case.title = data.get('title', case.title)
     case.description = data.get('description', case.description)
-    case.status = data.get('status', case.status)
+    case.status = case.status if tier_job else status
     case.crime_type = data.get('crime_type', case.crime_type)
     case.officer_id = data.get('officer_id', case.officer_id)
+    case.version = Case.version + 1
     
+    if tier_job:
+        # Committed with the job, or rolled back if it cannot start
+        return start_case_job(case_id, tier_job, status)
     db.session.commit()
     
     return jsonify(case.to_dict())
 
 @app.route('/api/cases/<case_id>', methods=['DELETE'])
 def delete_case(case_id):
-    """Delete a case"""
-    case = Case.query.get_or_404(case_id)
-    db.session.delete(case)
-    db.session.commit()
-    
-    return jsonify({'message': 'Case deleted successfully'}), 200
+    """Delete a case and all of its rows in a background job (see run_case_job)"""
+    return start_case_job(case_id, 'delete')
 
 @app.route('/api/cases/<case_id>/entities', methods=['GET'])
 def get_entities(case_id):
-    """Get all entities for a case"""
-    entities = Entity.query.filter_by(case_id=case_id).all()
-    return jsonify([entity.to_dict() for entity in entities])
+    """Get all entities for a case (supports ?fields=, ?limit= and ?after=)"""
+    return list_response(Entity, Entity.query.filter_by(case_id=case_id))
 
 @app.route('/api/cases/<case_id>/entities', methods=['POST'])
 def create_entity(case_id):
     """Create a new entity for a case"""
     data = request.json
     
-    entity = Entity(
-        id=data['id'],
-        case_id=case_id,
-        label=data['label'],
-        type=data['type'],
-        size=data.get('size', 50),
-        icon=data.get('icon'),
-        meta_data=data.get('metadata'),
-        timestamp=datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None
-    )
+    entity = Entity(**entity_values(case_id, data))
     
     db.session.add(entity)
+    db.session.flush()
+    identifiers.sync(db.session, [entity.id])
+    bump_case_version(case_id)
     db.session.commit()
     
     return jsonify(entity.to_dict()), 201
 
 @app.route('/api/cases/<case_id>/connections', methods=['GET'])
 def get_connections(case_id):
-    """Get all connections for a case"""
-    connections = Connection.query.filter_by(case_id=case_id).all()
-    return jsonify([conn.to_dict() for conn in connections])
+    """Get all connections for a case (supports ?fields=, ?limit= and ?after=)"""
+    return list_response(Connection, Connection.query.filter_by(case_id=case_id))
 
 @app.route('/api/cases/<case_id>/connections', methods=['POST'])
 def create_connection(case_id):
     """Create a new connection for a case"""
     data = request.json
     
-    connection = Connection(
-        id=data['id'],
-        case_id=case_id,
-        source=data['source'],
-        target=data['target'],
-        type=data['type'],
-        weight=data.get('weight', 1),
-        data=data.get('data'),
-        timestamp=datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None
-    )
+    try:
+        connection = Connection(**connection_values(case_id, data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     db.session.add(connection)
+    bump_case_version(case_id)
     db.session.commit()
     
     return jsonify(connection.to_dict()), 201
 
+def read_bulk_rows():
+    """Yield (index, row) from a JSON array or NDJSON request body.
+
+    NDJSON bodies are read line by line from the request stream so large
+    uploads are never buffered whole. Unparseable lines are yielded as the
+    exception so the caller can report them against their index.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        index = 0
+        pending = b''
+        while True:
+            chunk = request.stream.read(65536)
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop() if chunk else b''
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield index, orjson.loads(line)
+                except ValueError as e:
+                    yield index, e
+                index += 1
+            if not chunk:
+                return
+
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise ValueError('Request body must be a JSON array or NDJSON')
+    yield from enumerate(rows)
+
+def upsert_statement(model, on_conflict):
+    """INSERT for `model` that updates or skips rows whose id already exists.
+
+    Existing rows are only overwritten when they belong to the same case, so a
+    colliding id from another case is counted as skipped rather than moved.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = model.__table__
+    statement = insert(table)
+    if on_conflict == 'skip':
+        return statement.on_conflict_do_nothing(index_elements=['id'])
+    return statement.on_conflict_do_update(
+        index_elements=['id'],
+        set_={column.name: statement.excluded[column.name]
+              for column in table.columns if column.name != 'id'},
+        where=table.c.case_id == statement.excluded.case_id
+    )
+
+def write_bulk_batch(case_id, model, statement, batch, errors):
+    """Write one batch in a single transaction; return the rows written.
+
+    If the batch fails as a whole it is retried row by row inside savepoints,
+    so one bad row is reported in `errors` without losing the rest.
+    """
+    try:
+        written = db.session.execute(statement, [values for _, values in batch]).rowcount
+    except SQLAlchemyError:
+        db.session.rollback()
+        written = 0
+        for index, values in batch:
+            try:
+                with db.session.begin_nested():
+                    written += db.session.execute(statement, [values]).rowcount
+            except SQLAlchemyError as e:
+                errors.append({'index': index, 'id': values.get('id'), 'error': str(getattr(e, 'orig', None) or e)})
+    if model is Entity:
+        identifiers.sync(db.session, [values['id'] for _, values in batch])
+    bump_case_version(case_id)
+    db.session.commit()
+    return written
+
+def bulk_ingest(case_id, model, build_values):
+    """Insert or upsert rows posted to a `:bulk` endpoint in batched transactions"""
+    Case.query.get_or_404(case_id)
+    on_conflict = request.args.get('on_conflict', 'update')
+    if on_conflict not in ('update', 'skip'):
+        return jsonify({'error': "on_conflict must be 'update' or 'skip'"}), 400
+
+    statement = upsert_statement(model, on_conflict)
+    batch_size = app.config['BULK_BATCH_SIZE']
+    errors = []
+    batch = []
+    received = written = 0
+    try:
+        for index, row in read_bulk_rows():
+            received += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                if not isinstance(row, dict):
+                    raise ValueError('Row must be a JSON object')
+                batch.append((index, build_values(case_id, row)))
+            except KeyError as e:
+                errors.append({'index': index, 'error': f'Missing field {e}'})
+            except (TypeError, ValueError) as e:
+                errors.append({'index': index, 'id': row.get('id') if isinstance(row, dict) else None,
+                               'error': str(e)})
+            if len(batch) >= batch_size:
+                written += write_bulk_batch(case_id, model, statement, batch, errors)
+                batch = []
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if batch:
+        written += write_bulk_batch(case_id, model, statement, batch, errors)
+
+    return jsonify({
+        'received': received,
+        'written': written,
+        'skipped': received - written - len(errors),
+        'failed': len(errors),
+        'errors': errors
+    })
+
+@app.route('/api/cases/<case_id>/entities:bulk', methods=['POST'])
+def bulk_create_entities(case_id):
+    """Insert or upsert many entities from a JSON array or NDJSON body"""
+    return bulk_ingest(case_id, Entity, entity_values)
+
+@app.route('/api/cases/<case_id>/connections:bulk', methods=['POST'])
+def bulk_create_connections(case_id):
+    """Insert or upsert many connections from a JSON array or NDJSON body"""
+    return bulk_ingest(case_id, Connection, connection_values)
+
+@app.route('/api/cases/<case_id>/paths', methods=['GET'])
+def get_path(case_id):
+    """Shortest path between two entities of a case
+
+    `?weighted=true` prefers strong links (lowest total 1 / weight) over the
+    fewest hops.
+    """
+    Case.query.get_or_404(case_id)
+    source = request.args.get('source')
+    target = request.args.get('target')
+    if not source or not target:
+        return jsonify({'error': 'source and target are required'}), 400
+    try:
+        max_hops = positive_arg('max_hops', 6)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    weighted = request.args.get('weighted', 'false').lower() == 'true'
+
+    index = adjacency_cache.get(case_id, case_version(case_id))
+    found = index.shortest_path(source, target, max_hops, weighted)
+    if found is None:
+        return jsonify({'found': False, 'nodes': [], 'edges': []})
+
+    node_ids, edge_ids, cost = found
+    entities = {e.id: e for e in Entity.query.filter(Entity.case_id == case_id, Entity.id.in_(node_ids))}
+    connections = {c.id: c for c in Connection.query.filter(Connection.id.in_(edge_ids))}
+    return jsonify({
+        'found': True,
+        'hops': len(edge_ids),
+        'cost': cost,
+        'nodes': [entities[i].to_dict() if i in entities else {'id': i} for i in node_ids],
+        'edges': [connections[i].to_dict() for i in edge_ids]
+    })
+
+@app.route('/api/cases/<case_id>/neighbors/<entity_id>', methods=['GET'])
+def get_neighbors(case_id, entity_id):
+    """Entities within `?hops=` links of an entity and the connections between them"""
+    Case.query.get_or_404(case_id)
+    Entity.query.filter_by(case_id=case_id, id=entity_id).first_or_404()
+    try:
+        hops = positive_arg('hops', 1)
+        limit = min(positive_arg('limit', 500), app.config['MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    index = adjacency_cache.get(case_id, case_version(case_id))
+    distances, edge_ids = index.neighborhood(entity_id, hops, limit)
+    entities = Entity.query.filter(Entity.case_id == case_id, Entity.id.in_(list(distances)))
+    connections = Connection.query.filter(Connection.id.in_(edge_ids)) if edge_ids else []
+    return jsonify({
+        'nodes': [{**entity.to_dict(), 'hops': distances[entity.id]} for entity in entities],
+        'edges': [conn.to_dict() for conn in connections]
+    })
+
+@app.route('/api/cases/<case_id>/match', methods=['POST'])
+def match_pattern(case_id):
+    """Subgraphs of a case matching a typed node/edge pattern (see pattern.py)
+
+    The body may also set `limit` (default 100, at most MATCH_MAX_RESULTS) and
+    `timeout_ms` (at most MATCH_TIMEOUT_SECONDS). The search stops at either
+    and reports it with `truncated` or `timed_out`.
+    """
+    Case.query.get_or_404(case_id)
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify({'error': 'body must be a JSON pattern object'}), 400
+    limit = spec.get('limit', 100)
+    timeout_ms = spec.get('timeout_ms', app.config['MATCH_TIMEOUT_SECONDS'] * 1000)
+    if (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1
+            or isinstance(timeout_ms, bool) or not isinstance(timeout_ms, (int, float)) or timeout_ms <= 0):
+        return jsonify({'error': 'limit and timeout_ms must be positive numbers'}), 400
+    limit = min(limit, app.config['MATCH_MAX_RESULTS'])
+    timeout = min(timeout_ms / 1000, app.config['MATCH_TIMEOUT_SECONDS'])
+
+    started = time.perf_counter()
+    index = match_cache.get(case_id, case_version(case_id))
+    try:
+        matches, summary = pattern.match(index, spec, limit, timeout)
+    except pattern.PatternError as e:
+        return jsonify({'error': str(e)}), 400
+
+    node_ids = list({entity_id for found in matches for entity_id in found['nodes'].values()})
+    edge_ids = list({edge_id for found in matches for edge_id in found['edges']})
+    nodes = api_rows(Entity.query.filter(Entity.case_id == case_id, Entity.id.in_(node_ids)), Entity) \
+        if node_ids else []
+    edges = api_rows(Connection.query.filter(Connection.case_id == case_id, Connection.id.in_(edge_ids)),
+                     Connection) if edge_ids else []
+    return jsonify({
+        'matches': matches,
+        'count': len(matches),
+        'truncated': summary['limited'],
+        'timed_out': summary['timed_out'],
+        'plan': summary['plan'],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'nodes': nodes,
+        'edges': edges
+    })
+
+analytics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics')
+analytics_pending = set()
+analytics_lock = threading.Lock()
+
+def schedule_analytics(case_id):
+    """Queue a background recompute of a case's analytics unless one is pending"""
+    with analytics_lock:
+        if case_id in analytics_pending:
+            return False
+        analytics_pending.add(case_id)
+    analytics_executor.submit(run_analytics, case_id)
+    return True
+
+def run_analytics(case_id):
+    """Compute and store analytics for the current version of a case"""
+    try:
+        with app.app_context(), case_scope(case_id) as storage:
+            version = db.session.execute(
+                db.select(Case.version).where(Case.id == case_id)
+            ).scalar()
+            # Cold shards are read-only; they keep the results stored before closing
+            if version is None or storage == 'cold':
+                return
+            started = time.perf_counter()
+            rows = db.session.execute(
+                db.select(Connection.source, Connection.target, Connection.weight)
+                .where(Connection.case_id == case_id)
+            )
+            entities, summary = analytics.compute(rows, app.config['ANALYTICS_BETWEENNESS_SAMPLES'])
+
+            EntityAnalytics.query.filter_by(case_id=case_id).delete()
+            if entities:
+                db.session.execute(db.insert(EntityAnalytics),
+                                   [{'case_id': case_id, **entity} for entity in entities])
+            db.session.merge(CaseAnalytics(
+                case_id=case_id,
+                version=version,
+                computed_at=datetime.utcnow(),
+                duration_ms=(time.perf_counter() - started) * 1000,
+                **summary
+            ))
+            db.session.commit()
+    except Exception:
+        app.logger.exception('Analytics failed for case %s', case_id)
+    finally:
+        with analytics_lock:
+            analytics_pending.discard(case_id)
+
+def stale_results(case, summary):
+    """Whether a case's stored analytics or layout lag behind its rows.
+
+    A cold case cannot change, so the results stored before it was closed
+    stay current whatever its version.
+    """
+    return summary is None or (summary.version != case.version and case.storage != 'cold')
+
+def cold_unavailable(case_id, results):
+    """409 response for results a cold case was closed without; its shard is read-only"""
+    return jsonify({'error': f'Case is in cold storage and has no stored {results}; reopen it to compute them',
+                    'case_id': case_id}), 409
+
+# Metrics /analytics can be ordered by
+ANALYTICS_SORT_KEYS = ('pagerank', 'betweenness', 'degree', 'weighted_degree')
+
+@app.route('/api/cases/<case_id>/analytics', methods=['GET'])
+def get_analytics(case_id):
+    """Stored centrality, component and community results for a case
+
+    Results older than the case's current version are still returned, marked
+    `stale`, while a recompute runs in the background; a case that has never
+    been analysed returns 202 until the first run finishes, or 409 if it is
+    in cold storage.
+    """
+    case = Case.query.get_or_404(case_id)
+    sort = request.args.get('sort', 'pagerank')
+    if sort not in ANALYTICS_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(ANALYTICS_SORT_KEYS)}"}), 400
+    try:
+        limit = min(positive_arg('limit', 100), app.config['MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    summary = db.session.get(CaseAnalytics, case_id)
+    if summary is None and case.storage == 'cold':
+        return cold_unavailable(case_id, 'analytics')
+    stale = stale_results(case, summary)
+    if stale:
+        schedule_analytics(case_id)
+    if summary is None:
+        return jsonify({'case_id': case_id, 'status': 'pending'}), 202
+
+    entities = EntityAnalytics.query.filter_by(case_id=case_id) \
+        .order_by(getattr(EntityAnalytics, sort).desc()).limit(limit)
+    return jsonify({
+        **summary.to_dict(),
+        'status': 'pending' if stale else 'ready',
+        'stale': stale,
+        'entities': [entity.to_dict() for entity in entities]
+    })
+
+@app.route('/api/cases/<case_id>/analytics', methods=['POST'])
+def refresh_analytics(case_id):
+    """Queue a background recompute of a case's analytics"""
+    Case.query.get_or_404(case_id)
+    schedule_analytics(case_id)
+    return jsonify({'case_id': case_id, 'status': 'pending'}), 202
+
+layout_pending = set()
+
+def schedule_layout(case_id, full=False):
+    """Queue a background layout update of a case unless one is pending.
+
+    Layouts share the analytics thread, so the two never compete for CPU.
+    """
+    with analytics_lock:
+        if case_id in layout_pending:
+            return False
+        layout_pending.add(case_id)
+    analytics_executor.submit(run_layout, case_id, full)
+    return True
+
+def run_layout(case_id, full=False):
+    """Position the entities of the current version of a case and store them.
+
+    Entities with a stored position keep it and only new ones are placed
+    (see layout.extend), unless `full`, the case has no layout yet or more
+    than LAYOUT_INCREMENTAL_LIMIT of its entities are new.
+    """
+    try:
+        with app.app_context(), case_scope(case_id) as storage:
+            version = db.session.execute(
+                db.select(Case.version).where(Case.id == case_id)
+            ).scalar()
+            if version is None or storage == 'cold':
+                return
+            started = time.perf_counter()
+            ids, mass, weights = layout.build(
+                db.session.execute(db.select(Entity.id, Entity.size).where(Entity.case_id == case_id)),
+                db.session.execute(db.select(Connection.source, Connection.target)
+                                   .where(Connection.case_id == case_id))
+            )
+            stored = {row.entity_id: (row.x, row.y) for row in db.session.execute(
+                db.select(EntityLayout.entity_id, EntityLayout.x, EntityLayout.y)
+                .where(EntityLayout.case_id == case_id)
+            )}
+            placed = np.array([entity_id in stored for entity_id in ids], dtype=bool)
+            new = len(ids) - int(placed.sum())
+            k = app.config['LAYOUT_EDGE_LENGTH']
+            if full or not placed.any() or new > app.config['LAYOUT_INCREMENTAL_LIMIT'] * len(ids):
+                mode = 'full'
+                positions = layout.compute(weights, mass, k, app.config['LAYOUT_ITERATIONS'])
+                EntityLayout.query.filter_by(case_id=case_id).delete()
+                written = range(len(ids))
+            else:
+                mode = 'incremental'
+                positions = np.array([stored.get(entity_id, (0.0, 0.0)) for entity_id in ids])
+                positions = layout.extend(weights, mass, positions, placed, k)
+                gone = stored.keys() - set(ids)
+                if gone:
+                    EntityLayout.query.filter(EntityLayout.case_id == case_id,
+                                              EntityLayout.entity_id.in_(gone)).delete()
+                written = np.flatnonzero(~placed)
+
+            if len(written):
+                db.session.execute(db.insert(EntityLayout), [
+                    {'case_id': case_id, 'entity_id': ids[i],
+                     'x': float(positions[i, 0]), 'y': float(positions[i, 1])}
+                    for i in written
+                ])
+            db.session.merge(CaseLayout(
+                case_id=case_id,
+                version=version,
+                computed_at=datetime.utcnow(),
+                duration_ms=(time.perf_counter() - started) * 1000,
+                mode=mode,
+                entity_count=len(ids),
+                placed_count=len(written)
+            ))
+            db.session.commit()
+    except Exception:
+        app.logger.exception('Layout failed for case %s', case_id)
+    finally:
+        with analytics_lock:
+            layout_pending.discard(case_id)
+
+def current_layout(case_id):
+    """Stored layout summary of a case, queueing an update when it is stale"""
+    case = Case.query.get_or_404(case_id)
+    summary = db.session.get(CaseLayout, case_id)
+    stale = stale_results(case, summary)
+    if stale and case.storage != 'cold':
+        schedule_layout(case_id)
+    return summary, stale
+
+def layout_positions(case_id):
+    """{entity_id: (x, y)} of a case's stored layout, rounded to 0.1px"""
+    return {row.entity_id: (round(row.x, 1), round(row.y, 1)) for row in db.session.execute(
+        db.select(EntityLayout.entity_id, EntityLayout.x, EntityLayout.y).where(EntityLayout.case_id == case_id)
+    )}
+
+@app.route('/api/cases/<case_id>/layout', methods=['GET'])
+def get_layout(case_id):
+    """Stored node positions of a case, as `ids`, `x` and `y` arrays
+
+    Like analytics, positions older than the case's current version are
+    returned marked `stale` while new entities are placed in the background,
+    and a case without a layout returns 202 until the first one is stored,
+    or 409 if it is in cold storage.
+    """
+    summary, stale = current_layout(case_id)
+    if summary is None:
+        if db.session.get(Case, case_id).storage == 'cold':
+            return cold_unavailable(case_id, 'layout')
+        return jsonify({'case_id': case_id, 'status': 'pending'}), 202
+    status = 'pending' if stale else 'ready'
+
+    def build():
+        positions = layout_positions(case_id)
+        return {
+            **summary.to_dict(),
+            'status': status,
+            'stale': stale,
+            'ids': list(positions),
+            'x': [x for x, _ in positions.values()],
+            'y': [y for _, y in positions.values()]
+        }
+
+    return cached_case_response(case_id, build, variant=(summary.computed_at, stale))
+
+@app.route('/api/cases/<case_id>/layout', methods=['POST'])
+def refresh_layout(case_id):
+    """Queue a background layout of a case; `?full=true` recomputes every position"""
+    Case.query.get_or_404(case_id)
+    schedule_layout(case_id, full=request.args.get('full', 'false').lower() == 'true')
+    return jsonify({'case_id': case_id, 'status': 'pending'}), 202
+
+ingest_executor = None
+ingest_executor_lock = threading.Lock()
+
+def submit_ingest(*args):
+    """Run an ingest job on the worker process pool, started on first use"""
+    global ingest_executor
+    with ingest_executor_lock:
+        if ingest_executor is None:
+            # Spawned workers import the app fresh instead of forking its threads
+            ingest_executor = ProcessPoolExecutor(
+                max_workers=app.config['INGEST_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        ingest_executor.submit(ingest.run_ingest_job, *args)
+
+@app.route('/api/cases/<case_id>/ingest', methods=['POST'])
+def ingest_extraction(case_id):
+    """Upload a UFDR extraction and queue it for ingestion into a case
+
+    The file is sent as multipart field `file` or as the raw request body and
+    is copied to UPLOAD_FOLDER in chunks; parsing happens in a worker process.
+    """
+    Case.query.get_or_404(case_id)
+    upload = request.files.get('file')
+    filename = upload.filename if upload else request.args.get('filename', 'extraction.ufdr')
+    job_id = uuid.uuid4().hex
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f'{job_id}.upload')
+    with open(path, 'wb') as target:
+        shutil.copyfileobj(upload.stream if upload else request.stream, target, 65536)
+    if os.path.getsize(path) == 0:
+        os.remove(path)
+        return jsonify({'error': 'No extraction file uploaded'}), 400
+
+    job = Job(id=job_id, kind='ufdr_ingest', case_id=case_id, filename=filename)
+    db.session.add(job)
+    db.session.commit()
+    submit_ingest(job_id, path, case_id, filename)
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and throughput of a background job"""
+    job = Job.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+# Case jobs: the job kind, the case status while the job runs, and the
+# statuses a case may have for the job to start
+CASE_JOBS = {
+    'delete': ('case_delete', 'deleting', None),
+    'archive': ('case_archive', 'archiving', None),
+    'restore': ('case_restore', 'restoring', ('archived',)),
+    'shard': ('case_shard', 'sharding', None),
+    'compact': ('case_compact', 'compacting', None),
+    'thaw': ('case_thaw', 'thawing', ('closed',)),
+}
+# (table, column chunks are selected by) holding a case's rows, children first
+CASE_ROW_TABLES = [
+    ('entity_identifiers', 'entity_id'),
+    ('entity_analytics', 'entity_id'),
+    ('entity_layouts', 'entity_id'),
+    ('connections', 'id'),
+    ('entities', 'id'),
+]
+# Rows an archive or new shard keeps; identifiers, analytics and layouts are
+# rebuilt after a restore, and identifiers stay in the catalog of a shard
+ARCHIVED_TABLES = ['connections', 'entities']
+BUSY_STATUSES = {status for _, status, _ in CASE_JOBS.values()}
+case_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='case-jobs')
+
+def start_case_job(case_id, action, status=None):
+    """Mark a case busy and queue a delete, archive, restore or shard job for it.
+
+    `status` is the status the case gets when a compact or thaw job is done.
+    """
+    kind, busy_status, allowed = CASE_JOBS[action]
+    case = Case.query.get_or_404(case_id)
+    if action != 'delete' and db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Archiving and sharding require SQLite'}), 501
+    if case.status in BUSY_STATUSES:
+        return jsonify({'error': f'Case is already {case.status}'}), 409
+    if allowed and case.status not in allowed:
+        return jsonify({'error': f'Case must be {" or ".join(allowed)} to {action} it'}), 409
+    if action == 'archive' and case.status == 'archived':
+        return jsonify({'error': 'Case is already archived'}), 409
+    if action in ('archive', 'shard') and case.storage:
+        return jsonify({'error': 'Case already has its own shard; closing it moves it to cold storage'}), 409
+
+    job = Job(id=uuid.uuid4().hex, kind=kind, case_id=case_id, rows_done=0)
+    status = status or case.status
+    case.status = busy_status
+    bump_case_version(case_id)
+    db.session.add(job)
+    db.session.commit()
+    case_job_executor.submit(run_case_job, job.id, action, status)
+    return jsonify(job.to_dict()), 202
+
+def run_case_job(job_id, action, status):
+    """Delete, archive, restore or shard a case in a background thread.
+
+    `status` is the case's status before the job; it is kept in the archive
+    and put back if the job fails. Compact and thaw jobs set it when done.
+    """
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        case_id = job.case_id
+        storage = db.session.get(Case, case_id).storage
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        started = time.perf_counter()
+        if action == 'shard':
+            path = shards.shard_path(app.config['SHARD_FOLDER'], case_id)
+        else:
+            path = archive.archive_path(app.config['ARCHIVE_FOLDER'], case_id)
+        try:
+            if action in ('compact', 'thaw'):
+                move_shard(case_id, action, status)
+            else:
+                with db.engine.connect() as conn:
+                    if action == 'delete':
+                        move_case_rows(conn, job_id, action, case_id, status, started)
+                    else:
+                        if action == 'archive':
+                            if archive.archived_cases(path) - {case_id}:
+                                raise FileExistsError(f'Archive file {os.path.basename(path)} holds other cases')
+                            archive.create_archive(path, [db.metadata.tables[name] for name in ('cases', *ARCHIVED_TABLES)])
+                        elif action == 'shard' and not os.path.exists(path):
+                            from migrate import create_shard
+                            shards.create(path, lambda conn: create_shard(conn, case_id))
+                        elif action == 'shard':
+                            shards.check_owner(path, case_id)
+                        elif action == 'restore' and case_id not in archive.archived_cases(path):
+                            raise FileNotFoundError(f'No archive for case {case_id}')
+                        archive.attach(conn, path)
+                        try:
+                            move_case_rows(conn, job_id, action, case_id, status, started)
+                        finally:
+                            conn.rollback()
+                            archive.detach(conn)
+            # A file that also holds other cases is theirs to restore
+            if action == 'restore' and not archive.archived_cases(path) - {case_id}:
+                os.remove(path)
+            elif action == 'delete' and storage:
+                drop_case_shard(case_id)
+            job = db.session.get(Job, job_id)
+            db.session.refresh(job)
+            job.status = 'completed'
+        except Exception as e:
+            app.logger.exception('Case %s job %s failed', action, job_id)
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            db.session.refresh(job)
+            job.status = 'failed'
+            job.error = str(e)
+            # Rows already moved stay moved; starting the job again finishes it
+            failed_status = 'closed' if action == 'thaw' else status
+            db.session.execute(db.update(Case).where(Case.id == case_id).values(status=failed_status))
+            bump_case_version(case_id)
+        finally:
+            job.elapsed_seconds = time.perf_counter() - started
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            response_cache.discard(lambda key: key[0] == case_id)
+
+def move_case_rows(conn, job_id, action, case_id, status, started):
+    """Delete or move a case's rows a chunk at a time, committing each chunk.
+
+    Chunks of CASE_JOB_CHUNK_SIZE keys are removed with set-based statements
+    (see archive.py) in their own transaction, together with the job's
+    progress, so the write lock is held briefly and no ORM objects are
+    loaded. Archives move entities and connections to the attached archive
+    and keep the case row, marked `archived`; a restore moves them back and
+    re-indexes their identifiers. Sharding moves them to the case's new
+    shard, attached the same way, and leaves the identifiers in place.
+    """
+    jobs = Job.__table__
+    chunk_size = app.config['CASE_JOB_CHUNK_SIZE']
+    # Every transaction writes before it reads: a WAL read transaction cannot
+    # be upgraded to a write once another connection has committed.
+    bump_case_version(case_id, conn)
+    if action == 'restore':
+        steps = [(name, 'id', archive.ARCHIVE_SCHEMA, 'main') for name in reversed(ARCHIVED_TABLES)]
+        total = archive.count_rows(conn, case_id, ARCHIVED_TABLES, archive.ARCHIVE_SCHEMA)
+    else:
+        target = archive.ARCHIVE_SCHEMA if action in ('archive', 'shard') else None
+        steps = [(name, key, 'main', target if name in ARCHIVED_TABLES else None)
+                 for name, key in CASE_ROW_TABLES if action != 'shard' or name != 'entity_identifiers']
+        total = archive.count_rows(conn, case_id, [name for name, _, _, _ in steps])
+        if action == 'archive':
+            archive.copy_case(conn, case_id, [column.name for column in Case.__table__.columns], status)
+    conn.execute(db.update(jobs).where(jobs.c.id == job_id).values(rows_total=total))
+    conn.commit()
+
+    for name, key, source, target in steps:
+        columns = [column.name for column in db.metadata.tables[name].columns]
+        while True:
+            bump_case_version(case_id, conn)
+            keys, moved = archive.move_chunk(conn, name, key, case_id, chunk_size, source, target, columns)
+            if not keys:
+                conn.rollback()
+                break
+            if name == 'entities' and target == 'main':
+                identifiers.sync(conn, keys)
+            conn.execute(db.update(jobs).where(jobs.c.id == job_id).values(
+                rows_done=jobs.c.rows_done + moved, elapsed_seconds=time.perf_counter() - started
+            ))
+            conn.commit()
+
+    bump_case_version(case_id, conn)
+    if action == 'delete':
+        conn.execute(CaseAnalytics.__table__.delete().where(CaseAnalytics.case_id == case_id))
+        conn.execute(CaseLayout.__table__.delete().where(CaseLayout.case_id == case_id))
+        conn.execute(jobs.delete().where(jobs.c.case_id == case_id, jobs.c.id != job_id))
+        if conn.dialect.name == 'sqlite':
+            changes.discard(conn, case_id)
+        conn.execute(Case.__table__.delete().where(Case.id == case_id))
+    elif action in ('archive', 'shard'):
+        conn.execute(CaseAnalytics.__table__.delete().where(CaseAnalytics.case_id == case_id))
+        conn.execute(CaseLayout.__table__.delete().where(CaseLayout.case_id == case_id))
+        if action == 'archive':
+            conn.execute(db.update(Case).where(Case.id == case_id).values(status='archived'))
+        else:
+            # The shard logs the case's changes from here on
+            changes.discard(conn, case_id)
+            conn.execute(db.update(Case).where(Case.id == case_id).values(status=status, storage='hot'))
+    else:
+        status = archive.archived_status(conn, case_id)
+        conn.execute(db.update(Case).where(Case.id == case_id).values(status=status or 'active'))
+    conn.commit()
+
+def move_shard(case_id, action, status):
+    """Compact a case's hot shard into the cold tier, or thaw its cold shard.
+
+    The catalog points at the new file before the old one is removed, so
+    requests already reading the old file finish on it. Analytics and the
+    layout are brought up to date first, as a cold shard cannot store them.
+    """
+    hot = shards.shard_path(app.config['SHARD_FOLDER'], case_id)
+    cold_folder = app.config['SHARD_COLD_FOLDER']
+    if action == 'compact':
+        source, storage = hot, 'cold'
+        shards.check_owner(hot, case_id)
+        with case_scope(case_id):
+            case = db.session.get(Case, case_id)
+            runs = [run for run, model in ((run_analytics, CaseAnalytics), (run_layout, CaseLayout))
+                    if stale_results(case, db.session.get(model, case_id))]
+            db.session.rollback()
+        for run in runs:
+            analytics_executor.submit(run, case_id).result()
+        for compressed in (True, False):
+            remove_case_shard(shards.shard_path(cold_folder, case_id, compressed), case_id)
+        indexed = [name for name in SHARD_TABLES if name in search_index.INDEXED_TABLES]
+        shards.compact(hot, shards.shard_path(cold_folder, case_id, app.config['SHARD_COLD_COMPRESS']),
+                       lambda conn: search_index.rebuild(conn, indexed))
+    else:
+        source, storage = shards.cold_path(cold_folder, case_id), 'hot'
+        if source is None:
+            raise FileNotFoundError(f'No cold shard for case {case_id}')
+        from migrate import upgrade_shard
+
+        def upgrade(conn):
+            upgrade_shard(conn)
+            shards.claim(conn, case_id)
+
+        shards.check_owner(hot, case_id)
+        shards.thaw(source, hot)
+        shards.create(hot, upgrade)
+    bump_case_version(case_id)
+    db.session.execute(db.update(Case).where(Case.id == case_id).values(status=status, storage=storage))
+    db.session.commit()
+    shard_pool.release(source)
+    shards.remove(source)
+
+@app.route('/api/cases/<case_id>/archive', methods=['POST'])
+def archive_case(case_id):
+    """Move a case's entities and connections to cold storage in a background job"""
+    return start_case_job(case_id, 'archive')
+
+@app.route('/api/cases/<case_id>/restore', methods=['POST'])
+def restore_case(case_id):
+    """Move an archived case's rows back from cold storage in a background job"""
+    return start_case_job(case_id, 'restore')
+
+@app.route('/api/cases/<case_id>/shard', methods=['POST'])
+def shard_case(case_id):
+    """Move a case's entities and connections into a shard file of its own in a background job"""
+    return start_case_job(case_id, 'shard')
+
+def time_window():
+    """(start, end) parsed from ISO-8601 ?from= and ?to=; either may be None"""
+    bounds = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        parsed = datetime.fromisoformat(value) if value else None
+        if parsed and parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        bounds.append(parsed)
+    return tuple(bounds)
+
+def window_queries(model, case_id, window):
+    """Queries for a case's rows inside a time window, as the timeline slider filters.
+
+    Undated rows are always included. They are fetched by a separate query
+    so each half is a single range over the (case_id, timestamp) index,
+    which an `IS NULL OR BETWEEN` filter would defeat.
+    """
+    start, end = window
+    query = model.query.filter(model.case_id == case_id)
+    if not start and not end:
+        return [query]
+    dated = query.filter(model.timestamp.is_not(None))
+    if start:
+        dated = dated.filter(model.timestamp >= start)
+    if end:
+        dated = dated.filter(model.timestamp <= end)
+    return [query.filter(model.timestamp.is_(None)), dated]
+
+def graph_queries(case_id, window=(None, None)):
+    """Entity and connection queries for a case graph, limited to a time window"""
+    return window_queries(Entity, case_id, window), window_queries(Connection, case_id, window)
+
+def stream_graph(case_id, window, ndjson=False):
+    """Yield a case graph in chunks of GRAPH_STREAM_BATCH_SIZE rows.
+
+    Rows are read through a server-side cursor and serialized one batch at a
+    time, so memory stays flat however large the case is. With `ndjson` each
+    line is a node or edge tagged with `kind`; otherwise the chunks form the
+    same `{"nodes": [...], "edges": [...]}` document as the regular endpoint.
+    """
+    batch_size = app.config['GRAPH_STREAM_BATCH_SIZE']
+    entities, connections = graph_queries(case_id, window)
+    sections = [
+        ('nodes', 'node', Entity, entities),
+        ('edges', 'edge', Connection, connections),
+    ]
+
+    if not ndjson:
+        yield b'{'
+    for position, (section, kind, model, queries) in enumerate(sections):
+        if not ndjson:
+            yield (b'' if position == 0 else b'],') + orjson.dumps(section) + b':['
+        names = [column.key for column in API_COLUMNS[model]]
+        first = True
+        batch = []
+        rows = (row for query in queries for row in api_select(query, model, yield_per=batch_size))
+        for row in rows:
+            if ndjson:
+                batch.append(orjson.dumps({'kind': kind, **dict(zip(names, row))}) + b'\n')
+            else:
+                batch.append((b'' if first else b',') + orjson.dumps(dict(zip(names, row))))
+                first = False
+            if len(batch) >= batch_size:
+                yield b''.join(batch)
+                batch = []
+        if batch:
+            yield b''.join(batch)
+    if not ndjson:
+        yield b']}'
+
+# ?lod= groupings: entity type, or community from stored analytics
+LOD_GROUPINGS = ('type', 'community')
+
+def lod_members(case_id, lod):
+    """Subquery of (id, type, key): each entity of a case and its supernode group.
+
+    Entities without connections have no analytics row and fall in community -1.
+    """
+    if lod == 'type':
+        return db.select(Entity.id, Entity.type, Entity.type.label('key')) \
+            .where(Entity.case_id == case_id).subquery()
+    return db.select(Entity.id, Entity.type, func.coalesce(EntityAnalytics.community, -1).label('key')) \
+        .outerjoin(EntityAnalytics, db.and_(EntityAnalytics.case_id == Entity.case_id,
+                                            EntityAnalytics.entity_id == Entity.id)) \
+        .where(Entity.case_id == case_id).subquery()
+
+def lod_groups(case_id, lod):
+    """Member count and per-type counts of every group, and the groups kept as supernodes.
+
+    At most half of LOD_MAX_ELEMENTS groups are kept, largest first; the
+    rest are merged into one `other` supernode.
+    """
+    members = lod_members(case_id, lod)
+    groups = {}
+    for key, entity_type, count in db.session.execute(
+        db.select(members.c.key, members.c.type, func.count()).group_by(members.c.key, members.c.type)
+    ):
+        group = groups.setdefault(key, {'members': 0, 'types': {}})
+        group['members'] += count
+        group['types'][entity_type] = count
+    ordered = sorted(groups, key=lambda key: (-groups[key]['members'], str(key)))
+    budget = app.config['LOD_MAX_ELEMENTS'] // 2
+    return groups, set(ordered if len(ordered) <= budget else ordered[:budget - 1])
+
+def lod_unavailable(case_id, lod):
+    """202 response while the communities a ?lod=community view needs are computed"""
+    case = Case.query.get_or_404(case_id)
+    if lod != 'community':
+        return None
+    summary = db.session.get(CaseAnalytics, case_id)
+    if not stale_results(case, summary):
+        return None
+    if case.storage == 'cold':
+        return cold_unavailable(case_id, 'analytics')
+    schedule_analytics(case_id)
+    return jsonify({'case_id': case_id, 'status': 'pending'}), 202
+
+def lod_graph(case_id, lod):
+    """Graph of supernodes, one per entity type or community.
+
+    Member counts and merged links (connection count and summed weight per
+    pair of groups, in either direction) are aggregated in SQL. Links inside
+    a group are reported on its supernode; only the heaviest links that fit
+    in LOD_MAX_ELEMENTS are returned.
+    """
+    groups, kept = lod_groups(case_id, lod)
+
+    def supernode_id(key):
+        return f'{lod}:{key}' if key in kept else f'{lod}:other'
+
+    nodes = {}
+    for key, group in groups.items():
+        node_id = supernode_id(key)
+        node = nodes.setdefault(node_id, {
+            'group': key if key in kept else 'other', 'groups': 0, 'members': 0, 'types': {},
+            'internal_connections': 0, 'internal_weight': 0
+        })
+        node['groups'] += 1
+        node['members'] += group['members']
+        for entity_type, count in group['types'].items():
+            node['types'][entity_type] = node['types'].get(entity_type, 0) + count
+
+    source, target = lod_members(case_id, lod), lod_members(case_id, lod)
+    links = {}
+    connection_count = 0
+    for source_key, target_key, count, weight in db.session.execute(
+        db.select(source.c.key, target.c.key, func.count(), func.coalesce(func.sum(Connection.weight), 0))
+        .select_from(Connection)
+        .join(source, source.c.id == Connection.source)
+        .join(target, target.c.id == Connection.target)
+        .where(Connection.case_id == case_id)
+        .group_by(source.c.key, target.c.key)
+    ):
+        connection_count += count
+        pair = tuple(sorted((supernode_id(source_key), supernode_id(target_key))))
+        if pair[0] == pair[1]:
+            nodes[pair[0]]['internal_connections'] += count
+            nodes[pair[0]]['internal_weight'] += weight
+            continue
+        link = links.setdefault(pair, [0, 0])
+        link[0] += count
+        link[1] += weight
+
+    edge_budget = max(0, app.config['LOD_MAX_ELEMENTS'] - len(nodes))
+    heaviest = sorted(links.items(), key=lambda item: (-item[1][1], item[0]))[:edge_budget]
+
+    def label(node):
+        if node['group'] == 'other':
+            return f"Other ({node['groups']:,} groups, {node['members']:,})"
+        if lod == 'community':
+            return f"Community {node['group']} ({node['members']:,})" if node['group'] != -1 \
+                else f"Unconnected ({node['members']:,})"
+        return f"{node['group']} ({node['members']:,})"
+
+    return {
+        'lod': lod,
+        'entity_count': sum(group['members'] for group in groups.values()),
+        'connection_count': connection_count,
+        'nodes': [
+            {
+                'id': node_id,
+                'case_id': case_id,
+                'label': label(node),
+                'type': max(node['types'], key=node['types'].get),
+                'size': min(100, 40 + int(15 * math.log10(node['members'] + 1))),
+                'icon': None,
+                'metadata': {'supernode': True, **node},
+                'timestamp': None
+            }
+            for node_id, node in nodes.items()
+        ],
+        'edges': [
+            {
+                'id': f'{a}|{b}',
+                'case_id': case_id,
+                'source': a,
+                'target': b,
+                'type': 'Aggregated',
+                'weight': weight,
+                'data': {'connections': count},
+                'timestamp': None
+            }
+            for (a, b), (count, weight) in heaviest
+        ],
+        'truncated': {'edges': len(links) - len(heaviest)}
+    }
+
+@app.route('/api/cases/<case_id>/graph/supernodes/<supernode_id>', methods=['GET'])
+def expand_supernode(case_id, supernode_id):
+    """Member entities of one ?lod= supernode and the connections among them"""
+    lod, _, key = supernode_id.partition(':')
+    if lod not in LOD_GROUPINGS or not key:
+        return jsonify({'error': 'Unknown supernode'}), 404
+    if lod == 'community' and key != 'other':
+        try:
+            key = int(key)
+        except ValueError:
+            return jsonify({'error': 'Unknown supernode'}), 404
+    pending = lod_unavailable(case_id, lod)
+    if pending:
+        return pending
+
+    def build():
+        members = lod_members(case_id, lod)
+        if key == 'other':
+            _, kept = lod_groups(case_id, lod)
+            in_group = members.c.key.not_in(list(kept))
+        else:
+            in_group = members.c.key == key
+        node_budget = app.config['LOD_MAX_ELEMENTS'] // 2
+        nodes = api_rows(
+            Entity.query.filter(Entity.id.in_(db.select(members.c.id).where(in_group)))
+            .order_by(Entity.id).limit(node_budget + 1),
+            Entity
+        )
+        ids = [node['id'] for node in nodes[:node_budget]]
+        edge_budget = app.config['LOD_MAX_ELEMENTS'] - len(ids)
+        edges = api_rows(
+            Connection.query.filter(Connection.case_id == case_id, Connection.source.in_(ids),
+                                    Connection.target.in_(ids))
+            .order_by(Connection.id).limit(edge_budget + 1),
+            Connection
+        ) if ids else []
+        return {
+            'supernode': supernode_id,
+            'nodes': nodes[:node_budget],
+            'edges': edges[:edge_budget],
+            'truncated': {'nodes': len(nodes) > node_budget, 'edges': len(edges) > edge_budget}
+        }
+
+    return cached_case_response(case_id, build)
+
 @app.route('/api/cases/<case_id>/graph', methods=['GET'])
 def get_case_graph(case_id):
-    """Get the complete graph data for a case (nodes and edges)"""
-    entities = Entity.query.filter_by(case_id=case_id).all()
-    connections = Connection.query.filter_by(case_id=case_id).all()
-    
+    """Get the complete graph data for a case (nodes and edges)
+
+    `?from=` and `?to=` limit the graph to a time window (undated nodes and
+    edges are always included). `?format=ndjson` streams one node or edge
+    per line, and `?format=stream` streams the regular JSON document in chunks.
+    Clients sending `Accept: application/msgpack` or
+    `application/vnd.forensilink.columnar+json` (or `?format=msgpack` /
+    `?format=columnar`) get the compact columnar layout of graph_codec.py.
+    `?lod=type` or `?lod=community` returns supernodes instead (see lod_graph).
+    `?layout=true` adds the stored `x` and `y` of every node (null until it
+    is placed) and a `layout` summary; see get_layout.
+    """
+    try:
+        window = time_window()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time window: {e}'}), 400
+
+    lod = request.args.get('lod')
+    if lod:
+        if lod not in LOD_GROUPINGS:
+            return jsonify({'error': f"lod must be one of: {', '.join(LOD_GROUPINGS)}"}), 400
+        if window != (None, None):
+            return jsonify({'error': 'lod cannot be combined with from/to'}), 400
+        return lod_unavailable(case_id, lod) or cached_case_response(
+            case_id, lambda: lod_graph(case_id, lod)
+        )
+
+    response_format = request.args.get('format')
+    with_layout = request.args.get('layout', 'false').lower() == 'true'
+    if with_layout and response_format in ('ndjson', 'stream'):
+        return jsonify({'error': 'layout is only available with format json, columnar or msgpack'}), 400
+    if response_format is None:
+        media_type = graph_codec.MEDIA_TYPES[
+            request.accept_mimetypes.best_match(list(graph_codec.MEDIA_TYPES), 'application/json')
+        ]
+    else:
+        media_type = {'json': 'application/json', 'columnar': graph_codec.COLUMNAR_JSON,
+                      'msgpack': graph_codec.MSGPACK}.get(response_format)
+    if response_format == 'ndjson':
+        return Response(stream_with_context(stream_graph(case_id, window, ndjson=True)),
+                        mimetype='application/x-ndjson')
+    if response_format == 'stream':
+        return Response(stream_with_context(stream_graph(case_id, window)),
+                        mimetype='application/json')
+
+    if media_type is None:
+        return jsonify({'error': 'format must be one of: json, columnar, msgpack, ndjson, stream'}), 400
+    variant = None
+    if with_layout:
+        summary, stale = current_layout(case_id)
+        variant = (summary.computed_at if summary else None, stale)
+
+    def build():
+        # Read before the rows, so changes racing the read are sent again rather than lost
+        seq = change_seq(case_id)
+        entity_queries, connection_queries = graph_queries(case_id, window)
+        if media_type != 'application/json':
+            body = {**graph_codec.columnar(
+                [row for query in entity_queries for row in api_select(query, Entity)],
+                [row for query in connection_queries for row in api_select(query, Connection)]
+            ), 'seq': seq}
+        else:
+            body = {
+                'nodes': [row for query in entity_queries for row in api_rows(query, Entity)],
+                'edges': [row for query in connection_queries for row in api_rows(query, Connection)],
+                'seq': seq
+            }
+        if with_layout:
+            positions = layout_positions(case_id)
+            if media_type != 'application/json':
+                placed = [positions.get(entity_id, (None, None))
+                          for entity_id in body['ids'][:body['nodes']['count']]]
+                body['nodes']['x'] = [x for x, _ in placed]
+                body['nodes']['y'] = [y for _, y in placed]
+            else:
+                for node in body['nodes']:
+                    node['x'], node['y'] = positions.get(node['id'], (None, None))
+            body['layout'] = {**summary.to_dict(), 'stale': stale} if summary else None
+        return body
+
+    if media_type == 'application/json':
+        return cached_case_response(case_id, build, variant=variant)
+    return cached_case_response(case_id, build, media_type,
+                                lambda body: graph_codec.encode(body, media_type), variant)
+
+def change_seq(case_id):
+    """Latest change sequence number of a case, or None without the SQLite change log"""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    return changes.current_seq(db.session.connection(), case_id)
+
+@app.route('/api/cases/<case_id>/graph/changes', methods=['GET'])
+def get_graph_changes(case_id):
+    """Nodes and edges added, updated or removed since change `?since=`
+
+    Pass the `seq` of a `/graph` response, or of the previous call, as
+    `?since=`. Changed rows are returned whole and deleted ones by id under
+    `removed`; while `has_more` is true, call again with the returned `seq`.
+    """
+    Case.query.get_or_404(case_id)
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Change tracking requires SQLite'}), 501
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'since must be a change sequence number'}), 400
+    page_size = app.config['GRAPH_CHANGES_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int), page_size))
+
+    conn = db.session.connection()
+    head = changes.current_seq(conn, case_id)
+    if since > head:
+        return jsonify({'error': 'since is ahead of this case; reload the full graph', 'seq': head}), 409
+    logged = changes.since(conn, case_id, since, head, limit + 1)
+    has_more = len(logged) > limit
+    logged = logged[:limit]
+    upto = logged[-1].seq if has_more else head
+
+    return jsonify(changes_body(case_id, since, upto, logged, has_more))
+
+def changes_body(case_id, since, upto, logged, has_more=False):
+    """/graph/changes document for the log rows of a case in (since, upto]"""
+    log = changes.graph_changes
+    in_range = db.and_(log.c.case_id == case_id, log.c.seq > since, log.c.seq <= upto,
+                       log.c.deleted == 0)
+    return {
+        'case_id': case_id,
+        'since': since,
+        'seq': upto,
+        'has_more': has_more,
+        'nodes': api_rows(Entity.query.join(log, db.and_(log.c.item_id == Entity.id, log.c.kind == 'node'))
+                          .filter(in_range, Entity.case_id == case_id), Entity),
+        'edges': api_rows(Connection.query.join(log, db.and_(log.c.item_id == Connection.id, log.c.kind == 'edge'))
+                          .filter(in_range, Connection.case_id == case_id), Connection),
+        'removed': {
+            'nodes': [row.item_id for row in logged if row.deleted and row.kind == 'node'],
+            'edges': [row.item_id for row in logged if row.deleted and row.kind == 'edge'],
+        }
+    }
+
+def sse_event(name, body, seq=None):
+    """One Server-Sent Event; only events carrying changes get an id"""
+    event_id = b'id: %d\n' % seq if seq is not None else b''
+    return event_id + b'event: ' + name.encode() + b'\ndata: ' + app.json.encode(body) + b'\n\n'
+
+def stream_head(shard_case=None):
+    with app.app_context(), case_scope(shard_case):
+        return changes.latest_seq(db.session.connection())
+
+def load_stream_events(case_ids, after, upto, shard_case=None):
+    """Encoded /stream events for the changes of watched cases in (after, upto]
+
+    A case with more changes than fit in one page gets a `resync` event
+    instead, and its clients page through /graph/changes. With `shard_case`
+    the log of that case's shard is read.
+    """
+    page_size = app.config['GRAPH_CHANGES_PAGE_SIZE']
+    events = {}
+    with app.app_context(), case_scope(shard_case):
+        conn = db.session.connection()
+        for case_id in case_ids:
+            logged = changes.since(conn, case_id, after, upto, page_size + 1)
+            if len(logged) > page_size:
+                events[case_id] = [(upto, sse_event('resync', {'case_id': case_id, 'since': after, 'seq': upto}))]
+            elif logged:
+                events[case_id] = [(upto, sse_event('changes', changes_body(case_id, after, upto, logged), upto))]
+    return events
+
+change_broker = broker.ChangeBroker(stream_head, load_stream_events, app.config['STREAM_POLL_SECONDS'],
+                                    app.config['STREAM_QUEUE_SIZE'])
+# Sharded cases log their changes in their own shard, each followed by its own broker
+shard_brokers = {}
+shard_brokers_lock = threading.Lock()
+
+def case_broker(case_id, storage):
+    """Broker following the change log that holds a case's changes"""
+    if not storage:
+        return change_broker
+    with shard_brokers_lock:
+        if case_id not in shard_brokers:
+            shard_brokers[case_id] = broker.ChangeBroker(
+                functools.partial(stream_head, case_id), functools.partial(load_stream_events, shard_case=case_id),
+                app.config['STREAM_POLL_SECONDS'], app.config['STREAM_QUEUE_SIZE']
+            )
+        return shard_brokers[case_id]
+
+@app.route('/api/cases/<case_id>/stream', methods=['GET'])
+def stream_case_changes(case_id):
+    """Server-Sent Events pushing a case's graph changes as they commit
+
+    Each `changes` event has the /graph/changes shape, with the write's `seq`
+    as event id. Pass the `seq` of the graph already loaded as `?since=` (or
+    reconnect with `Last-Event-ID`); if changes were missed, or the client
+    fell too far behind, a `resync` event names the range to fetch from
+    /graph/changes.
+    """
+    case = Case.query.get_or_404(case_id)
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Change tracking requires SQLite'}), 501
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    case_changes = case_broker(case_id, case.storage)
+    subscription = case_changes.subscribe(case_id)
+    heartbeat = app.config['STREAM_HEARTBEAT_SECONDS']
+
+    def events():
+        last = subscription.seq
+        try:
+            yield sse_event('ready', {'case_id': case_id, 'seq': last})
+            if since is not None and since < last:
+                yield sse_event('resync', {'case_id': case_id, 'since': since, 'seq': last})
+            while True:
+                event, overflowed = subscription.get(heartbeat)
+                if event is None:
+                    yield b': keep-alive\n\n'
+                    continue
+                seq, payload = event
+                if overflowed:
+                    yield sse_event('resync', {'case_id': case_id, 'since': last, 'seq': seq})
+                yield payload
+                last = seq
+        finally:
+            case_changes.unsubscribe(subscription)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# strftime formats truncating a timestamp to the start of its bucket
+TIMELINE_BUCKETS = {'day': '%Y-%m-%dT00:00:00', 'hour': '%Y-%m-%dT%H:00:00'}
+
+def time_bucket(column, bucket):
+    """SQL expression truncating `column` to an ISO-8601 bucket start"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(bucket, column), 'YYYY-MM-DD"T"HH24:00:00')
+    return func.strftime(TIMELINE_BUCKETS[bucket], column)
+
+@app.route('/api/cases/<case_id>/timeline', methods=['GET'])
+def get_timeline(case_id):
+    """Connection counts per day or hour (`?bucket=`) and connection type
+
+    Accepts the same `?from=` / `?to=` window as the graph endpoint.
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in TIMELINE_BUCKETS:
+        return jsonify({'error': "bucket must be 'day' or 'hour'"}), 400
+    try:
+        start, end = time_window()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time window: {e}'}), 400
+
+    def build():
+        period = time_bucket(Connection.timestamp, bucket).label('period')
+        query = db.select(period, Connection.type, func.count()).where(
+            Connection.case_id == case_id, Connection.timestamp.is_not(None)
+        )
+        if start:
+            query = query.where(Connection.timestamp >= start)
+        if end:
+            query = query.where(Connection.timestamp <= end)
+
+        buckets = {}
+        for period_start, connection_type, count in db.session.execute(
+                query.group_by(period, Connection.type).order_by(period)):
+            entry = buckets.setdefault(period_start, {'start': period_start, 'total': 0, 'counts': {}})
+            entry['counts'][connection_type] = count
+            entry['total'] += count
+        return {
+            'bucket': bucket,
+            'min': next(iter(buckets), None),
+            'max': next(reversed(buckets), None),
+            'buckets': list(buckets.values())
+        }
+
+    return cached_case_response(case_id, build)
+
+@app.route('/api/entities/lookup', methods=['GET'])
+def lookup_identifier():
+    """Entities in any case holding an identifier (phone, IMEI, email, wallet...)
+
+    The value is normalized the same way as indexed metadata, so
+    `+91 98765-43210` finds `+919876543210`. Pass `kind=` to restrict the match.
+    """
+    value = request.args.get('value', '').strip()
+    kind = request.args.get('kind')
+    if not value:
+        return jsonify({'error': 'value is required'}), 400
+    if kind and kind not in identifiers.KINDS:
+        return jsonify({'error': f"kind must be one of: {', '.join(identifiers.KINDS)}"}), 400
+    try:
+        limit = min(positive_arg('limit', 100), app.config['MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    candidates = {
+        (identifiers.normalize(candidate_kind, value), candidate_kind)
+        for candidate_kind in ([kind] if kind else identifiers.KINDS)
+    }
+    candidates = {(normalized, k) for normalized, k in candidates if normalized}
+    if not candidates:
+        return jsonify({'value': value, 'matches': []})
+    rows = db.session.query(EntityIdentifier, Entity.label, Entity.type, Case.title, Case.storage) \
+        .outerjoin(Entity, Entity.id == EntityIdentifier.entity_id) \
+        .join(Case, Case.id == EntityIdentifier.case_id) \
+        .filter(db.tuple_(EntityIdentifier.value, EntityIdentifier.kind).in_(candidates)) \
+        .order_by(EntityIdentifier.case_id, EntityIdentifier.entity_id).limit(limit).all()
+
+    # Entities of sharded cases are read from their shards
+    sharded = {}
+    for identifier, _, _, _, storage in rows:
+        if storage:
+            sharded.setdefault(identifier.case_id, []).append(identifier.entity_id)
+    details = {}
+    for case_id, entity_ids in sharded.items():
+        with case_scope(case_id):
+            for entity_id, label, entity_type in db.session.execute(
+                    db.select(Entity.id, Entity.label, Entity.type)
+                    .where(Entity.case_id == case_id, Entity.id.in_(entity_ids))):
+                details[case_id, entity_id] = (label, entity_type)
+    matches = []
+    for identifier, label, entity_type, title, storage in rows:
+        if storage:
+            label, entity_type = details.get((identifier.case_id, identifier.entity_id), (None, None))
+        matches.append({**identifier.to_dict(), 'label': label, 'type': entity_type, 'case_title': title})
+    return jsonify({'value': value, 'matches': matches})
+
+@app.route('/api/cases/<case_id>/links', methods=['GET'])
+def get_case_links(case_id):
+    """Other cases sharing an identifier with this case, with the shared identifiers"""
+    Case.query.get_or_404(case_id)
+    try:
+        limit = min(positive_arg('limit', 500), app.config['MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    local = db.aliased(EntityIdentifier)
+    other = db.aliased(EntityIdentifier)
+    rows = db.session.query(local.kind, local.value, local.entity_id, other.case_id, other.entity_id) \
+        .join(other, db.and_(other.value == local.value, other.kind == local.kind,
+                             other.case_id != local.case_id)) \
+        .filter(local.case_id == case_id) \
+        .order_by(other.case_id, local.kind, local.value).limit(limit)
+
+    linked = {}
+    for kind, value, entity_id, other_case_id, other_entity_id in rows:
+        linked.setdefault(other_case_id, []).append({
+            'kind': kind, 'value': value, 'entity_id': entity_id, 'other_entity_id': other_entity_id
+        })
+    titles = dict(db.session.execute(
+        db.select(Case.id, Case.title).where(Case.id.in_(list(linked)))
+    ).all()) if linked else {}
     return jsonify({
-        'nodes': [entity.to_dict() for entity in entities],
-        'edges': [conn.to_dict() for conn in connections]
+        'case_id': case_id,
+        'cases': [
+            {'case_id': other_case_id, 'title': titles.get(other_case_id), 'shared': shared}
+            for other_case_id, shared in linked.items()
+        ]
     })
 
 @app.route('/api/search/cases', methods=['GET'])
@@ -251,17 +2448,84 @@ def search_cases():
     if officer_id:
         query = query.filter_by(officer_id=officer_id)
     
-    # Search by title
-    search = request.args.get('search')
-    if search:
+    # Search by title and description; a blank search filters nothing
+    search = request.args.get('search', '').strip()
+    if search and db.engine.dialect.name == 'sqlite':
+        query = query.filter(search_index.case_rowids_matching(search))
+    elif search:
         query = query.filter(Case.title.contains(search))
     
-    cases = query.all()
-    return jsonify([case.to_dict() for case in cases])
+    return list_response(Case, query, {'stats': add_case_stats})
+
+@app.route('/api/search/facets', methods=['GET'])
+def search_facets():
+    """Number of cases per status, crime type and officer
+
+    Takes the filters of /api/search/cases; each facet is counted under the
+    filters on the others. Counts come from the materialized `case_facets`
+    table, except with ?search=, which counts the matching cases.
+    """
+    filters = {name: request.args[name] for name in facets.CASE_FACETS if request.args.get(name)}
+    search = request.args.get('search', '').strip()
+    source = None
+    if search or db.engine.dialect.name != 'sqlite':
+        matching = db.select(Case.status, Case.crime_type, Case.officer_id, db.literal(1).label('count'))
+        if search and db.engine.dialect.name == 'sqlite':
+            matching = matching.where(search_index.case_rowids_matching(search))
+        elif search:
+            matching = matching.where(Case.title.contains(search))
+        source = matching.subquery()
+    total, counts = facets.counts(db.session.connection(), filters, source)
+    return jsonify({'total': total, 'facets': counts})
+
+@app.route('/api/search/all', methods=['GET'])
+def search_all():
+    """Full-text search over cases, entity labels and metadata, and evidence
+
+    Hits are ranked by BM25 and grouped by case, best case first.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Full-text search requires SQLite FTS5'}), 501
+    try:
+        limit = min(positive_arg('limit', 50), app.config['MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    window = app.config['SEARCH_RANK_WINDOW']
+    hits = search_index.search(db.session.connection(), q, limit, window)
+    # Entities and connections of sharded cases are indexed in their shards
+    for case_id, storage in db.session.execute(
+            db.select(Case.id, Case.storage).where(Case.storage.is_not(None))).all():
+        with shard_engine(case_id, storage).connect() as conn:
+            hits += search_index.search(conn, q, limit, window, kinds=('entity', 'connection'))
+    hits.sort(key=lambda hit: hit['score'])
+
+    grouped = {}
+    for hit in hits[:limit]:
+        case_hits = grouped.setdefault(hit.pop('case_id'), {'score': hit['score'], 'hits': []})
+        case_hits['hits'].append(hit)
+
+    titles = dict(db.session.execute(
+        db.select(Case.id, Case.title).where(Case.id.in_(list(grouped)))
+    ).all()) if grouped else {}
+    return jsonify({
+        'query': q,
+        'cases': [
+            {'case_id': case_id, 'title': titles.get(case_id), **case_hits}
+            for case_id, case_hits in grouped.items()
+        ]
+    })
 
 if __name__ == '__main__':
+    from migrate import run_migrations
+
     with app.app_context():
         db.create_all()
+        run_migrations()
         print("Database tables created successfully!")
     
-    app.run(debug=True, port=5000)
+    # Development server only; use wsgi.py to serve in production
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,120 @@
+"""Chunked, set-based removal of a case's rows, and cold-storage archives.
+
+Deleting a case through the ORM cascade loads every entity and connection
+into the session and deletes them one at a time. Here rows are removed with
+`DELETE ... WHERE case_id = ? AND key IN (...)` a chunk at a time, each chunk
+in its own short transaction, so the SQLite write lock is released between
+chunks and other writers and readers keep going while a large case is
+removed.
+
+An archive moves the rows instead: each case gets its own SQLite file in the
+archive folder, attached to the connection as schema `archive`, and every
+chunk is copied with `INSERT ... SELECT` before it is deleted. Restoring
+moves the rows back the same way.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+
+from sqlalchemy import bindparam, create_engine, text
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+def case_file_name(case_id):
+    """File name stem unique to a case id.
+
+    The id's file-name-safe characters keep the name readable; the digest of
+    the whole id keeps ids that reduce to the same characters ("A B", "A_B")
+    or differ only in case apart on every file system.
+    """
+    readable = re.sub(r'[^A-Za-z0-9_.-]', '_', case_id)[:48]
+    return f'{readable}-{hashlib.sha1(case_id.encode()).hexdigest()}'
+
+
+def archive_path(folder, case_id):
+    """Archive file of a case"""
+    return os.path.join(folder, f'{case_file_name(case_id)}.db')
+
+
+def archived_cases(path):
+    """Ids of the cases whose rows an archive file holds"""
+    if not os.path.exists(path):
+        return set()
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cases'").fetchone():
+            return set()
+        return {row[0] for row in conn.execute('SELECT id FROM cases')}
+    finally:
+        conn.close()
+
+
+def create_archive(path, tables):
+    """Create the archive file of a case with the given model tables"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    engine = create_engine('sqlite:///' + path)
+    try:
+        tables[0].metadata.create_all(engine, tables=tables)
+    finally:
+        engine.dispose()
+
+
+def attach(conn, path):
+    """Attach an archive file as schema `archive`; must run outside a transaction"""
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+
+
+def detach(conn):
+    conn.exec_driver_sql(f'DETACH DATABASE {ARCHIVE_SCHEMA}')
+
+
+def copy_case(conn, case_id, columns, status):
+    """Keep a copy of the case row, with the status it had before archiving"""
+    names = ', '.join(columns)
+    params = {'case_id': case_id, 'status': status}
+    conn.execute(text(
+        f'INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.cases ({names}) SELECT {names} FROM main.cases WHERE id = :case_id'
+    ), params)
+    conn.execute(text(f'UPDATE {ARCHIVE_SCHEMA}.cases SET status = :status WHERE id = :case_id'), params)
+
+
+def archived_status(conn, case_id):
+    """Status the case had before it was archived"""
+    return conn.execute(text(f'SELECT status FROM {ARCHIVE_SCHEMA}.cases WHERE id = :case_id'),
+                        {'case_id': case_id}).scalar()
+
+
+def count_rows(conn, case_id, tables, schema='main'):
+    """Rows a case has in each of `tables`"""
+    return sum(
+        conn.execute(text(f'SELECT count(*) FROM {schema}.{table} WHERE case_id = :case_id'),
+                     {'case_id': case_id}).scalar()
+        for table in tables
+    )
+
+
+def move_chunk(conn, table, key, case_id, limit, source='main', target=None, columns=None):
+    """Move up to `limit` keys' worth of a case's rows from `source` to `target`.
+
+    With no `target` the rows are only deleted. `key` selects the chunk and
+    need not be unique (identifier rows are chunked by entity). Returns the
+    keys of the chunk and the number of rows removed from `source`.
+    """
+    keys = conn.execute(text(
+        f'SELECT DISTINCT {key} FROM {source}.{table} WHERE case_id = :case_id ORDER BY {key} LIMIT :limit'
+    ), {'case_id': case_id, 'limit': limit}).scalars().all()
+    if not keys:
+        return keys, 0
+    params = {'case_id': case_id, 'keys': keys}
+    if target:
+        names = ', '.join(columns)
+        conn.execute(text(
+            f'INSERT OR REPLACE INTO {target}.{table} ({names}) SELECT {names} FROM {source}.{table} '
+            f'WHERE case_id = :case_id AND {key} IN :keys'
+        ).bindparams(bindparam('keys', expanding=True)), params)
+    removed = conn.execute(text(
+        f'DELETE FROM {source}.{table} WHERE case_id = :case_id AND {key} IN :keys'
+    ).bindparams(bindparam('keys', expanding=True)), params).rowcount
+    return keys, removed
@@ -0,0 +1,373 @@
+"""ASGI entry point for the Forensi-Link API.
+
+Serves the same Flask app, routes and models from an asyncio server:
+
+    python asgi.py
+    uvicorn asgi:app --host 127.0.0.1 --port 5000
+
+The event loop owns every client connection, so slow or idle clients and
+open `/stream` subscriptions cost no thread. Route bodies run unchanged on a
+pool of `ASGI_THREADS` worker threads, because their blocking work (SQLite
+reads and writes, graph algorithms, JSON and msgpack encoding) holds a thread
+whichever driver issues it: async SQLite drivers run each connection on a
+thread of their own too. Response bodies are also produced on the pool.
+
+At most `ASGI_MAX_CONCURRENCY` requests run at once. Requests beyond that
+wait in per-client queues served round-robin, and one client (the remote
+address, or the `ASGI_CLIENT_HEADER` header) runs at most
+`ASGI_CLIENT_CONCURRENCY` of them, so an analyst opening many large graphs
+does not hold up everyone else. When `ASGI_QUEUE_SIZE` requests are waiting,
+new ones get `503`. Event streams give up their slot once their headers are
+sent and are then fed from a separate pool of `ASGI_STREAM_THREADS` threads.
+
+The app call, every step of its response iterator and its `close()` run in
+one context copied per request, whichever worker thread runs them, so
+`stream_with_context` bodies keep their Flask request and app context.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from app import app as flask_app, db, registry
+
+# Marks the end of a response body iterator
+_DONE = object()
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full"""
+
+
+class FairLimiter:
+    """Admit at most `limit` requests at once, at most `per_client` per client.
+
+    Waiting requests are queued per client and clients are served
+    round-robin, so a client with many queued requests gets one turn per
+    round like everyone else. Runs on the event loop; not thread-safe.
+    """
+
+    def __init__(self, limit, per_client, queue_size):
+        self.limit = limit
+        self.per_client = per_client
+        self.queue_size = queue_size
+        self.active = 0
+        self.running = Counter()
+        self.waiting = OrderedDict()
+        self.queued = 0
+        self.rejected = 0
+
+    async def acquire(self, client):
+        if self.active < self.limit and self.running[client] < self.per_client and client not in self.waiting:
+            self._admit(client)
+            return
+        if self.queued >= self.queue_size:
+            self.rejected += 1
+            raise Overloaded()
+        admitted = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(client, deque()).append(admitted)
+        self.queued += 1
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if admitted.done() and not admitted.cancelled():
+                self.release(client)
+            else:
+                self._forget(client, admitted)
+            raise
+
+    def release(self, client):
+        self.active -= 1
+        self.running[client] -= 1
+        if not self.running[client]:
+            del self.running[client]
+        self._dispatch()
+
+    def stats(self):
+        return {'active': self.active, 'queued': self.queued, 'clients': len(self.running),
+                'rejected': self.rejected}
+
+    def _admit(self, client):
+        self.active += 1
+        self.running[client] += 1
+
+    def _forget(self, client, admitted):
+        queue = self.waiting.get(client)
+        if queue and admitted in queue:
+            queue.remove(admitted)
+            self.queued -= 1
+            if not queue:
+                del self.waiting[client]
+
+    def _dispatch(self):
+        while self.active < self.limit:
+            # The first client in rotation order below its own limit goes next
+            client = next((c for c in self.waiting if self.running[c] < self.per_client), None)
+            if client is None:
+                return
+            queue = self.waiting[client]
+            admitted = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.waiting.move_to_end(client)
+            else:
+                del self.waiting[client]
+            self._admit(client)
+            admitted.set_result(None)
+
+
+class RequestBody:
+    """`wsgi.input` that pulls the ASGI request body from a worker thread"""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = bytearray()
+        self.more = True
+
+    def _fill(self):
+        message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+        if message['type'] == 'http.disconnect':
+            self.more = False
+            raise OSError('Client disconnected')
+        self.buffer += message.get('body', b'')
+        self.more = message.get('more_body', False)
+
+    def _take(self, size):
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
+
+    def read(self, size=-1):
+        while self.more and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        return self._take(len(self.buffer) if size is None or size < 0 else size)
+
+    def readline(self, size=-1):
+        while self.more and b'\n' not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        return self._take(end)
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def wsgi_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class AsgiApp:
+    """ASGI application running a WSGI app on worker threads behind a FairLimiter"""
+
+    def __init__(self, wsgi_app, threads=16, max_concurrency=None, client_concurrency=4, queue_size=1024,
+                 stream_threads=256, client_header=None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.stream_threads = stream_threads
+        self.limiter = FairLimiter(max_concurrency or threads, client_concurrency, queue_size)
+        self.client_header = client_header.lower().encode('latin-1') if client_header else None
+        self.executor = None
+        self.stream_executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi-worker')
+            self.stream_executor = ThreadPoolExecutor(self.stream_threads, thread_name_prefix='asgi-stream')
+
+    def shutdown(self):
+        for executor in (self.executor, self.stream_executor):
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.stream_executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            self.start()
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def client_key(self, scope):
+        if self.client_header:
+            for name, value in scope['headers']:
+                if name == self.client_header:
+                    return value.decode('latin-1')
+        return (scope.get('client') or ('',))[0]
+
+    async def http(self, scope, receive, send):
+        client = self.client_key(scope)
+        try:
+            await self.limiter.acquire(client)
+        except Overloaded:
+            await send({'type': 'http.response.start', 'status': 503,
+                        'headers': [(b'content-type', b'application/json'), (b'retry-after', b'1')]})
+            await send({'type': 'http.response.body', 'body': orjson.dumps({'error': 'Server is busy; retry shortly'})})
+            return
+
+        admitted = True
+        loop = asyncio.get_running_loop()
+        try:
+            started = {}
+            written = []
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and started.get('sent'):
+                    raise exc_info[1].with_traceback(exc_info[2])
+                started['status'] = int(status.split(' ', 1)[0])
+                started['headers'] = headers
+                return write
+
+            def write(data):
+                # Sent ahead of the returned iterable, once the app returns
+                written.append(bytes(data))
+
+            environ = wsgi_environ(scope, RequestBody(receive, loop))
+            context = contextvars.copy_context()
+            body = await loop.run_in_executor(self.executor, context.run, self.wsgi_app, environ, start_response)
+            chunks = iter(body)
+            executor = self.executor
+            try:
+                if written:
+                    first = b''.join(written)
+                elif 'status' in started:
+                    first = _DONE
+                else:
+                    first = await loop.run_in_executor(executor, context.run, next, chunks, _DONE)
+                streaming = any(name.lower() == 'content-type' and value.startswith('text/event-stream')
+                                for name, value in started['headers'])
+                await send({
+                    'type': 'http.response.start', 'status': started['status'],
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in started['headers']],
+                })
+                started['sent'] = True
+                if streaming:
+                    # A subscription would hold its slot for as long as it stays open
+                    self.limiter.release(client)
+                    admitted = False
+                    executor = self.stream_executor
+                await self.send_body(first, chunks, context, executor, receive, send, streaming)
+            finally:
+                close = getattr(body, 'close', None)
+                if close:
+                    await loop.run_in_executor(executor, context.run, close)
+        finally:
+            if admitted:
+                self.limiter.release(client)
+
+    async def send_body(self, first, chunks, context, executor, receive, send, streaming):
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.Event()
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch()) if streaming else None
+        try:
+            chunk = first
+            while True:
+                if chunk is _DONE:
+                    chunk = await loop.run_in_executor(executor, context.run, next, chunks, _DONE)
+                    if chunk is _DONE:
+                        break
+                if disconnected.is_set():
+                    return
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': bytes(chunk), 'more_body': True})
+                chunk = _DONE
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if watcher:
+                watcher.cancel()
+
+
+app = AsgiApp(
+    flask_app,
+    threads=int(os.environ.get('ASGI_THREADS', 16)),
+    max_concurrency=int(os.environ.get('ASGI_MAX_CONCURRENCY', 0)) or None,
+    client_concurrency=int(os.environ.get('ASGI_CLIENT_CONCURRENCY', 4)),
+    queue_size=int(os.environ.get('ASGI_QUEUE_SIZE', 1024)),
+    stream_threads=int(os.environ.get('ASGI_STREAM_THREADS', 256)),
+    client_header=os.environ.get('ASGI_CLIENT_HEADER'),
+)
+registry.gauge('forensilink_asgi_active_requests', 'Requests running on ASGI worker threads',
+               lambda: app.limiter.stats()['active'])
+registry.gauge('forensilink_asgi_queued_requests', 'Requests waiting for an ASGI worker',
+               lambda: app.limiter.stats()['queued'])
+registry.gauge('forensilink_asgi_rejected_requests', 'Requests refused with 503 because the queue was full',
+               lambda: app.limiter.stats()['rejected'])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    from migrate import run_migrations
+
+    with flask_app.app_context():
+        db.create_all()
+        run_migrations()
+
+    uvicorn.run(
+        app,
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 5000)),
+        log_level='warning',
+        backlog=int(os.environ.get('ASGI_BACKLOG', 2048)),
+    )
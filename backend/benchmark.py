@@ -0,0 +1,777 @@
+"""Performance benchmarks for the Forensi-Link API.
+
+Each benchmark builds a throwaway SQLite database with synthetic cases, so it
+never touches `forensilink.db`.
+
+Usage:
+    python benchmark.py indexes --scales 10000,100000,1000000
+    python benchmark.py bulk --scales 10000,200000 --target 20000
+    python benchmark.py search --scales 100000,1000000
+    python benchmark.py concurrency --scales 100000 --readers 8
+    python benchmark.py transport --scales 10000,100000,500000
+    python benchmark.py serialize --scales 10000,100000,500000
+    python benchmark.py routes --scales 10000,100000,1000000 --baseline 1a2b3c4
+    python benchmark.py servers --scales 200000 --cases 50 --clients 128 --duration 30
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ENTITY_TYPES = ['person', 'phone', 'financial', 'location', 'keyword', 'organization']
+CONNECTION_TYPES = ['Phone Call', 'Message', 'Transaction', 'Meeting', 'Email']
+
+
+def use_temp_database():
+    """Point the app at a fresh temporary database; call before importing app"""
+    fd, path = tempfile.mkstemp(prefix='forensilink-bench-', suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['ARCHIVE_FOLDER'] = path[:-len('.db')] + '-archive'
+    os.environ['SHARD_FOLDER'] = path[:-len('.db')] + '-shards'
+    os.environ['SHARD_COLD_FOLDER'] = os.path.join(os.environ['SHARD_FOLDER'], 'cold')
+    return path
+
+
+def populate(conn, n_edges, n_cases=50, seed=47):
+    """Insert `n_cases` cases sharing `n_edges` connections between them.
+
+    Connections are interleaved across cases, as they are when several
+    extractions are ingested side by side, so a case's rows are not contiguous.
+    """
+    from app import Case, Entity, Connection
+
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    entities_per_case = max(2, n_edges // n_cases // 10)
+    case_ids = [f'BENCH-{i:03d}' for i in range(n_cases)]
+
+    conn.execute(Case.__table__.insert(), [
+        {'id': case_id, 'title': f'Benchmark case {case_id}', 'status': 'active',
+         'created_at': start, 'updated_at': start}
+        for case_id in case_ids
+    ])
+    for case_id in case_ids:
+        conn.execute(Entity.__table__.insert(), [
+            {'id': f'{case_id}-e{i}', 'case_id': case_id, 'label': f'Entity {i}',
+             'type': rng.choice(ENTITY_TYPES), 'size': 50, 'meta_data': {'rank': i}}
+            for i in range(entities_per_case)
+        ])
+    batch = []
+    for i in range(n_edges):
+        case_id = case_ids[i % n_cases]
+        batch.append({
+            'id': f'{case_id}-c{i}', 'case_id': case_id,
+            'source': f'{case_id}-e{rng.randrange(entities_per_case)}',
+            'target': f'{case_id}-e{rng.randrange(entities_per_case)}',
+            'type': rng.choice(CONNECTION_TYPES), 'weight': rng.randint(1, 10),
+            'data': {'snippet': f'evidence {i}'},
+            'timestamp': start + timedelta(minutes=rng.randrange(525600)),
+        })
+        if len(batch) == 10000:
+            conn.execute(Connection.__table__.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(Connection.__table__.insert(), batch)
+    return case_ids
+
+
+def time_call(fn, repeat):
+    """Return the median wall time of `fn` in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_concurrency(args):
+    """Reader latency through waitress while a writer bulk-ingests.
+
+    Runs once with SQLite's rollback journal and once with WAL. Readers page
+    through one case's connections while the writer commits NDJSON batches
+    into another; under the rollback journal each commit locks readers out.
+    """
+    import json
+    import threading
+    import urllib.request
+    from waitress.server import create_server
+    from app import app, db
+    from migrate import reset_database
+
+    server = create_server(app, host='127.0.0.1', port=0, threads=args.readers + 2)
+    threading.Thread(target=server.run, daemon=True).start()
+    base = f'http://127.0.0.1:{server.effective_port}/api'
+    rng = random.Random(47)
+
+    print(f"{'journal':>8} {'reads':>7} {'read p50':>9} {'read p99':>9} {'read max':>9} "
+          f"{'write rows/s':>13}")
+    for mode in ('DELETE', 'WAL'):
+        app.config['SQLITE_JOURNAL_MODE'] = mode
+        with app.app_context():
+            db.engine.dispose()
+            reset_database()
+            with db.engine.begin() as conn:
+                read_case, write_case = populate(conn, args.scales[0], n_cases=2)
+            db.engine.dispose()
+
+        stop = threading.Event()
+        latencies = []
+
+        def read():
+            url = f'{base}/cases/{read_case}/connections?limit=200'
+            while not stop.is_set():
+                started = time.perf_counter()
+                with urllib.request.urlopen(url) as response:
+                    response.read()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        readers = [threading.Thread(target=read) for _ in range(args.readers)]
+        for reader in readers:
+            reader.start()
+
+        rows = 0
+        started = time.perf_counter()
+        for batch in range(args.batches):
+            body = ''.join(
+                json.dumps({'id': f'w{mode}{batch}-{i}', 'source': f'{write_case}-e{rng.randrange(100)}',
+                            'target': f'{write_case}-e{rng.randrange(100)}', 'type': 'Phone Call',
+                            'data': {'snippet': f'ingest {i}'}}) + '\n'
+                for i in range(5000)
+            ).encode()
+            request = urllib.request.Request(f'{base}/cases/{write_case}/connections:bulk', data=body,
+                                             headers={'Content-Type': 'application/x-ndjson'})
+            with urllib.request.urlopen(request) as response:
+                rows += json.loads(response.read())['written']
+        write_rate = rows / (time.perf_counter() - started)
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+        print(f'{mode:>8} {len(latencies):>7} {percentile(latencies, 50):>7.1f}ms '
+              f'{percentile(latencies, 99):>7.1f}ms {max(latencies):>7.1f}ms {write_rate:>13.0f}')
+    server.close()
+
+
+def load_clients(port, clients, case_ids, duration, seed):
+    """Run `clients` (client id, kind) keep-alive connections for `duration` seconds.
+
+    Runs in a process of its own so the load generator does not share a GIL
+    with its threads' parsing; returns (kind, status, milliseconds) per request.
+    """
+    import http.client
+    import threading
+
+    deadline = time.perf_counter() + duration
+    results = []
+
+    def run(client_id, kind, rng):
+        connection = None
+        while time.perf_counter() < deadline:
+            case_id = rng.choice(case_ids)
+            if kind == 'heavy':
+                path = f'/api/cases/{case_id}/connections'
+            else:
+                path = rng.choice([f'/api/cases/{case_id}/entities?limit=50', '/api/cases?limit=50',
+                                   '/api/search/facets?status=active', f'/api/cases/{case_id}'
+                                   f'/connections?limit=20&fields=id,source,target'])
+            started = time.perf_counter()
+            try:
+                connection = connection or http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+                connection.request('GET', path, headers={'X-Client-Id': client_id})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection, status = None, 0
+            results.append((kind, status, (time.perf_counter() - started) * 1000))
+
+    threads = [threading.Thread(target=run, args=(client_id, kind, random.Random(f'{seed}-{client_id}-{i}')))
+               for i, (client_id, kind) in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def bench_servers(args):
+    """Sustained req/s and tail latency of wsgi.py (waitress) and asgi.py (uvicorn).
+
+    Both servers get `--threads` worker threads and the same database. Of the
+    `--clients` keep-alive connections, half belong to 4 analysts who each
+    load whole connection lists of random cases over many connections at
+    once; every other connection is an analyst of its own reading pages and
+    facets. The ASGI server identifies analysts by their X-Client-Id header,
+    so its per-client limit and round-robin queue apply.
+    """
+    import socket
+    import subprocess
+    import urllib.request
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    from app import app, db
+    from migrate import reset_database
+
+    with app.app_context():
+        reset_database()
+        with db.engine.begin() as conn:
+            case_ids = populate(conn, args.scales[0], n_cases=args.cases)
+        db.engine.dispose()
+
+    heavy = args.clients // 2
+    clients = [(f'bulk-{i % 4}', 'heavy') for i in range(heavy)]
+    clients += [(f'analyst-{i}', 'light') for i in range(args.clients - heavy)]
+    processes = max(1, min(4, args.clients // 32))
+    print(f'{args.scales[0]} edges in {args.cases} cases, {args.clients} clients, '
+          f'{args.threads} worker threads, {args.duration}s per server')
+    print(f"{'server':>8} {'kind':>6} {'requests':>9} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'max':>9} {'errors':>7}")
+    for name, script in (('wsgi', 'wsgi.py'), ('asgi', 'asgi.py')):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, PORT=str(port), WSGI_THREADS=str(args.threads), ASGI_THREADS=str(args.threads),
+                   ASGI_CLIENT_HEADER='X-Client-Id', DB_POOL_SIZE=str(args.threads + 4))
+        server = subprocess.Popen([sys.executable, script], env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            for _ in range(300):
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health')
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            with ProcessPoolExecutor(processes, mp_context=get_context('spawn')) as pool:
+                runs = [pool.submit(load_clients, port, clients[i::processes], case_ids, args.duration, i)
+                        for i in range(processes)]
+                results = [row for run in runs for row in run.result()]
+        finally:
+            server.terminate()
+            server.wait()
+        for kind in ('heavy', 'light'):
+            latencies = [ms for k, status, ms in results if k == kind and status == 200]
+            errors = sum(1 for k, status, _ in results if k == kind and status != 200)
+            print(f'{name:>8} {kind:>6} {len(latencies):>9} {len(latencies) / args.duration:>8.1f} '
+                  f'{percentile(latencies, 50):>7.1f}ms {percentile(latencies, 95):>7.1f}ms '
+                  f'{percentile(latencies, 99):>7.1f}ms {max(latencies, default=0):>7.1f}ms {errors:>7}')
+
+
+def bench_indexes(args):
+    """Graph-load latency with and without the composite case indexes"""
+    from sqlalchemy import text
+    from app import app, db, Connection
+    from migrate import reset_database, run_migrations
+
+    client = app.test_client()
+    print(f"{'edges':>10} {'query (no idx)':>15} {'query (idx)':>12} "
+          f"{'graph (no idx)':>15} {'graph (idx)':>12}")
+    for scale in args.scales:
+        with app.app_context():
+            reset_database()
+            with db.engine.begin() as conn:
+                conn.execute(text('DELETE FROM schema_migrations'))
+                for index in list(Connection.__table__.indexes):
+                    conn.execute(text(f'DROP INDEX {index.name}'))
+                for index in list(db.metadata.tables['entities'].indexes):
+                    conn.execute(text(f'DROP INDEX {index.name}'))
+                case_ids = populate(conn, scale, n_cases=args.cases)
+            case_id = case_ids[len(case_ids) // 2]
+
+            def query():
+                with db.engine.connect() as conn:
+                    conn.execute(text('SELECT * FROM entities WHERE case_id = :c'), {'c': case_id}).all()
+                    conn.execute(text('SELECT * FROM connections WHERE case_id = :c'), {'c': case_id}).all()
+
+            def graph():
+                response = client.get(f'/api/cases/{case_id}/graph')
+                assert response.status_code == 200
+
+            before = time_call(query, args.repeat), time_call(graph, args.repeat)
+            run_migrations()
+            after = time_call(query, args.repeat), time_call(graph, args.repeat)
+        print(f'{scale:>10} {before[0]:>13.1f}ms {after[0]:>10.1f}ms '
+              f'{before[1]:>13.1f}ms {after[1]:>10.1f}ms')
+
+
+def bench_bulk(args):
+    """Ingest throughput of the :bulk endpoints against one-row-per-request"""
+    import json
+    from app import app, db, Case
+    from migrate import reset_database
+
+    client = app.test_client()
+    rng = random.Random(47)
+    with app.app_context():
+        reset_database()
+        db.session.add(Case(id='BULK', title='Bulk ingest benchmark'))
+        db.session.commit()
+
+    def connection(i):
+        return {'id': f'c{i}', 'source': f'e{rng.randrange(1000)}', 'target': f'e{rng.randrange(1000)}',
+                'type': rng.choice(CONNECTION_TYPES), 'weight': rng.randint(1, 10),
+                'data': {'snippet': f'evidence {i}'}, 'timestamp': '2025-03-15T10:30:00'}
+
+    single = min(500, args.scales[0])
+    started = time.perf_counter()
+    for i in range(single):
+        client.post('/api/cases/BULK/connections', json=connection(-i - 1))
+    single_rate = single / (time.perf_counter() - started)
+    print(f"{'rows':>10} {'single rows/s':>14} {'bulk rows/s':>12} {'target':>8}")
+
+    offset = 0
+    for scale in args.scales:
+        body = ''.join(json.dumps(connection(offset + i)) + '\n' for i in range(scale))
+        offset += scale
+        started = time.perf_counter()
+        response = client.post('/api/cases/BULK/connections:bulk', data=body,
+                               content_type='application/x-ndjson')
+        rate = scale / (time.perf_counter() - started)
+        assert response.get_json()['written'] == scale
+        verdict = 'ok' if rate >= args.target else 'MISSED'
+        print(f'{scale:>10} {single_rate:>14.0f} {rate:>12.0f} {verdict:>8}')
+
+
+def bench_search(args):
+    """Latency of /api/search/all over a corpus of evidence snippets"""
+    from app import app, db
+    from migrate import reset_database
+
+    client = app.test_client()
+    queries = ['evidence', 'evidence 4711', 'Entity 42', 'nothing-matches']
+    print(f"{'snippets':>10} " + ' '.join(f'{q[:14]:>15}' for q in queries))
+    for scale in args.scales:
+        with app.app_context():
+            reset_database()
+            with db.engine.begin() as conn:
+                populate(conn, scale, n_cases=args.cases)
+        timings = []
+        for q in queries:
+            timings.append(time_call(lambda: client.get(f'/api/search/all?q={q}&limit=50'), args.repeat))
+        print(f'{scale:>10} ' + ' '.join(f'{t:>13.1f}ms' for t in timings))
+
+
+def bench_transport(args):
+    """Graph payload size and encode/decode time per encoding and compression.
+
+    Server time is an uncached `/graph` request (query, serialize, compress);
+    client time is decompressing and parsing the payload, a proxy for the
+    browser's work.
+    """
+    import json
+    import graph_codec
+    from app import app, db, response_cache
+    from migrate import reset_database
+
+    client = app.test_client()
+    variants = [
+        (media_type, encoding)
+        for media_type in ('application/json', graph_codec.COLUMNAR_JSON, graph_codec.MSGPACK)
+        for encoding in (None, 'gzip', 'br')
+    ]
+    print(f"{'edges':>8} {'format':<42} {'encoding':>8} {'bytes':>12} {'ratio':>6} "
+          f"{'server':>10} {'client':>10}")
+    for scale in args.scales:
+        with app.app_context():
+            reset_database()
+            with db.engine.begin() as conn:
+                case_id = populate(conn, scale, n_cases=1)[0]
+
+        baseline = None
+        for media_type, encoding in variants:
+            headers = {'Accept': media_type}
+            if encoding:
+                headers['Accept-Encoding'] = encoding
+
+            def fetch():
+                response_cache.discard(lambda key: True)
+                return client.get(f'/api/cases/{case_id}/graph', headers=headers)
+
+            payload = fetch().get_data()
+            server = time_call(fetch, args.repeat)
+
+            def parse():
+                body = graph_codec.decompress(payload, encoding)
+                return json.loads(body) if media_type == 'application/json' \
+                    else graph_codec.decode(body, media_type)
+
+            client_ms = time_call(parse, args.repeat)
+            baseline = baseline or len(payload)
+            print(f'{scale:>8} {media_type:<42} {encoding or "-":>8} {len(payload):>12,} '
+                  f'{baseline / len(payload):>5.1f}x {server:>8.1f}ms {client_ms:>8.1f}ms')
+
+
+def bench_serialize(args):
+    """Rows/sec serialized by the list and graph endpoints.
+
+    `orm` is the previous read path, hydrating ORM objects and encoding their
+    `to_dict()` with the standard library; `lean` is the endpoint as served
+    now, selecting plain columns and encoding them with orjson. The response
+    cache is cleared before every request.
+    """
+    import json
+    from app import app, db, Connection, Entity, response_cache
+    from migrate import reset_database
+
+    client = app.test_client()
+    print(f"{'edges':>8} {'endpoint':<12} {'rows':>8} {'orm rows/s':>12} {'lean rows/s':>12} {'speedup':>8}")
+    for scale in args.scales:
+        with app.app_context():
+            reset_database()
+            with db.engine.begin() as conn:
+                case_id = populate(conn, scale, n_cases=1)[0]
+
+        def orm(*models):
+            def run():
+                with app.app_context():
+                    body = [[row.to_dict() for row in model.query.filter_by(case_id=case_id)]
+                            for model in models]
+                    json.dumps(body, sort_keys=True)
+            return run
+
+        def lean(path):
+            def run():
+                response_cache.discard(lambda key: True)
+                client.get(f'/api/cases/{case_id}/{path}').get_data()
+            return run
+
+        with app.app_context():
+            counts = {model: model.query.filter_by(case_id=case_id).count() for model in (Entity, Connection)}
+        endpoints = [
+            ('entities', counts[Entity], orm(Entity), lean('entities')),
+            ('connections', counts[Connection], orm(Connection), lean('connections')),
+            ('graph', counts[Entity] + counts[Connection], orm(Entity, Connection), lean('graph')),
+        ]
+        for name, rows, before, after in endpoints:
+            before_ms = time_call(before, args.repeat)
+            after_ms = time_call(after, args.repeat)
+            print(f'{scale:>8} {name:<12} {rows:>8} {rows / before_ms * 1000:>12,.0f} '
+                  f'{rows / after_ms * 1000:>12,.0f} {before_ms / after_ms:>7.1f}x')
+
+
+def git_revision():
+    """Short commit hash of the working tree, suffixed `-dirty` if it has changes"""
+    import subprocess
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def rss_mb():
+    """(current, peak) resident set size of this process in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        current = peak
+    return current, max(current, peak)
+
+
+def route_scenarios(case_id, write_case, n_entities, phone):
+    """(name, method, rule, build) for each benchmarked request.
+
+    `build(i)` returns the path and test-client keyword arguments of the
+    i-th request; any setup it does is not timed. Streams (`stream=True`) are
+    timed to their first event. Reads run against the large
+    case first, writes go to `write_case` so they never invalidate its caches.
+    """
+    from app import app, db, case_job_executor, Job
+
+    hub, leaf = f'{case_id}-n0', f'{case_id}-n{n_entities - 1}'
+    graph = f'/api/cases/{case_id}/graph'
+
+    def fixed(path, **kwargs):
+        return lambda i: (path, kwargs)
+
+    def new_case(i):
+        return '/api/cases', {'json': {'id': f'ROUTE-NEW-{i}', 'title': 'Route benchmark case'}}
+
+    def small_case(name, i, archived=False):
+        case = f'ROUTE-{name}-{i}'
+        with app.test_client() as setup:
+            setup.post('/api/cases', json={'id': case, 'title': 'Route benchmark case'})
+            setup.post(f'/api/cases/{case}/connections:bulk', data=bulk_body(f'{name}{i}', 100),
+                       content_type='application/x-ndjson')
+            if archived:
+                setup.post(f'/api/cases/{case}/archive')
+        # Case jobs run one at a time, so this waits for any queued before it
+        case_job_executor.submit(lambda: None).result()
+        return f'/api/cases/{case}'
+
+    def delete_case(i):
+        return small_case('DEL', i), {}
+
+    def bulk_body(prefix, rows):
+        import json
+        return ''.join(json.dumps({'id': f'{prefix}-{j}', 'source': f'{write_case}-n{j % 50}',
+                                   'target': f'{write_case}-n{(j * 7) % 50}', 'type': 'Message',
+                                   'data': {'snippet': f'bulk row {j}'}}) + '\n' for j in range(rows))
+
+    def job(i):
+        with app.app_context():
+            if not db.session.get(Job, 'route-benchmark'):
+                db.session.add(Job(id='route-benchmark', kind='ufdr_ingest', case_id=write_case,
+                                   status='completed'))
+                db.session.commit()
+        return '/api/jobs/route-benchmark', {}
+
+    report = (b'<?xml version="1.0"?><project><decodedData><modelType type="Call">'
+              b'<model type="Call" id="call-{i}"><multiModelField name="Parties">'
+              b'<model type="Party"><field name="Identifier"><value>+91 90000 00001</value></field></model>'
+              b'</multiModelField></model></modelType></decodedData></project>')
+
+    return [
+        ('health', 'GET', '/api/health', fixed('/api/health')),
+        ('metrics', 'GET', '/api/metrics', fixed('/api/metrics')),
+        ('cache stats', 'GET', '/api/cache/stats', fixed('/api/cache/stats')),
+        ('cases', 'GET', '/api/cases', fixed('/api/cases')),
+        ('case', 'GET', '/api/cases/<case_id>', fixed(f'/api/cases/{case_id}')),
+        ('entities', 'GET', '/api/cases/<case_id>/entities', fixed(f'/api/cases/{case_id}/entities')),
+        ('entities page', 'GET', '/api/cases/<case_id>/entities',
+         fixed(f'/api/cases/{case_id}/entities?limit=200&after={case_id}-n5')),
+        ('connections', 'GET', '/api/cases/<case_id>/connections', fixed(f'/api/cases/{case_id}/connections')),
+        ('graph', 'GET', '/api/cases/<case_id>/graph', fixed(graph)),
+        ('graph window', 'GET', '/api/cases/<case_id>/graph', fixed(f'{graph}?from=2024-06-01&to=2024-06-30')),
+        ('graph msgpack br', 'GET', '/api/cases/<case_id>/graph',
+         fixed(graph, headers={'Accept': 'application/msgpack', 'Accept-Encoding': 'br'})),
+        ('graph ndjson', 'GET', '/api/cases/<case_id>/graph', fixed(f'{graph}?format=ndjson')),
+        ('graph layout', 'GET', '/api/cases/<case_id>/graph', fixed(f'{graph}?layout=true')),
+        ('graph lod=type', 'GET', '/api/cases/<case_id>/graph', fixed(f'{graph}?lod=type')),
+        ('graph lod=community', 'GET', '/api/cases/<case_id>/graph', fixed(f'{graph}?lod=community')),
+        ('graph changes', 'GET', '/api/cases/<case_id>/graph/changes', fixed(f'{graph}/changes?since=0')),
+        ('stream', 'GET', '/api/cases/<case_id>/stream', fixed(f'/api/cases/{case_id}/stream', stream=True)),
+        ('supernode', 'GET', '/api/cases/<case_id>/graph/supernodes/<supernode_id>',
+         fixed(f'{graph}/supernodes/type:location')),
+        ('timeline', 'GET', '/api/cases/<case_id>/timeline', fixed(f'/api/cases/{case_id}/timeline?bucket=day')),
+        ('paths', 'GET', '/api/cases/<case_id>/paths',
+         fixed(f'/api/cases/{case_id}/paths?source={leaf}&target={hub}')),
+        ('neighbors', 'GET', '/api/cases/<case_id>/neighbors/<entity_id>',
+         fixed(f'/api/cases/{case_id}/neighbors/{hub}?hops=2')),
+        ('match', 'POST', '/api/cases/<case_id>/match',
+         fixed(f'/api/cases/{case_id}/match', json={
+             'nodes': {'person': {'type': 'person'}, 'phone': {'type': 'phone'}, 'contact': {'type': 'person'}},
+             'edges': [{'source': 'person', 'target': 'phone', 'type': 'Phone Call', 'directed': False},
+                       {'source': 'phone', 'target': 'contact', 'type': ['Phone Call', 'SMS'], 'directed': False}],
+             'within_days': 7, 'ordered': True})),
+        ('analytics', 'GET', '/api/cases/<case_id>/analytics', fixed(f'/api/cases/{case_id}/analytics')),
+        ('layout', 'GET', '/api/cases/<case_id>/layout', fixed(f'/api/cases/{case_id}/layout')),
+        ('lookup', 'GET', '/api/entities/lookup', fixed(f'/api/entities/lookup?value={phone}')),
+        ('links', 'GET', '/api/cases/<case_id>/links', fixed(f'/api/cases/{case_id}/links')),
+        ('search cases', 'GET', '/api/search/cases', fixed('/api/search/cases?search=synthetic&status=active')),
+        ('search all', 'GET', '/api/search/all', fixed('/api/search/all?q=payment%20harbor&limit=50')),
+        ('search facets', 'GET', '/api/search/facets', fixed('/api/search/facets?status=active')),
+        ('job', 'GET', '/api/jobs/<job_id>', job),
+        ('create case', 'POST', '/api/cases', new_case),
+        ('update case', 'PUT', '/api/cases/<case_id>',
+         lambda i: (f'/api/cases/{write_case}', {'json': {'status': 'active' if i % 2 else 'closed'}})),
+        ('create entity', 'POST', '/api/cases/<case_id>/entities',
+         lambda i: (f'/api/cases/{write_case}/entities',
+                    {'json': {'id': f'route-e{i}', 'label': f'Entity {i}', 'type': 'phone',
+                              'metadata': {'phone': f'+91 80000 {i:05d}'}}})),
+        ('create connection', 'POST', '/api/cases/<case_id>/connections',
+         lambda i: (f'/api/cases/{write_case}/connections',
+                    {'json': {'id': f'route-c{i}', 'source': f'{write_case}-n1', 'target': f'route-e{i}',
+                              'type': 'Phone Call'}})),
+        ('bulk entities', 'POST', '/api/cases/<case_id>/entities:bulk',
+         lambda i: (f'/api/cases/{write_case}/entities:bulk',
+                    {'json': [{'id': f'route-b{i}-{j}', 'label': f'Bulk {j}', 'type': 'person'}
+                              for j in range(1000)]})),
+        ('bulk connections', 'POST', '/api/cases/<case_id>/connections:bulk',
+         lambda i: (f'/api/cases/{write_case}/connections:bulk',
+                    {'data': bulk_body(f'route-bc{i}', 1000), 'content_type': 'application/x-ndjson'})),
+        ('refresh analytics', 'POST', '/api/cases/<case_id>/analytics',
+         fixed(f'/api/cases/{write_case}/analytics')),
+        ('refresh layout', 'POST', '/api/cases/<case_id>/layout',
+         fixed(f'/api/cases/{write_case}/layout')),
+        ('delete case', 'DELETE', '/api/cases/<case_id>', delete_case),
+        ('archive case', 'POST', '/api/cases/<case_id>/archive',
+         lambda i: (small_case('ARC', i) + '/archive', {})),
+        ('restore case', 'POST', '/api/cases/<case_id>/restore',
+         lambda i: (small_case('RES', i, archived=True) + '/restore', {})),
+        ('shard case', 'POST', '/api/cases/<case_id>/shard',
+         lambda i: (small_case('SHD', i) + '/shard', {})),
+        ('ingest upload', 'POST', '/api/cases/<case_id>/ingest',
+         lambda i: (f'/api/cases/{write_case}/ingest?filename=route-{i}.xml',
+                    {'data': report.replace(b'{i}', str(i).encode())})),
+    ]
+
+
+def load_results(path):
+    import json
+    if not os.path.exists(path):
+        return []
+    with open(path) as results:
+        return [json.loads(line) for line in results if line.strip()]
+
+
+def bench_routes(args):
+    """Latency percentiles, throughput and RSS of every /api route per scale.
+
+    Each scale is one generated case (see generate.py) of that many
+    connections, plus small cases sharing identifiers with it. Every route is
+    requested `--requests` times through the test client; unless `--warm`,
+    the response cache is cleared first so each request does the full work.
+    One JSON line per scale and route is appended to `--output`, tagged with
+    the git revision, and compared with the latest run of `--baseline`.
+    """
+    import json
+    import app as app_module
+    from app import app, db, response_cache, run_analytics, run_layout
+    from generate import generate_cases
+    from migrate import reset_database
+
+    client = app.test_client()
+    revision = git_revision()
+    baseline = {}
+    for row in load_results(args.output):
+        if args.baseline and row['revision'].startswith(args.baseline):
+            baseline[row['scale'], row['route']] = row
+
+    print(f"{'edges':>8} {'route':<20} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} "
+          f"{'rss MB':>7} {'peak MB':>8}" + (f" {'p50 vs ' + args.baseline:>14}" if args.baseline else ''))
+    for scale in args.scales:
+        with app.app_context():
+            reset_database()
+            with db.engine.begin() as conn:
+                case_id = generate_cases(conn, 1, scale, prefix='ROUTE-BIG')[0]
+                small = generate_cases(conn, 3, max(200, scale // 100), seed=48, prefix='ROUTE-SMALL')
+                phone = conn.execute(db.text(
+                    "SELECT value FROM entity_identifiers WHERE kind = 'phone' AND case_id = :c "
+                    "AND value IN (SELECT value FROM entity_identifiers WHERE case_id != :c) LIMIT 1"
+                ), {'c': case_id}).scalar() or '+910000000000'
+                n_entities = conn.execute(db.text('SELECT count(*) FROM entities WHERE case_id = :c'),
+                                          {'c': case_id}).scalar()
+        run_analytics(case_id)
+        run_layout(case_id)
+
+        scenarios = route_scenarios(case_id, small[0], n_entities, phone)
+        covered = {(rule, method) for _, method, rule, _ in scenarios}
+        missing = sorted(f'{method} {rule.rule}' for rule in app.url_map.iter_rules()
+                         if rule.rule.startswith('/api') for method in rule.methods - {'HEAD', 'OPTIONS'}
+                         if (rule.rule, method) not in covered)
+        if missing:
+            print(f"warning: not benchmarked: {', '.join(missing)}")
+
+        for name, method, rule, build in scenarios:
+            samples, errors = [], 0
+            for i in range(args.requests):
+                path, kwargs = build(i)
+                kwargs = dict(kwargs)
+                stream = kwargs.pop('stream', False)
+                if not args.warm:
+                    response_cache.discard(lambda key: True)
+                started = time.perf_counter()
+                response = client.open(path, method=method, buffered=not stream, **kwargs)
+                if stream:
+                    next(iter(response.response))
+                    response.close()
+                else:
+                    response.get_data()
+                samples.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+            current, peak = rss_mb()
+            row = {
+                'revision': revision, 'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'scale': scale, 'route': name, 'method': method, 'rule': rule,
+                'requests': len(samples), 'errors': errors,
+                'p50_ms': percentile(samples, 50), 'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99), 'max_ms': max(samples),
+                'requests_per_second': len(samples) / sum(samples) * 1000,
+                'rss_mb': current, 'peak_rss_mb': peak, 'warm': args.warm,
+            }
+            with open(args.output, 'a') as results:
+                results.write(json.dumps(row) + '\n')
+            line = (f"{scale:>8} {name:<20} {row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms "
+                    f"{row['p99_ms']:>7.1f}ms {row['requests_per_second']:>8.1f} {current:>7.0f} {peak:>8.0f}")
+            previous = baseline.get((scale, name))
+            if previous:
+                line += f" {row['p50_ms'] / previous['p50_ms']:>13.2f}x"
+            print(line + (f'  ({errors} errors)' if errors else ''))
+
+        # Let queued jobs finish before the next scale resets the database
+        app_module.case_job_executor.submit(lambda: None).result()
+        app_module.analytics_executor.submit(lambda: None).result()
+        if app_module.ingest_executor is not None:
+            app_module.ingest_executor.shutdown(wait=True)
+            app_module.ingest_executor = None
+
+
+BENCHMARKS = {
+    'bulk': bench_bulk,
+    'concurrency': bench_concurrency,
+    'indexes': bench_indexes,
+    'routes': bench_routes,
+    'search': bench_search,
+    'serialize': bench_serialize,
+    'servers': bench_servers,
+    'transport': bench_transport,
+}
+
+
+def parse_scales(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--scales', type=parse_scales, default=[10000, 100000, 1000000],
+                        help='comma-separated total edge counts')
+    parser.add_argument('--cases', type=int, default=200,
+                        help='number of cases the edges are spread across')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', type=float, default=20000,
+                        help='bulk: minimum acceptable rows/sec')
+    parser.add_argument('--readers', type=int, default=8,
+                        help='concurrency: concurrent reader threads')
+    parser.add_argument('--batches', type=int, default=20,
+                        help='concurrency: 5000-row batches the writer ingests')
+    parser.add_argument('--clients', type=int, default=128,
+                        help='servers: concurrent keep-alive client connections')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='servers: worker threads of each server')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='servers: seconds of load per server')
+    parser.add_argument('--requests', type=int, default=30,
+                        help='routes: requests per route')
+    parser.add_argument('--warm', action='store_true',
+                        help='routes: keep the response cache between requests')
+    parser.add_argument('--output', default='benchmark-results.jsonl',
+                        help='routes: JSON-lines file results are appended to')
+    parser.add_argument('--baseline',
+                        help='routes: revision in --output to compare p50 latency against')
+    args = parser.parse_args(argv)
+
+    path = use_temp_database()
+    try:
+        BENCHMARKS[args.benchmark](args)
+    finally:
+        os.remove(path)
+        shutil.rmtree(os.environ['ARCHIVE_FOLDER'], ignore_errors=True)
+        shutil.rmtree(os.environ['SHARD_FOLDER'], ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Per-case fan-out of committed graph changes to Server-Sent Events clients.
+
+One background thread per process follows the `graph_changes` log (see
+changes.py), so it sees commits from every process, ingest workers included.
+Each tick it loads the changes of every watched case once, encodes them once
+and hands the same bytes to each subscriber, so the database cost depends on
+the number of watched cases, never on the number of viewers.
+
+Subscribers have bounded queues and the thread never waits on one. When a
+client falls `queue_size` events behind, its backlog is dropped and it is
+told to resynchronise through `/graph/changes`, so a slow client costs
+nothing but its own catch-up.
+"""
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Bounded queue of encoded events for one client"""
+
+    def __init__(self, case_id, seq, queue_size):
+        self.case_id = case_id
+        # Changes up to this sequence number were published before subscribing
+        self.seq = seq
+        self.queue_size = queue_size
+        self.events = deque()
+        self.overflowed = False
+        self.condition = threading.Condition()
+
+    def push(self, event):
+        """Queue `(seq, payload)`; on overflow the backlog is dropped first"""
+        with self.condition:
+            if len(self.events) >= self.queue_size:
+                self.events.clear()
+                self.overflowed = True
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """(event, overflowed) once an event is queued, or (None, False) after `timeout`"""
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            if not self.events:
+                return None, False
+            overflowed, self.overflowed = self.overflowed, False
+            return self.events.popleft(), overflowed
+
+
+class ChangeBroker:
+    """Publish each watched case's committed changes to its subscribers.
+
+    `head()` returns the latest sequence number in the log; `load(case_ids,
+    after, upto)` returns `{case_id: [(seq, payload), ...]}` of encoded events
+    for the changes in `(after, upto]`.
+    """
+
+    def __init__(self, head, load, interval=0.5, queue_size=64):
+        self.head = head
+        self.load = load
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def subscribe(self, case_id):
+        with self.lock:
+            if self.thread is None:
+                self.cursor = self.head()
+                self.thread = threading.Thread(target=self.run, name='change-broker', daemon=True)
+                self.thread.start()
+            subscription = Subscription(case_id, self.cursor, self.queue_size)
+            self.subscribers.setdefault(case_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            watchers = self.subscribers.get(subscription.case_id, set())
+            watchers.discard(subscription)
+            if not watchers:
+                self.subscribers.pop(subscription.case_id, None)
+
+    def notify(self):
+        """Check the log now instead of at the next tick, e.g. after a local commit"""
+        if self.subscribers:
+            self.wake.set()
+
+    def stats(self):
+        with self.lock:
+            return {'cases': len(self.subscribers),
+                    'subscribers': sum(len(watchers) for watchers in self.subscribers.values()),
+                    'seq': self.cursor}
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+                case_ids = list(self.subscribers)
+                after = self.cursor
+            try:
+                upto = self.head()
+                events = self.load(case_ids, after, upto) if upto > after else {}
+            except Exception:
+                logger.exception('Loading graph changes after %s failed', after)
+                continue
+            with self.lock:
+                self.cursor = max(self.cursor, upto)
+                targets = {case_id: list(self.subscribers.get(case_id, ())) for case_id in events}
+            for case_id, case_events in events.items():
+                for subscription in targets[case_id]:
+                    for event in case_events:
+                        subscription.push(event)
@@ -0,0 +1,62 @@
+"""Bounded in-process cache for serialized API responses."""
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """LRU of serialized payloads, bounded by total size in bytes.
+
+    Keys carry the case version the payload was built from, so a write that
+    bumps the version makes old entries unreachable; they age out through
+    normal eviction. Hit, miss and eviction counters are kept for monitoring.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, match):
+        """Drop every entry whose key satisfies `match`"""
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                self.size -= len(self.entries.pop(key))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,87 @@
+"""Per-case change log of graph rows, for incremental graph sync.
+
+`graph_changes` keeps one row per entity or connection ever written to a case,
+holding the sequence number of its latest write and whether that write was a
+delete (a tombstone). Triggers on `entities` and `connections` replace the row
+on every insert, update and delete, so every write path (ORM, bulk upserts,
+ingest, cascaded deletes) is logged inside its own transaction.
+
+`seq` is an AUTOINCREMENT key, so it only grows and is never reused, and since
+SQLite admits one writer at a time it follows commit order. Everything that
+changed in a case after a given `seq` is therefore one range scan over
+`(case_id, seq)`, whatever the size of the case. SQLite only, like the
+full-text index.
+"""
+from sqlalchemy import column, table, text
+
+# Source table -> kind recorded in the log
+LOGGED_TABLES = {'entities': 'node', 'connections': 'edge'}
+
+graph_changes = table(
+    'graph_changes',
+    column('seq'), column('case_id'), column('kind'), column('item_id'), column('deleted')
+)
+
+# Trigger statements replacing an item's log row. A plain DELETE and INSERT
+# rather than INSERT OR REPLACE: the ON CONFLICT clause of the statement firing
+# a trigger overrides the trigger's own, so REPLACE would fail inside upserts.
+LOG = ("DELETE FROM graph_changes WHERE case_id = {row}.case_id AND kind = '{kind}' AND item_id = {row}.id; "
+       "INSERT INTO graph_changes (case_id, kind, item_id, deleted) "
+       "VALUES ({row}.case_id, '{kind}', {row}.id, {deleted});")
+
+
+def create(conn):
+    """Create the log table and triggers, then log every existing row"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS graph_changes ('
+        'seq INTEGER PRIMARY KEY AUTOINCREMENT, case_id VARCHAR(50) NOT NULL, '
+        'kind VARCHAR(4) NOT NULL, item_id VARCHAR(50) NOT NULL, deleted BOOLEAN NOT NULL DEFAULT 0)'
+    ))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ux_graph_changes_item '
+                      'ON graph_changes (case_id, kind, item_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_graph_changes_case_seq ON graph_changes (case_id, seq)'))
+
+    for source, kind in LOGGED_TABLES.items():
+        upsert = LOG.format(row='NEW', kind=kind, deleted=0)
+        delete = LOG.format(row='OLD', kind=kind, deleted=1)
+        for event, body in (('INSERT', upsert), ('UPDATE', upsert), ('DELETE', delete)):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS graph_changes_{source}_{event.lower()} "
+                f"AFTER {event} ON {source} BEGIN {body} END"
+            ))
+        # A row moved to another case or id is a delete from its old identity
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS graph_changes_{source}_move "
+            f"AFTER UPDATE OF id, case_id ON {source} "
+            f"WHEN OLD.case_id != NEW.case_id OR OLD.id != NEW.id BEGIN {delete} END"
+        ))
+        conn.execute(text(
+            f"INSERT OR REPLACE INTO graph_changes (case_id, kind, item_id, deleted) "
+            f"SELECT case_id, '{kind}', id, 0 FROM {source} ORDER BY rowid"
+        ))
+
+
+def latest_seq(conn):
+    """Sequence number of the latest change to any case"""
+    return conn.execute(text('SELECT coalesce(max(seq), 0) FROM graph_changes')).scalar()
+
+
+def current_seq(conn, case_id):
+    """Sequence number of the latest change to a case, 0 if it has none"""
+    return conn.execute(
+        text('SELECT coalesce(max(seq), 0) FROM graph_changes WHERE case_id = :case_id'),
+        {'case_id': case_id}
+    ).scalar()
+
+
+def since(conn, case_id, seq, upto, limit):
+    """(seq, kind, item_id, deleted) rows of a case after `seq` up to `upto`, oldest first"""
+    return conn.execute(text(
+        'SELECT seq, kind, item_id, deleted FROM graph_changes '
+        'WHERE case_id = :case_id AND seq > :seq AND seq <= :upto ORDER BY seq LIMIT :limit'
+    ), {'case_id': case_id, 'seq': seq, 'upto': upto, 'limit': limit}).all()
+
+
+def discard(conn, case_id):
+    """Drop the log of a deleted case"""
+    conn.execute(text('DELETE FROM graph_changes WHERE case_id = :case_id'), {'case_id': case_id})
@@ -0,0 +1,25 @@
+"""Shared pytest setup: the app runs on a fresh temporary database.
+
+    python -m pytest
+"""
+import os
+import tempfile
+
+import pytest
+
+_folder = tempfile.mkdtemp(prefix='forensilink-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_folder, 'test.db')
+os.environ['ARCHIVE_FOLDER'] = os.path.join(_folder, 'archive')
+os.environ['SHARD_FOLDER'] = os.path.join(_folder, 'shards')
+os.environ['SHARD_COLD_FOLDER'] = os.path.join(_folder, 'shards', 'cold')
+
+
+@pytest.fixture(scope='session')
+def client():
+    from app import app, db
+    from migrate import run_migrations
+
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+    return app.test_client()
@@ -0,0 +1,227 @@
+"""Materialized case facet counts and per-case graph statistics.
+
+Counting cases by status, or a case's entities by type, means scanning every
+row. Three small tables hold those aggregates instead, kept current by
+triggers so every write path (ORM, bulk upserts, ingest, case jobs) updates
+them inside its own transaction:
+
+- `case_facets`: number of cases per (status, crime_type, officer_id)
+  combination. There are far fewer combinations than cases, so the counts of
+  any facet under filters on the others is a scan of this table.
+- `case_stats`: number of entities and connections of each case per type.
+- `case_spans`: first and last timestamp of each case's entities and
+  connections. Deleting the row holding a bound re-reads it with a seek on
+  the `(case_id, timestamp)` indexes.
+
+Trigger bodies avoid conflict clauses, as in changes.py, because the ON
+CONFLICT clause of an upsert that fires a trigger overrides the trigger's
+own. SQLite only; `stats()` and `counts()` also work from the source tables
+on other databases.
+"""
+from datetime import datetime
+
+from sqlalchemy import column, func, literal, select, table, text
+
+CASE_FACETS = ('status', 'crime_type', 'officer_id')
+# Source table -> kind its rows are counted as
+COUNTED_TABLES = {'entities': 'entity', 'connections': 'connection'}
+TABLES = ['case_facets', 'case_stats', 'case_spans']
+
+case_facets = table('case_facets', *(column(name) for name in CASE_FACETS), column('count'))
+case_stats = table('case_stats', column('case_id'), column('kind'), column('type'), column('count'))
+case_spans = table('case_spans', column('case_id'), column('kind'), column('first_seen'), column('last_seen'))
+
+_FACET_MATCH = ' AND '.join(f'{name} IS {{row}}.{name}' for name in CASE_FACETS)
+FACET_ADD = (f"UPDATE case_facets SET count = count + 1 WHERE {_FACET_MATCH}; "
+             f"INSERT INTO case_facets ({', '.join(CASE_FACETS)}, count) "
+             f"SELECT {', '.join('{row}.' + name for name in CASE_FACETS)}, 1 "
+             f"WHERE NOT EXISTS (SELECT 1 FROM case_facets WHERE {_FACET_MATCH});")
+FACET_REMOVE = (f"UPDATE case_facets SET count = count - 1 WHERE {_FACET_MATCH}; "
+                f"DELETE FROM case_facets WHERE {_FACET_MATCH} AND count <= 0;")
+
+_STATS_MATCH = "case_id = {row}.case_id AND kind = '{kind}' AND type = {row}.type"
+STATS_ADD = (f"UPDATE case_stats SET count = count + 1 WHERE {_STATS_MATCH}; "
+             "INSERT INTO case_stats (case_id, kind, type, count) SELECT {row}.case_id, '{kind}', {row}.type, 1 "
+             f"WHERE NOT EXISTS (SELECT 1 FROM case_stats WHERE {_STATS_MATCH});")
+STATS_REMOVE = (f"UPDATE case_stats SET count = count - 1 WHERE {_STATS_MATCH}; "
+                f"DELETE FROM case_stats WHERE {_STATS_MATCH} AND count <= 0;")
+
+_SPAN_MATCH = "case_id = {row}.case_id AND kind = '{kind}'"
+SPAN_ADD = ("UPDATE case_spans SET first_seen = min(first_seen, {row}.timestamp), "
+            "last_seen = max(last_seen, {row}.timestamp) "
+            f"WHERE {_SPAN_MATCH} AND {{row}}.timestamp IS NOT NULL; "
+            "INSERT INTO case_spans (case_id, kind, first_seen, last_seen) "
+            "SELECT {row}.case_id, '{kind}', {row}.timestamp, {row}.timestamp "
+            f"WHERE {{row}}.timestamp IS NOT NULL AND NOT EXISTS (SELECT 1 FROM case_spans WHERE {_SPAN_MATCH});")
+# Runs after the row is gone, so a removed bound is re-read from what is left
+SPAN_REMOVE = ("UPDATE case_spans SET "
+               "first_seen = (SELECT min(timestamp) FROM {table} WHERE case_id = {row}.case_id), "
+               "last_seen = (SELECT max(timestamp) FROM {table} WHERE case_id = {row}.case_id) "
+               f"WHERE {_SPAN_MATCH} AND (first_seen >= {{row}}.timestamp OR last_seen <= {{row}}.timestamp); "
+               f"DELETE FROM case_spans WHERE {_SPAN_MATCH} AND first_seen IS NULL;")
+
+
+def _trigger(conn, name, event, source, body, when=None):
+    condition = f' WHEN {when}' if when else ''
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {source}{condition} BEGIN {body} END"
+    ))
+
+
+def create(conn, tables=None):
+    """Create the aggregate tables and their triggers, then fill them.
+
+    `tables` limits this to some source tables, e.g. the row tables of a
+    case shard, whose `cases` live in the catalog.
+    """
+    tables = tables or ['cases', *COUNTED_TABLES]
+    if 'cases' in tables:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS case_facets (status VARCHAR(50), crime_type VARCHAR(100), '
+            'officer_id VARCHAR(50), count INTEGER NOT NULL)'
+        ))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_case_facets_combination '
+                          f"ON case_facets ({', '.join(CASE_FACETS)})"))
+        changed = ' OR '.join(f'OLD.{name} IS NOT NEW.{name}' for name in CASE_FACETS)
+        _trigger(conn, 'case_facets_insert', 'INSERT', 'cases', FACET_ADD.format(row='NEW'))
+        _trigger(conn, 'case_facets_delete', 'DELETE', 'cases', FACET_REMOVE.format(row='OLD'))
+        _trigger(conn, 'case_facets_update', f"UPDATE OF {', '.join(CASE_FACETS)}", 'cases',
+                 FACET_REMOVE.format(row='OLD') + ' ' + FACET_ADD.format(row='NEW'), changed)
+
+    counted = [source for source in tables if source in COUNTED_TABLES]
+    if counted:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS case_stats (case_id VARCHAR(50) NOT NULL, kind VARCHAR(10) NOT NULL, '
+            'type VARCHAR(100) NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (case_id, kind, type))'
+        ))
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS case_spans (case_id VARCHAR(50) NOT NULL, kind VARCHAR(10) NOT NULL, '
+            'first_seen DATETIME, last_seen DATETIME, PRIMARY KEY (case_id, kind))'
+        ))
+    for source in counted:
+        kind = COUNTED_TABLES[source]
+
+        def body(template, row):
+            return template.format(row=row, kind=kind, table=source)
+
+        _trigger(conn, f'case_stats_{source}_insert', 'INSERT', source,
+                 body(STATS_ADD, 'NEW') + ' ' + body(SPAN_ADD, 'NEW'))
+        _trigger(conn, f'case_stats_{source}_delete', 'DELETE', source,
+                 body(STATS_REMOVE, 'OLD') + ' ' + body(SPAN_REMOVE, 'OLD'))
+        _trigger(conn, f'case_stats_{source}_update', 'UPDATE OF case_id, type', source,
+                 body(STATS_REMOVE, 'OLD') + ' ' + body(STATS_ADD, 'NEW'),
+                 'OLD.case_id IS NOT NEW.case_id OR OLD.type IS NOT NEW.type')
+        _trigger(conn, f'case_spans_{source}_update', 'UPDATE OF case_id, timestamp', source,
+                 body(SPAN_REMOVE, 'OLD') + ' ' + body(SPAN_ADD, 'NEW'),
+                 'OLD.case_id IS NOT NEW.case_id OR OLD.timestamp IS NOT NEW.timestamp')
+    rebuild(conn, tables)
+
+
+def rebuild(conn, tables=None):
+    """Recount the aggregates from the source tables, or from `tables`"""
+    tables = tables or ['cases', *COUNTED_TABLES]
+    if 'cases' in tables:
+        names = ', '.join(CASE_FACETS)
+        conn.execute(text('DELETE FROM case_facets'))
+        conn.execute(text(
+            f'INSERT INTO case_facets ({names}, count) SELECT {names}, count(*) FROM cases GROUP BY {names}'
+        ))
+    for source in tables:
+        kind = COUNTED_TABLES.get(source)
+        if not kind:
+            continue
+        conn.execute(text('DELETE FROM case_stats WHERE kind = :kind'), {'kind': kind})
+        conn.execute(text('DELETE FROM case_spans WHERE kind = :kind'), {'kind': kind})
+        conn.execute(text(
+            f"INSERT INTO case_stats (case_id, kind, type, count) "
+            f"SELECT case_id, '{kind}', type, count(*) FROM {source} GROUP BY case_id, type"
+        ))
+        conn.execute(text(
+            f"INSERT INTO case_spans (case_id, kind, first_seen, last_seen) "
+            f"SELECT case_id, '{kind}', min(timestamp), max(timestamp) FROM {source} "
+            f"WHERE timestamp IS NOT NULL GROUP BY case_id"
+        ))
+
+
+def materialized(conn):
+    """Whether the `main` database of `conn` holds the per-case aggregates.
+
+    On a shard connection an unqualified name missing from the shard would
+    resolve to the attached catalog's table.
+    """
+    return conn.execute(text(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'case_stats'"
+    )).first() is not None
+
+
+def counts(conn, filters, source=None):
+    """(total, {facet: [{'value', 'count'}]}) of cases matching `filters`.
+
+    Each facet is counted under the filters on the other facets, so a UI can
+    offer every value of the one being chosen. `source` replaces the
+    materialized table with any select of the facet columns and a `count`,
+    e.g. one row per case of a full-text search.
+    """
+    source = case_facets if source is None else source
+    matches = {name: source.c[name] == value for name, value in filters.items()}
+    total = conn.execute(select(func.coalesce(func.sum(source.c.count), 0)).where(*matches.values())).scalar()
+    result = {}
+    for facet in CASE_FACETS:
+        count = func.sum(source.c.count)
+        rows = conn.execute(
+            select(source.c[facet], count)
+            .where(*(match for name, match in matches.items() if name != facet))
+            .group_by(source.c[facet]).order_by(count.desc(), source.c[facet])
+        )
+        result[facet] = [{'value': value, 'count': n} for value, n in rows]
+    return total, result
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def stats(conn, case_ids, live=False):
+    """Entity and connection counts by type and time span of each case.
+
+    With `live` they are aggregated from the row tables, for databases or
+    shard files without the materialized tables.
+    """
+    result = {case_id: {'entities': 0, 'connections': 0, 'entity_types': {}, 'connection_types': {},
+                        'first_seen': None, 'last_seen': None} for case_id in case_ids}
+    if not case_ids:
+        return result
+    if live:
+        type_rows, span_rows = [], []
+        for source, kind in COUNTED_TABLES.items():
+            rows = table(source, column('case_id'), column('type'), column('timestamp'))
+            in_cases = rows.c.case_id.in_(case_ids)
+            type_rows += conn.execute(
+                select(rows.c.case_id, literal(kind), rows.c.type, func.count())
+                .where(in_cases).group_by(rows.c.case_id, rows.c.type)
+            ).all()
+            span_rows += conn.execute(
+                select(rows.c.case_id, literal(kind), func.min(rows.c.timestamp), func.max(rows.c.timestamp))
+                .where(in_cases, rows.c.timestamp.is_not(None)).group_by(rows.c.case_id)
+            ).all()
+    else:
+        type_rows = conn.execute(select(case_stats).where(case_stats.c.case_id.in_(case_ids))).all()
+        span_rows = conn.execute(select(case_spans).where(case_spans.c.case_id.in_(case_ids))).all()
+
+    for case_id, kind, row_type, count in type_rows:
+        case = result[case_id]
+        case[f'{kind}_types'][row_type] = count
+        case['entities' if kind == 'entity' else 'connections'] += count
+    for case_id, _, first_seen, last_seen in span_rows:
+        case = result[case_id]
+        first_seen, last_seen = _timestamp(first_seen), _timestamp(last_seen)
+        if case['first_seen'] is None or first_seen < case['first_seen']:
+            case['first_seen'] = first_seen
+        if case['last_seen'] is None or last_seen > case['last_seen']:
+            case['last_seen'] = last_seen
+    for case in result.values():
+        for bound in ('first_seen', 'last_seen'):
+            case[bound] = case[bound].isoformat() if case[bound] else None
+    return result
@@ -0,0 +1,259 @@
+"""Synthetic large cases for load and performance testing.
+
+Builds on `seed_database()`: the hand-written demo cases are seeded first,
+then `--cases` synthetic cases of `--edges` connections each are added with
+bulk inserts. Each case is a scale-free contact graph (preferential
+attachment, so a few hubs hold most of the traffic) over which calls,
+messages and transactions are drawn with bursty, diurnal timestamps. A small
+pool of phone numbers and wallets is shared between cases so cross-case
+links exist. The same `--seed` always produces the same database.
+
+Usage:
+    python generate.py --cases 5 --edges 100000
+    python generate.py --cases 2 --edges 2000000 --append
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+import identifiers
+
+# Entity types and the share of a case's entities they make up
+ENTITY_MIX = {'phone': 0.45, 'person': 0.3, 'financial': 0.1, 'location': 0.05,
+              'organization': 0.06, 'keyword': 0.04}
+ICONS = {'person': '👤', 'phone': '📱', 'financial': '💰', 'location': '📍',
+         'keyword': '🔑', 'organization': '🏢'}
+COMMUNICATION_TYPES = ['Phone Call', 'SMS', 'Message', 'Signal Chat', 'Encrypted Call', 'Email']
+CRIME_TYPES = ['Conspiracy / Financial Fraud', 'Narcotics', 'Cybercrime', 'Fraud', 'Extortion']
+ROLES = ['Primary Suspect', 'Inner Circle', 'Associate', 'Courier', 'Financier', 'Witness']
+CARRIERS = ['Airtel', 'Jio', 'Vi', 'BSNL']
+APPS = ['WhatsApp', 'Signal', 'Telegram', 'SMS']
+FIRST_NAMES = ['Arjun', 'Priya', 'Ravi', 'Anita', 'Vikram', 'Meera', 'Sanjay', 'Kavya', 'Rahul',
+               'Deepa', 'Imran', 'Farah', 'Joseph', 'Lakshmi', 'Nikhil', 'Pooja']
+LAST_NAMES = ['Varma', 'Sharma', 'Iyer', 'Khan', 'Reddy', 'Patel', 'Nair', 'Das', 'Singh', 'Menon']
+PLACES = ['Café', 'Harbor Gate', 'Warehouse', 'Station', 'Market', 'Hotel', 'Parking Lot']
+WORDS = ['meet', 'tonight', 'payment', 'drop', 'package', 'project', 'handler', 'cash', 'wallet',
+         'transfer', 'call', 'later', 'delivery', 'harbor', 'car', 'keys', 'confirm', 'done',
+         'tomorrow', 'location', 'address', 'supplier', 'price', 'advance', 'balance', 'phone',
+         'new', 'number', 'careful', 'police', 'route', 'truck', 'invoice', 'account', 'bitcoin']
+# Relative message volume per hour of day: quiet nights, busy late mornings and evenings
+HOUR_WEIGHTS = [2, 1, 1, 1, 1, 2, 4, 6, 8, 10, 12, 12, 11, 10, 9, 9, 10, 11, 13, 14, 13, 10, 7, 4]
+HOUR_CUM_WEIGHTS = [sum(HOUR_WEIGHTS[:i + 1]) for i in range(24)]
+WORD_CUM_WEIGHTS = [sum(1 / rank for rank in range(1, i + 2)) for i in range(len(WORDS))]
+
+# Identifiers drawn from this pool appear in several cases, whatever the seed
+SHARED_POOL_SIZE = 500
+SHARED_POOL_SEED = 2025
+# Share of phones and wallets taking a shared identifier
+SHARED_RATE = 0.02
+# Share of connections and entities with no timestamp
+UNDATED_RATE = 0.05
+
+
+def scale_free_pairs(rng, n_nodes, links_per_node=2):
+    """Contact pairs of a preferential-attachment graph over `n_nodes` nodes.
+
+    Every new node links to `links_per_node` existing nodes picked with
+    probability proportional to their degree, so degrees follow a power law.
+    """
+    pairs = [(0, 1)]
+    endpoints = [0, 1]
+    for node in range(2, n_nodes):
+        targets = {rng.choice(endpoints) for _ in range(links_per_node)}
+        for target in targets:
+            pairs.append((node, target))
+            endpoints.extend((node, target))
+    return pairs
+
+
+class CaseGenerator:
+    """Entity and connection rows of one synthetic case"""
+
+    def __init__(self, case_id, n_edges, rng, shared):
+        self.case_id = case_id
+        self.n_edges = n_edges
+        self.rng = rng
+        self.shared = shared
+        self.n_entities = max(20, n_edges // 10)
+        self.pairs = scale_free_pairs(rng, self.n_entities)
+        self.degree = [0] * self.n_entities
+        for a, b in self.pairs:
+            self.degree[a] += 1
+            self.degree[b] += 1
+        kinds, weights = zip(*ENTITY_MIX.items())
+        self.types = rng.choices(kinds, weights=weights, k=self.n_entities)
+        self.start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(365))
+        self.span_days = rng.randint(90, 365)
+        self.bursts = [rng.uniform(0, self.span_days) for _ in range(rng.randint(3, 6))]
+
+    def entity_id(self, index):
+        return f'{self.case_id}-n{index}'
+
+    def case_row(self):
+        return {
+            'id': self.case_id, 'title': f'Synthetic case {self.case_id}',
+            'description': f'Generated network of {self.n_entities} entities and {self.n_edges} connections',
+            'status': self.rng.choice(['active', 'active', 'closed']),
+            'crime_type': self.rng.choice(CRIME_TYPES),
+            'officer_id': f'IO-{self.rng.randint(1000, 9999)}',
+            'created_at': self.start, 'updated_at': self.start
+        }
+
+    def timestamp(self):
+        """Bursty time inside the case window: 40% of activity clusters around a few incidents"""
+        if self.rng.random() < UNDATED_RATE:
+            return None
+        if self.rng.random() < 0.4:
+            day = min(max(self.rng.gauss(self.rng.choice(self.bursts), 3), 0), self.span_days)
+        else:
+            day = self.rng.uniform(0, self.span_days)
+        hour = self.rng.choices(range(24), cum_weights=HOUR_CUM_WEIGHTS)[0]
+        return self.start + timedelta(days=int(day), hours=hour, seconds=self.rng.randrange(3600))
+
+    def snippet(self):
+        return ' '.join(self.rng.choices(WORDS, cum_weights=WORD_CUM_WEIGHTS, k=self.rng.randint(4, 12)))
+
+    def identifier(self, kind):
+        if self.rng.random() < SHARED_RATE:
+            return self.shared[kind][self.rng.randrange(SHARED_POOL_SIZE)]
+        return random_identifier(self.rng, kind)
+
+    def entity_rows(self):
+        rng = self.rng
+        for index, entity_type in enumerate(self.types):
+            degree = self.degree[index]
+            if entity_type == 'phone':
+                number = self.identifier('phone')
+                label, metadata = number, {'phone': number, 'imei': random_identifier(rng, 'imei'),
+                                           'carrier': rng.choice(CARRIERS)}
+            elif entity_type == 'person':
+                label = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+                metadata = {'role': rng.choice(ROLES), 'interactions': degree}
+            elif entity_type == 'financial':
+                address = self.identifier('wallet')
+                label, metadata = f'Wallet {address[:12]}', {'wallet': address, 'totalTransactions': degree}
+            elif entity_type == 'location':
+                label = f'{rng.choice(PLACES)} {index}'
+                metadata = {'coordinates': f'{rng.uniform(8, 30):.4f}°N, {rng.uniform(70, 88):.4f}°E'}
+            elif entity_type == 'keyword':
+                label, metadata = rng.choice(WORDS).title(), {'mentions': degree}
+            else:
+                label = f'{rng.choice(LAST_NAMES)} {rng.choice(["Logistics", "Traders", "Holdings"])}'
+                vehicle = f'MH{rng.randint(1, 50):02d}-{rng.randint(1000, 9999)}'
+                metadata = {'role': rng.choice(ROLES), 'vehicleId': vehicle}
+            yield {
+                'id': self.entity_id(index), 'case_id': self.case_id, 'label': label,
+                'type': entity_type, 'size': min(100, 30 + int(10 * math.log1p(degree))),
+                'icon': ICONS[entity_type], 'meta_data': metadata, 'timestamp': self.timestamp()
+            }
+
+    def connection_type(self, a, b):
+        types = {self.types[a], self.types[b]}
+        if 'financial' in types:
+            return 'Transaction'
+        if 'location' in types:
+            return 'GPS Co-location'
+        if 'keyword' in types:
+            return 'Keyword Mention'
+        return self.rng.choice(COMMUNICATION_TYPES)
+
+    def connection_rows(self):
+        rng = self.rng
+        for index in range(self.n_edges):
+            # Repeat contact along the scale-free skeleton, so hubs carry most traffic
+            a, b = self.pairs[rng.randrange(len(self.pairs))]
+            if rng.random() < 0.5:
+                a, b = b, a
+            connection_type = self.connection_type(a, b)
+            if connection_type == 'Transaction':
+                data = {'amount': round(rng.lognormvariate(3, 1.5), 2), 'currency': rng.choice(['BTC', 'INR']),
+                        'snippet': f'Transfer {self.snippet()}'}
+            elif connection_type in ('Phone Call', 'Encrypted Call'):
+                data = {'duration': int(rng.expovariate(1 / 120)), 'direction': rng.choice(['outgoing', 'incoming'])}
+            elif connection_type == 'GPS Co-location':
+                data = {'duration': f'{rng.randint(5, 240)} minutes'}
+            else:
+                data = {'snippet': self.snippet(), 'app': rng.choice(APPS)}
+            yield {
+                'id': f'{self.case_id}-c{index}', 'case_id': self.case_id,
+                'source': self.entity_id(a), 'target': self.entity_id(b), 'type': connection_type,
+                'weight': max(1, int(rng.lognormvariate(0, 1))), 'data': data, 'timestamp': self.timestamp()
+            }
+
+
+def random_identifier(rng, kind):
+    if kind == 'phone':
+        return f'+91 {rng.randint(70000, 99999)} {rng.randint(10000, 99999)}'
+    if kind == 'imei':
+        return ''.join(str(rng.randrange(10)) for _ in range(15))
+    return 'bc1q' + ''.join(rng.choice('023456789acdefghjklmnpqrstuvwxyz') for _ in range(38))
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_cases(conn, n_cases, n_edges, seed=47, prefix='SYN', batch_size=10000):
+    """Insert `n_cases` synthetic cases of `n_edges` connections each; return their ids.
+
+    `conn` is a Connection inside a transaction; the identifier index is kept
+    in sync as entities are written.
+    """
+    from app import Case, Entity, Connection
+
+    pool_rng = random.Random(SHARED_POOL_SEED)
+    shared = {kind: [random_identifier(pool_rng, kind) for _ in range(SHARED_POOL_SIZE)]
+              for kind in ('phone', 'wallet')}
+    rng = random.Random(seed)
+    case_ids = []
+    for number in range(n_cases):
+        generator = CaseGenerator(f'{prefix}-{number:04d}', n_edges, rng, shared)
+        conn.execute(Case.__table__.insert(), [generator.case_row()])
+        for batch in batches(generator.entity_rows(), batch_size):
+            conn.execute(Entity.__table__.insert(), batch)
+            identifiers.sync(conn, [row['id'] for row in batch])
+        for batch in batches(generator.connection_rows(), batch_size):
+            conn.execute(Connection.__table__.insert(), batch)
+        case_ids.append(generator.case_id)
+    return case_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', type=int, default=5, help='synthetic cases to add')
+    parser.add_argument('--edges', type=int, default=100000, help='connections per case')
+    parser.add_argument('--seed', type=int, default=47)
+    parser.add_argument('--prefix', default='SYN', help='case id prefix')
+    parser.add_argument('--append', action='store_true',
+                        help='add to the existing database instead of re-seeding it')
+    args = parser.parse_args(argv)
+    if args.cases < 1 or args.edges < 1:
+        parser.error('--cases and --edges must be positive')
+
+    from app import app, db
+    from seed import seed_database
+
+    if not args.append:
+        seed_database()
+    with app.app_context():
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            case_ids = generate_cases(conn, args.cases, args.edges, args.seed, args.prefix,
+                                      app.config['BULK_BATCH_SIZE'])
+        elapsed = time.perf_counter() - started
+    rows = args.cases * (args.edges + max(20, args.edges // 10))
+    print(f'✅ Generated {len(case_ids)} cases ({case_ids[0]} .. {case_ids[-1]}), '
+          f'{rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Compact columnar encodings of a case graph, and response compression.
+
+The regular graph JSON repeats every key and the case id on each node and
+edge. The columnar layout stores one array per field instead:
+
+    {"format": "columnar-v1",
+     "ids": [...],                      # node ids, then ids only edges reference
+     "nodes": {"count": n, "label": [...], "type": {"values": [...], "codes": [...]},
+               "size": [...], "icon": {...}, "metadata": [...], "timestamp": [...]},
+     "edges": {"count": m, "id": [...], "source": [...], "target": [...],
+               "type": {...}, "weight": [...], "data": [...], "timestamp": [...]}}
+
+Node `i` has id `ids[i]`; edge `source`/`target` are indexes into `ids`.
+With `?layout=true` nodes also carry `x` and `y` arrays of stored positions.
+Low-cardinality strings are dictionary-encoded as `values` plus integer
+`codes`, and timestamps are epoch milliseconds (null when unknown). The
+layout is sent as JSON or MessagePack and compressed with brotli or gzip.
+"""
+import gzip
+from datetime import datetime
+
+import brotli
+import msgpack
+import orjson
+
+COLUMNAR_JSON = 'application/vnd.forensilink.columnar+json'
+MSGPACK = 'application/msgpack'
+
+# Media types a client may ask for in Accept, mapped to the one served
+MEDIA_TYPES = {
+    'application/json': 'application/json',
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    MSGPACK: MSGPACK,
+    'application/x-msgpack': MSGPACK,
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _dictionary(values):
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return {'values': list(index), 'codes': codes}
+
+
+def _epoch_ms(timestamp):
+    if timestamp is None:
+        return None
+    return int((timestamp - EPOCH).total_seconds() * 1000)
+
+
+def columnar(entities, connections):
+    """Columnar graph from entity and connection rows selected with API_COLUMNS"""
+    ids = [entity.id for entity in entities]
+    positions = {entity_id: i for i, entity_id in enumerate(ids)}
+
+    def position(entity_id):
+        if entity_id not in positions:
+            positions[entity_id] = len(ids)
+            ids.append(entity_id)
+        return positions[entity_id]
+
+    return {
+        'format': 'columnar-v1',
+        'ids': ids,
+        'nodes': {
+            'count': len(entities),
+            'label': [entity.label for entity in entities],
+            'type': _dictionary(entity.type for entity in entities),
+            'size': [entity.size for entity in entities],
+            'icon': _dictionary(entity.icon for entity in entities),
+            'metadata': [entity.metadata for entity in entities],
+            'timestamp': [_epoch_ms(entity.timestamp) for entity in entities],
+        },
+        'edges': {
+            'count': len(connections),
+            'id': [conn.id for conn in connections],
+            'source': [position(conn.source) for conn in connections],
+            'target': [position(conn.target) for conn in connections],
+            'type': _dictionary(conn.type for conn in connections),
+            'weight': [conn.weight for conn in connections],
+            'data': [conn.data for conn in connections],
+            'timestamp': [_epoch_ms(conn.timestamp) for conn in connections],
+        },
+    }
+
+
+def encode(body, media_type):
+    """Serialize a columnar graph as JSON or MessagePack"""
+    if media_type == MSGPACK:
+        return msgpack.packb(body, use_bin_type=True)
+    return orjson.dumps(body)
+
+
+def decode(payload, media_type):
+    if media_type == MSGPACK:
+        return msgpack.unpackb(payload, raw=False)
+    return orjson.loads(payload)
+
+
+def negotiate_encoding(accept_encodings):
+    """'br', 'gzip' or None from a request's Accept-Encoding"""
+    for encoding in ('br', 'gzip'):
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(payload, encoding, brotli_quality=5, gzip_level=6):
+    if encoding == 'br':
+        return brotli.compress(payload, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(payload, compresslevel=gzip_level)
+    return payload
+
+
+def decompress(payload, encoding):
+    if encoding == 'br':
+        return brotli.decompress(payload)
+    if encoding == 'gzip':
+        return gzip.decompress(payload)
+    return payload
@@ -0,0 +1,248 @@
+"""In-process adjacency index for case graph traversal.
+
+Each case's connections are packed into CSR (compressed sparse row) arrays:
+entity ids are mapped to dense integers, `offsets[i]:offsets[i + 1]` slices
+`neighbors`, `weights` and `edges` for entity `i`. Connections are treated as
+undirected links, so each one appears in both endpoints' rows.
+"""
+import heapq
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+
+class AdjacencyIndex:
+    """CSR adjacency arrays for one case's connections"""
+
+    def __init__(self, rows):
+        """Build from (connection_id, source, target, weight) rows"""
+        self.ids = []
+        self.positions = {}
+        self.edge_ids = []
+        sources = array('l')
+        targets = array('l')
+        edge_weights = array('d')
+        for edge_id, source, target, weight in rows:
+            sources.append(self._position(source))
+            targets.append(self._position(target))
+            # Rows stored before weights were validated may hold none, 0 or less
+            edge_weights.append(weight if weight and weight > 0 else 1)
+            self.edge_ids.append(edge_id)
+
+        degree = array('l', [0]) * (len(self.ids) + 1)
+        for position in sources:
+            degree[position + 1] += 1
+        for position in targets:
+            degree[position + 1] += 1
+        for i in range(1, len(degree)):
+            degree[i] += degree[i - 1]
+        self.offsets = degree
+
+        size = self.offsets[-1]
+        self.neighbors = array('l', [0]) * size
+        self.weights = array('d', [0.0]) * size
+        self.edges = array('l', [0]) * size
+        cursor = array('l', self.offsets[:-1])
+        for edge, (source, target) in enumerate(zip(sources, targets)):
+            for node, other in ((source, target), (target, source)):
+                slot = cursor[node]
+                self.neighbors[slot] = other
+                self.weights[slot] = edge_weights[edge]
+                self.edges[slot] = edge
+                cursor[node] += 1
+
+    def _position(self, entity_id):
+        position = self.positions.get(entity_id)
+        if position is None:
+            position = self.positions[entity_id] = len(self.ids)
+            self.ids.append(entity_id)
+        return position
+
+    def __len__(self):
+        return len(self.edge_ids)
+
+    def _adjacent(self, node):
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return zip(self.neighbors[start:end], self.weights[start:end], self.edges[start:end])
+
+    def neighborhood(self, entity_id, hops, limit):
+        """Breadth-first k-hop neighbourhood of an entity.
+
+        Returns ({entity_id: hop distance}, [connection ids between them]),
+        stopping once `limit` entities have been reached.
+        """
+        start = self.positions.get(entity_id)
+        if start is None:
+            return {entity_id: 0}, []
+
+        distance = {start: 0}
+        queue = deque([start])
+        while queue and len(distance) < limit:
+            node = queue.popleft()
+            if distance[node] >= hops:
+                continue
+            for other, _, _ in self._adjacent(node):
+                if other not in distance:
+                    distance[other] = distance[node] + 1
+                    queue.append(other)
+                    if len(distance) >= limit:
+                        break
+
+        edges = {edge for node in distance
+                 for other, _, edge in self._adjacent(node) if other in distance}
+        return ({self.ids[node]: depth for node, depth in distance.items()},
+                [self.edge_ids[edge] for edge in sorted(edges)])
+
+    def shortest_path(self, source_id, target_id, max_hops, weighted=False):
+        """Shortest path between two entities within `max_hops` links.
+
+        Unweighted paths minimise hop count. Weighted paths treat
+        `Connection.weight` as tie strength and minimise the sum of
+        1 / weight, so routes over strong, frequent contact win.
+        Returns (entity ids, connection ids, cost) or None.
+        """
+        source = self.positions.get(source_id)
+        target = self.positions.get(target_id)
+        if source is None or target is None:
+            return None
+        if source == target:
+            return [source_id], [], 0.0
+        if not weighted:
+            return self._bidirectional_path(source, target, max_hops)
+        path = self._bidirectional_dijkstra(source, target)
+        if path is None or len(path[1]) <= max_hops:
+            return path
+
+        # Label-setting Dijkstra over (entity, hops) states. Each entity keeps
+        # its Pareto-optimal (hops, cost) labels, so a costlier route is still
+        # explored when it is shorter and the hop limit stays exact.
+        labels = {source: [(0, 0.0)]}
+        previous = {}
+        heap = [(0.0, 0, source)]
+        while heap:
+            cost, hops, node = heapq.heappop(heap)
+            if (hops, cost) not in labels[node]:
+                continue
+            if node == target:
+                break
+            if hops >= max_hops:
+                continue
+            for other, weight, edge in self._adjacent(node):
+                next_cost = cost + 1.0 / weight
+                next_hops = hops + 1
+                known = labels.get(other, [])
+                if any(h <= next_hops and c <= next_cost for h, c in known):
+                    continue
+                labels[other] = [(h, c) for h, c in known
+                                 if not (next_hops <= h and next_cost <= c)]
+                labels[other].append((next_hops, next_cost))
+                previous[(other, next_hops)] = (node, hops, edge)
+                heapq.heappush(heap, (next_cost, next_hops, other))
+        else:
+            return None
+
+        nodes, edges = [target], []
+        state = (target, hops)
+        while state in previous:
+            node, node_hops, edge = previous[state]
+            nodes.append(node)
+            edges.append(edge)
+            state = (node, node_hops)
+        return ([self.ids[node] for node in reversed(nodes)],
+                [self.edge_ids[edge] for edge in reversed(edges)],
+                cost)
+
+    def _bidirectional_path(self, source, target, max_hops):
+        """Fewest-hop path, growing the smaller BFS frontier from either end"""
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        for _ in range(max_hops):
+            if not frontiers[0] or not frontiers[1]:
+                return None
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, opposite = parents[side], parents[1 - side]
+            frontier = []
+            for node in frontiers[side]:
+                for other, _, edge in self._adjacent(node):
+                    if other in seen:
+                        continue
+                    seen[other] = (node, edge)
+                    if other in opposite:
+                        return self._join_path(parents, other)
+                    frontier.append(other)
+            frontiers = (frontier, frontiers[1]) if side == 0 else (frontiers[0], frontier)
+        return None
+
+    def _bidirectional_dijkstra(self, source, target):
+        """Cheapest path ignoring the hop limit, searched from both ends"""
+        parents = ({source: None}, {target: None})
+        costs = ({source: 0.0}, {target: 0.0})
+        settled = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = float('inf'), None
+        while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            cost, node = heapq.heappop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            for other, weight, edge in self._adjacent(node):
+                next_cost = cost + 1.0 / weight
+                if next_cost < costs[side].get(other, float('inf')):
+                    costs[side][other] = next_cost
+                    parents[side][other] = (node, edge)
+                    heapq.heappush(heaps[side], (next_cost, other))
+                if other in costs[1 - side] and \
+                        costs[side][other] + costs[1 - side][other] < best:
+                    best = costs[side][other] + costs[1 - side][other]
+                    meeting = other
+        if meeting is None:
+            return None
+        nodes, edges, _ = self._join_path(parents, meeting)
+        return nodes, edges, best
+
+    def _join_path(self, parents, meeting):
+        halves = []
+        for side in parents:
+            nodes, edges = [meeting], []
+            while side[nodes[-1]] is not None:
+                node, edge = side[nodes[-1]]
+                nodes.append(node)
+                edges.append(edge)
+            halves.append((nodes, edges))
+        (head_nodes, head_edges), (tail_nodes, tail_edges) = halves
+        nodes = head_nodes[::-1] + tail_nodes[1:]
+        edges = head_edges[::-1] + tail_edges
+        return ([self.ids[node] for node in nodes],
+                [self.edge_ids[edge] for edge in edges],
+                float(len(edges)))
+
+
+class AdjacencyCache:
+    """Bounded LRU of per-case adjacency indexes, built on first use.
+
+    Indexes are tagged with the case version they were built from; asking
+    for a newer version rebuilds, so writes from any worker invalidate them.
+    """
+
+    def __init__(self, loader, maxsize=8, build=AdjacencyIndex):
+        self.loader = loader
+        self.build = build
+        self.maxsize = maxsize
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, case_id, version):
+        with self.lock:
+            entry = self.indexes.get(case_id)
+            if entry is not None and entry[0] == version:
+                self.indexes.move_to_end(case_id)
+                return entry[1]
+
+        index = self.build(self.loader(case_id))
+        with self.lock:
+            self.indexes[case_id] = (version, index)
+            self.indexes.move_to_end(case_id)
+            while len(self.indexes) > self.maxsize:
+                self.indexes.popitem(last=False)
+        return index
@@ -0,0 +1,157 @@
+"""Normalized index of identifiers held in entity metadata.
+
+Phone numbers, IMEIs, emails and wallet addresses live in the `meta_data`
+JSON of each entity, which no index can reach. `entity_identifiers` holds one
+(value, kind, entity_id, case_id) row per identifier, keyed on the normalized
+value, so "does this number appear in any other case?" is a single index seek.
+Phone numbers are keyed in E.164 form, so `+91 98765 43210`, `919876543210`
+and `09876543210` are one number; numbers written without a country code
+take `DEFAULT_COUNTRY_CODE`.
+
+Every write path calls `sync()` with the ids it touched; it re-reads those
+entities, so rows an upsert skipped or that belong to another case are
+indexed from what is actually stored.
+"""
+from sqlalchemy import JSON, bindparam, text
+
+# Country code of phone numbers written in national form; set from the app's
+# DEFAULT_COUNTRY_CODE setting. Empty leaves national numbers unprefixed.
+DEFAULT_COUNTRY_CODE = '91'
+# Digits in a national number; longer bare numbers already carry a country code
+NATIONAL_NUMBER_DIGITS = 10
+# Shorter numbers are service codes and are not given a country code
+MIN_PHONE_DIGITS = 7
+
+# Metadata keys holding identifiers, and the kind each one is indexed as
+IDENTIFIER_KEYS = {
+    'imei': 'imei',
+    'imsi': 'imsi',
+    'phone': 'phone',
+    'phone_number': 'phone',
+    'msisdn': 'phone',
+    'email': 'email',
+    'address': 'wallet',
+    'wallet': 'wallet',
+    'iban': 'account',
+    'account_number': 'account',
+    'upi': 'account',
+    'vehicleId': 'vehicle',
+}
+
+KINDS = sorted(set(IDENTIFIER_KEYS.values()))
+
+# Placeholder values that would link unrelated cases
+MASKED_VALUES = {'', 'redacted', 'unknown', 'n/a', 'none', 'null'}
+
+
+def normalize(kind, value):
+    """Canonical form of an identifier, or None if it is masked or empty"""
+    value = str(value).strip()
+    if value.lower() in MASKED_VALUES or '*' in value or '...' in value:
+        return None
+    if kind in ('phone', 'imei', 'imsi'):
+        digits = ''.join(ch for ch in value if ch.isdigit())
+        if kind == 'phone' and digits:
+            return _e164(value, digits)
+        return digits or None
+    if kind == 'wallet':
+        # Bech32 and hex addresses are case-insensitive; base58 ones are not
+        return value.lower() if value.lower().startswith(('bc1', 'tb1', '0x')) else value
+    if kind in ('account', 'vehicle'):
+        return ''.join(ch for ch in value.upper() if ch.isalnum()) or None
+    return value.lower()
+
+
+def _e164(value, digits):
+    """E.164 form (+<country code><number>) of a phone number"""
+    if value.startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    if len(digits) < MIN_PHONE_DIGITS:
+        return digits
+    if digits.startswith('0'):
+        digits = digits[1:]
+    elif len(digits) > NATIONAL_NUMBER_DIGITS:
+        return '+' + digits
+    return f'+{DEFAULT_COUNTRY_CODE}{digits}' if DEFAULT_COUNTRY_CODE else digits
+
+
+def extract(meta_data):
+    """(kind, normalized value) pairs found in an entity's metadata"""
+    found = set()
+    if not isinstance(meta_data, dict):
+        return found
+    for key, kind in IDENTIFIER_KEYS.items():
+        raw = meta_data.get(key)
+        for value in raw if isinstance(raw, list) else [raw]:
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                normalized = normalize(kind, value)
+                if normalized:
+                    found.add((kind, normalized))
+    return found
+
+
+def _rows(entities):
+    return [
+        {'value': value, 'kind': kind, 'entity_id': entity_id, 'case_id': case_id}
+        for entity_id, case_id, meta_data in entities
+        for kind, value in extract(meta_data)
+    ]
+
+
+INSERT = text(
+    'INSERT INTO entity_identifiers (value, kind, entity_id, case_id) '
+    'VALUES (:value, :kind, :entity_id, :case_id)'
+)
+
+SELECT_ENTITIES = 'SELECT id, case_id, meta_data FROM entities'
+
+
+def sync(conn, entity_ids):
+    """Re-index the given entities from their stored metadata.
+
+    `conn` is a Connection or Session; runs inside the caller's transaction.
+    """
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    ids = bindparam('ids', expanding=True)
+    conn.execute(text('DELETE FROM entity_identifiers WHERE entity_id IN :ids').bindparams(ids),
+                 {'ids': entity_ids})
+    entities = conn.execute(
+        text(f'{SELECT_ENTITIES} WHERE id IN :ids').bindparams(ids).columns(meta_data=JSON),
+        {'ids': entity_ids}
+    ).all()
+    rows = _rows(entities)
+    if rows:
+        conn.execute(INSERT, rows)
+
+
+def rebuild(conn, batch_size=10000):
+    """Re-index every entity"""
+    conn.execute(text('DELETE FROM entity_identifiers'))
+    result = conn.execute(text(SELECT_ENTITIES).columns(meta_data=JSON))
+    while True:
+        entities = result.fetchmany(batch_size)
+        if not entities:
+            break
+        rows = _rows(entities)
+        if rows:
+            conn.execute(INSERT, rows)
+
+
+def renormalize(conn, kind):
+    """Re-key the stored identifiers of one kind after its normalization changed.
+
+    Works from the indexed values alone, so entities held in case shards are
+    re-keyed too; values that now coincide collapse into one row.
+    """
+    stored = conn.execute(text('SELECT value, entity_id, case_id FROM entity_identifiers WHERE kind = :kind'),
+                          {'kind': kind}).all()
+    keys = {(normalize(kind, value), entity_id, case_id) for value, entity_id, case_id in stored}
+    conn.execute(text('DELETE FROM entity_identifiers WHERE kind = :kind'), {'kind': kind})
+    rows = [{'value': value, 'kind': kind, 'entity_id': entity_id, 'case_id': case_id}
+            for value, entity_id, case_id in keys if value]
+    if rows:
+        conn.execute(INSERT, rows)
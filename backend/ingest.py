@@ -0,0 +1,302 @@
+"""Streaming ingestion of UFDR phone extractions into a case.
+
+A UFDR file is a ZIP archive whose `report.xml` lists the decoded data of a
+device extraction. The XML is parsed incrementally with `iterparse` and every
+top-level `<model>` (contact, call, message, email, wallet) is turned into
+Entity and Connection rows, then discarded, so memory holds one batch of rows
+and a bounded set of recently emitted entity ids, whatever the size of the
+file. Rows are upserted in batches; ids are derived from the case and the
+extraction's own identifiers, so re-ingesting the same file, or re-emitting an
+entity whose id was forgotten, updates rows instead of duplicating them.
+
+Jobs run in a worker process (`run_ingest_job`) and report progress through
+the `jobs` table.
+"""
+import hashlib
+import os
+import time
+import zipfile
+from collections import OrderedDict
+from datetime import datetime, timezone
+from xml.etree.ElementTree import iterparse
+
+import identifiers
+
+# Models whose sender and recipients become 'Message'-style connections
+MESSAGE_TYPES = {'InstantMessage': 'Message', 'SMS': 'SMS', 'Chat': 'Message', 'Email': 'Email'}
+
+
+class CountingReader:
+    """File wrapper counting bytes read, for progress reporting"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def open_report(path):
+    """(stream, uncompressed size) of the report XML in a UFDR archive or plain XML file"""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        names = [name for name in archive.namelist() if name.lower().endswith('report.xml')]
+        if not names:
+            raise ValueError('UFDR archive has no report.xml')
+        return archive.open(names[0]), archive.getinfo(names[0]).file_size
+    return open(path, 'rb'), os.path.getsize(path)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def to_record(model):
+    """Flatten a `<model>` element into a dict of its fields and sub-models"""
+    record = {'type': model.get('type'), 'id': model.get('id')}
+    for child in model:
+        tag, name = _local(child.tag), child.get('name')
+        if tag == 'field':
+            values = [value.text for value in child if _local(value.tag) == 'value']
+            record[name] = values[0] if values else None
+        elif tag == 'multiField':
+            record[name] = [value.text for value in child]
+        elif tag == 'modelField':
+            models = [to_record(sub) for sub in child if _local(sub.tag) == 'model']
+            record[name] = models[0] if models else None
+        elif tag == 'multiModelField':
+            record[name] = [to_record(sub) for sub in child if _local(sub.tag) == 'model']
+    return record
+
+
+def iter_records(stream):
+    """Yield each top-level decoded model of a report as a record dict"""
+    depth = 0
+    parents = []
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            depth += _local(element.tag) == 'model'
+            continue
+        parents.pop()
+        if _local(element.tag) != 'model':
+            continue
+        depth -= 1
+        if depth == 0:
+            yield to_record(element)
+            # Detach the finished model so the tree never grows past one record
+            parents[-1].clear()
+
+
+def parse_timestamp(value):
+    """Naive UTC datetime from a UFDR timestamp, or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class RecordMapper:
+    """Turn extraction records into entity and connection rows for one case.
+
+    `seen` keeps the ids of the `seen_limit` most recently used entities; an
+    entity used again after its id was dropped is emitted (and upserted) again.
+    """
+
+    def __init__(self, case_id, device_label, seen_limit=100000):
+        self.case_id = case_id
+        self.seen = OrderedDict()
+        self.seen_limit = seen_limit
+        self.device_id = self._id('device', device_label)
+        self.device = {
+            'id': self.device_id, 'case_id': case_id, 'label': device_label, 'type': 'phone',
+            'size': 70, 'icon': '📱', 'meta_data': {'role': 'Extraction Device'}, 'timestamp': None
+        }
+
+    def _id(self, kind, value):
+        digest = hashlib.sha1(f'{self.case_id}|{kind}|{value}'.encode()).hexdigest()[:20]
+        return f'{kind}-{digest}'
+
+    def _emitted(self, entity_id):
+        """Whether `entity_id` was emitted recently; remembers it either way"""
+        if entity_id in self.seen:
+            self.seen.move_to_end(entity_id)
+            return True
+        self.seen[entity_id] = None
+        if len(self.seen) > self.seen_limit:
+            self.seen.popitem(last=False)
+        return False
+
+    def entity(self, kind, value, label=None, entity_type=None, icon=None, metadata=None):
+        """(entity id, row); row is None if the entity was already emitted"""
+        entity_id = self._id(kind, value)
+        if self._emitted(entity_id):
+            return entity_id, None
+        return entity_id, {
+            'id': entity_id, 'case_id': self.case_id, 'label': label or value,
+            'type': entity_type or kind, 'size': 50, 'icon': icon,
+            'meta_data': metadata or {}, 'timestamp': None
+        }
+
+    def identifier(self, value, label=None):
+        """Entity for a phone number or email address, shared by every record using it"""
+        kind = 'email' if '@' in value else 'phone'
+        return self.entity(kind, identifiers.normalize(kind, value) or value, label=label or value,
+                           entity_type='keyword' if kind == 'email' else 'phone',
+                           icon='✉️' if kind == 'email' else '📱', metadata={kind: value})
+
+    def party(self, party, entities):
+        """Entity id of a call or message party; the device owner maps to the device"""
+        if not party:
+            return None
+        if str(party.get('IsPhoneOwner', '')).lower() == 'true':
+            return self.device_id
+        identifier = party.get('Identifier') or party.get('Name')
+        if not identifier:
+            return None
+        entity_id, row = self.identifier(identifier, party.get('Name'))
+        if row:
+            entities.append(row)
+        return entity_id
+
+    def connection(self, record, source, target, connection_type, data, timestamp, suffix=''):
+        return {
+            'id': self._id('conn', f"{record.get('id') or repr(record)}{suffix}"),
+            'case_id': self.case_id, 'source': source, 'target': target,
+            'type': connection_type, 'weight': 1, 'data': data, 'timestamp': timestamp
+        }
+
+    def map(self, record):
+        """(entities, connections) rows for one record"""
+        entities, connections = [], []
+        if not self._emitted(self.device_id):
+            entities.append(self.device)
+        model_type = record.get('type') or ''
+
+        if model_type == 'Contact':
+            name = record.get('Name') or 'Unknown contact'
+            person_id, row = self.entity('person', f"{name}|{record.get('id')}", label=name,
+                                         entity_type='person', icon='👤',
+                                         metadata={'source': record.get('Source')})
+            if row:
+                entities.append(row)
+            connections.append(self.connection(record, self.device_id, person_id, 'Contact Entry',
+                                               {'source': record.get('Source')}, None))
+            for index, entry in enumerate(record.get('Entries') or []):
+                value = entry.get('Value')
+                if not value:
+                    continue
+                entry_id, row = self.identifier(value)
+                if row:
+                    entities.append(row)
+                connections.append(self.connection(record, person_id, entry_id, 'Uses Identifier',
+                                                   {'category': entry.get('Category')}, None, f'#{index}'))
+
+        elif model_type == 'Call':
+            parties = [self.party(party, entities) for party in record.get('Parties') or []]
+            parties = [party for party in parties if party]
+            if len(parties) == 1:
+                parties.insert(0, self.device_id)
+            if len(parties) >= 2:
+                connections.append(self.connection(
+                    record, parties[0], parties[1], 'Phone Call',
+                    {'direction': record.get('Direction'), 'duration': record.get('Duration'),
+                     'status': record.get('Status')},
+                    parse_timestamp(record.get('TimeStamp'))
+                ))
+
+        elif model_type in MESSAGE_TYPES:
+            sender = self.party(record.get('From'), entities) or self.device_id
+            body = record.get('Body') or record.get('Subject') or ''
+            timestamp = parse_timestamp(record.get('TimeStamp'))
+            for index, recipient in enumerate(record.get('To') or [None]):
+                target = self.party(recipient, entities) or self.device_id
+                if target == sender:
+                    continue
+                connections.append(self.connection(
+                    record, sender, target, MESSAGE_TYPES[model_type],
+                    {'snippet': body[:500], 'app': record.get('Source')}, timestamp, f'#{index}'
+                ))
+
+        elif 'Wallet' in model_type:
+            address = record.get('Address') or record.get('Identifier')
+            if address:
+                wallet_id, row = self.entity('wallet', address, label=f'Wallet {address[:12]}',
+                                             entity_type='financial', icon='💰',
+                                             metadata={'address': address, 'currency': record.get('Currency')})
+                if row:
+                    entities.append(row)
+                connections.append(self.connection(record, self.device_id, wallet_id, 'Wallet Access',
+                                                   {'app': record.get('Source')}, None))
+        return entities, connections
+
+
+def run_ingest_job(job_id, path, case_id, device_label):
+    """Worker-process entry point: ingest one uploaded extraction"""
+    from app import app, db, Connection, Entity, Job, bump_case_version, case_scope, upsert_statement
+
+    with app.app_context(), case_scope(case_id):
+        job = db.session.get(Job, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        batch_size = app.config['BULK_BATCH_SIZE']
+        entity_insert = upsert_statement(Entity, 'update')
+        connection_insert = upsert_statement(Connection, 'update')
+        started = time.perf_counter()
+        try:
+            raw, total = open_report(path)
+            stream = CountingReader(raw)
+            job.bytes_total = total
+            # A batch must not repeat an id, so remember at least a batch's worth
+            mapper = RecordMapper(case_id, device_label,
+                                  max(app.config['INGEST_SEEN_IDS'], batch_size))
+            entities, connections = [], []
+            records = 0
+
+            def flush():
+                if entities:
+                    db.session.execute(entity_insert, entities)
+                    identifiers.sync(db.session, [row['id'] for row in entities])
+                if connections:
+                    db.session.execute(connection_insert, connections)
+                bump_case_version(case_id)
+                job.records_read = records
+                job.entities_written = (job.entities_written or 0) + len(entities)
+                job.connections_written = (job.connections_written or 0) + len(connections)
+                job.bytes_read = stream.bytes_read
+                job.elapsed_seconds = time.perf_counter() - started
+                db.session.commit()
+                entities.clear()
+                connections.clear()
+
+            with raw:
+                for record in iter_records(stream):
+                    records += 1
+                    new_entities, new_connections = mapper.map(record)
+                    entities.extend(new_entities)
+                    connections.extend(new_connections)
+                    if len(entities) + len(connections) >= batch_size:
+                        flush()
+                flush()
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.elapsed_seconds = time.perf_counter() - started
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if os.path.exists(path):
+                os.remove(path)
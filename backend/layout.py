@@ -0,0 +1,259 @@
+"""Multilevel force-directed layout of a case graph with numpy and scipy.
+
+The graph is coarsened repeatedly: every entity joins the group of its
+heaviest neighbour when that neighbour ranks above it (by link weight, then
+degree), so leaves collapse into hubs and each level has a fraction of the
+nodes of the one below. The coarsest graph is laid out from a random start,
+then every finer level starts from its groups' positions and is refined
+with fewer iterations.
+
+Each iteration is a handful of vectorized array operations. Forces follow
+Fruchterman-Reingold: links attract with `weight * d² / k` and nodes repel
+with `k² * mass / d`, where mass grows with `Entity.size` and with the
+number of entities a coarse node stands for. Up to EXACT_LIMIT nodes every
+pair repels; above that nodes repel the mass centroids of a square grid of
+cells instead. A weak pull to the centre, growing like link attraction with
+`d²`, keeps components and isolated entities close to the rest.
+
+`extend` places new entities next to their positioned neighbours and
+refines only them, so nodes that already have a position never move.
+"""
+import numpy as np
+from scipy import sparse
+
+# Nodes repelling every other node exactly; larger graphs use grid centroids
+EXACT_LIMIT = 2000
+# Stop coarsening at this many nodes, or when a level shrinks by less than 10%
+COARSEST_SIZE = 50
+GRAVITY = 0.01
+
+
+def build(entities, connections):
+    """Entity ids, masses and a symmetric link-weight matrix.
+
+    `entities` are (id, size) rows and `connections` (source, target) rows;
+    links to entities outside `entities` and self-loops are skipped. Parallel
+    connections add up, damped with log1p so a busy pair does not collapse.
+    """
+    ids, sizes = [], []
+    for entity_id, size in entities:
+        ids.append(entity_id)
+        sizes.append(size or 0)
+    positions = {entity_id: i for i, entity_id in enumerate(ids)}
+    sources, targets = [], []
+    for source, target in connections:
+        i, j = positions.get(source), positions.get(target)
+        if i is not None and j is not None and i != j:
+            sources.append(i)
+            targets.append(j)
+
+    n = len(ids)
+    src = np.asarray(sources, dtype=np.int64)
+    dst = np.asarray(targets, dtype=np.int64)
+    counts = sparse.csr_matrix((np.ones(len(src) * 2), (np.concatenate([src, dst]), np.concatenate([dst, src]))),
+                               shape=(n, n))
+    weights = counts.copy()
+    weights.data = np.log1p(weights.data)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    mean = sizes[sizes > 0].mean() if (sizes > 0).any() else 1.0
+    mass = np.where(sizes > 0, sizes / mean, 1.0)
+    return ids, mass, weights
+
+
+def coarsen(weights, rng, rounds=3):
+    """Group of each node at the next level, or None when it would barely shrink.
+
+    A few rounds of heavy-edge matching pair unmatched nodes that pick each
+    other as their heaviest unmatched neighbour (ties broken at random); a
+    node left over then joins the pair of its heaviest matched neighbour, so
+    the leaves around a hub collapse into it.
+    """
+    n = weights.shape[0]
+    links = weights.tocoo()
+    partner = np.full(n, -1)
+
+    def heaviest(mask):
+        """Heaviest neighbour among `mask` of each node, -1 when it has none"""
+        keep = mask[links.col] & (links.row != links.col)
+        rows, cols = links.row[keep], links.col[keep]
+        score = links.data[keep] * (1 + rng.random(len(rows)) * 1e-3)
+        best = np.full(n, -1)
+        if len(rows):
+            order = np.lexsort((score, rows))
+            last = np.r_[rows[order][1:] != rows[order][:-1], True]
+            best[rows[order][last]] = cols[order][last]
+        return best
+
+    for _ in range(rounds):
+        free = partner < 0
+        choice = heaviest(free)
+        choice[~free] = -1
+        mutual = (choice >= 0) & (choice[np.maximum(choice, 0)] == np.arange(n))
+        if not mutual.any():
+            break
+        partner[mutual] = choice[mutual]
+
+    group = np.where(partner >= 0, np.minimum(np.arange(n), partner), np.arange(n))
+    leftover = partner < 0
+    anchor = heaviest(~leftover)
+    joins = leftover & (anchor >= 0)
+    group[joins] = group[anchor[joins]]
+    _, groups = np.unique(group, return_inverse=True)
+    if groups.max(initial=-1) + 1 > 0.9 * n:
+        return None
+    return groups
+
+
+def _push(block, sources, source_mass, k):
+    """Repulsion factor between each row of `block` and each source"""
+    distance2 = ((block ** 2).sum(axis=1)[:, None] + (sources ** 2).sum(axis=1)[None, :]
+                 - 2 * block @ sources.T)
+    # Coincident nodes push by a small fixed amount
+    np.maximum(distance2, (k * 0.01) ** 2, out=distance2)
+    push = (k * k) * source_mass / distance2
+    return push
+
+
+def _repulsion(pos, mass, k, rows, chunk=512):
+    """Repulsion on the nodes `rows` from every node"""
+    n = len(pos)
+    force = np.empty((len(rows), 2))
+    if n <= EXACT_LIMIT:
+        for start in range(0, len(rows), chunk):
+            block = pos[rows[start:start + chunk]]
+            push = _push(block, pos, mass, k)
+            force[start:start + chunk] = block * push.sum(axis=1)[:, None] - push @ pos
+        return force
+
+    # Nodes in the same cell of a grid of about sqrt(n) cells repel exactly;
+    # other cells repel as a point mass at their centroid. Cell edges are
+    # quantiles of each axis, so dense regions get small cells.
+    side = max(2, int(np.ceil(n ** 0.25)))
+    cuts = np.quantile(pos, np.linspace(0, 1, side + 1)[1:-1], axis=0)
+    cell = np.searchsorted(cuts[:, 0], pos[:, 0]) * side + np.searchsorted(cuts[:, 1], pos[:, 1])
+    filled, own = np.unique(cell, return_inverse=True)
+    cell_mass = np.bincount(own, weights=mass)
+    centroids = np.stack([np.bincount(own, weights=mass * pos[:, axis]) for axis in (0, 1)],
+                         axis=1) / cell_mass[:, None]
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        block = pos[part]
+        push = _push(block, centroids, cell_mass, k)
+        push[np.arange(len(part)), own[part]] = 0
+        force[start:start + chunk] = block * push.sum(axis=1)[:, None] - push @ centroids
+
+    cells = np.arange(len(filled) + 1)
+    order = np.argsort(own, kind='stable')
+    bounds = np.searchsorted(own[order], cells)
+    row_order = np.argsort(own[rows], kind='stable')
+    row_bounds = np.searchsorted(own[rows][row_order], cells)
+    for c in np.unique(own[rows]):
+        members = order[bounds[c]:bounds[c + 1]]
+        if len(members) < 2:
+            continue
+        sources = pos[members]
+        targets = row_order[row_bounds[c]:row_bounds[c + 1]]
+        for start in range(0, len(targets), chunk):
+            local = targets[start:start + chunk]
+            block = pos[rows[local]]
+            push = _push(block, sources, mass[members], k)
+            force[local] += block * push.sum(axis=1)[:, None] - push @ sources
+    return force
+
+
+def _attraction(pos, links, mass, k, rows):
+    """Pull on the nodes `rows` along their links; `links` holds their rows of the weights"""
+    delta = pos[links.col] - pos[rows[links.row]]
+    distance = np.sqrt((delta ** 2).sum(axis=1))
+    pull = delta * (links.data * distance / k)[:, None]
+    force = np.stack([np.bincount(links.row, weights=pull[:, axis], minlength=len(rows)) for axis in (0, 1)],
+                     axis=1)
+    return force / mass[rows, None]
+
+
+def refine(pos, weights, mass, k, iterations, temperature, movable=None):
+    """Move nodes along the net force for `iterations` steps, cooling linearly.
+
+    Each step moves a node by at most the current temperature. With
+    `movable`, a boolean mask, only those nodes move and only their forces
+    are computed.
+    """
+    rows = np.arange(len(pos)) if movable is None else np.flatnonzero(movable)
+    links = (weights if movable is None else weights.tocsr()[rows]).tocoo()
+    centre = np.average(pos, axis=0, weights=mass) if len(pos) else np.zeros(2)
+    for step in range(iterations):
+        offset = pos[rows] - centre
+        pull = GRAVITY * np.sqrt((offset ** 2).sum(axis=1)) / k
+        force = (_repulsion(pos, mass, k, rows) + _attraction(pos, links, mass, k, rows)
+                 - offset * pull[:, None])
+        length = np.sqrt((force ** 2).sum(axis=1))
+        limit = temperature * (1 - step / iterations)
+        pos[rows] += force * (np.minimum(length, limit) / np.maximum(length, 1e-9))[:, None]
+    return pos
+
+
+def compute(weights, mass, k=150.0, iterations=200, seed=47):
+    """(n, 2) positions of every node, roughly `k` apart along links"""
+    n = weights.shape[0]
+    rng = np.random.default_rng(seed)
+    levels = [(weights, mass, None)]
+    while levels[-1][0].shape[0] > COARSEST_SIZE:
+        fine, fine_mass, _ = levels[-1]
+        groups = coarsen(fine, rng)
+        if groups is None:
+            break
+        membership = sparse.csr_matrix((np.ones(len(groups)), (np.arange(len(groups)), groups)))
+        coarse = (membership.T @ fine @ membership).tocsr()
+        coarse.setdiag(0)
+        coarse.eliminate_zeros()
+        levels.append((coarse, membership.T @ fine_mass, groups))
+
+    coarsest, coarsest_mass, _ = levels[-1]
+    radius = k * np.sqrt(coarsest_mass.sum())
+    pos = rng.uniform(-radius, radius, (coarsest.shape[0], 2))
+    pos = refine(pos, coarsest, coarsest_mass, k, iterations, radius / 2)
+    for level in range(len(levels) - 1, 0, -1):
+        groups = levels[level][2]
+        finer, finer_mass, _ = levels[level - 1]
+        # Children start around their group, spread by its size
+        spread = k * np.sqrt(levels[level][1])[groups] / 2
+        pos = pos[groups] + rng.normal(0, 1, (len(groups), 2)) * spread[:, None]
+        steps = max(20, iterations // (2 + len(levels) - level))
+        pos = refine(pos, finer, finer_mass, k, steps, k * 2)
+    return pos if n else np.zeros((0, 2))
+
+
+def extend(weights, mass, pos, placed, k=150.0, iterations=50, seed=47):
+    """Position the nodes not `placed` without moving those that are.
+
+    New nodes start at the mean of their placed neighbours, in rounds so
+    chains of new nodes grow outwards; new components with no placed
+    neighbour are laid out on their own beside the existing drawing.
+    """
+    rng = np.random.default_rng(seed)
+    pos = np.array(pos, dtype=np.float64)
+    placed = np.array(placed, dtype=bool)
+    new = ~placed
+    if not new.any():
+        return pos
+    links = weights.tocsr()
+    known = placed.copy()
+    while True:
+        # Sum of known neighbour positions and their count, per node
+        reach = links @ known.astype(np.float64)
+        frontier = ~known & (reach > 0)
+        if not frontier.any():
+            break
+        total = links @ (pos * known[:, None])
+        pos[frontier] = total[frontier] / reach[frontier, None] + rng.normal(0, k / 2, (frontier.sum(), 2))
+        known |= frontier
+
+    orphans = ~known
+    if orphans.any():
+        subset = np.flatnonzero(orphans)
+        own = compute(links[subset][:, subset], mass[subset], k, seed=seed)
+        if placed.any():
+            edge = pos[placed, 0].max() + 2 * k
+            own += [edge - own[:, 0].min(), pos[placed, 1].mean() - own[:, 1].mean()]
+        pos[subset] = own
+    return refine(pos, links, mass, k, iterations, k, movable=new)
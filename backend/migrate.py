@@ -0,0 +1,311 @@
+"""Schema migrations for existing Forensi-Link databases.
+
+`db.create_all()` only creates missing tables, so indexes and columns added to
+the models after a database file was created never reach it. Each migration
+below is applied once, in order, and recorded in the `schema_migrations` table.
+
+Usage:
+    python migrate.py
+"""
+import glob
+import os
+import re
+import shutil
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+import archive
+import changes
+import facets
+import identifiers
+import search_index
+import shards
+from app import SHARD_TABLES, app, db
+
+
+def _legacy_path(folder, case_id, suffix='.db'):
+    """File of a case as named before case ids were hashed into file names"""
+    return os.path.join(folder, re.sub(r'[^A-Za-z0-9_.-]', '_', case_id) + suffix)
+
+
+def _move_legacy_files(moves):
+    """Move files named after case ids to their new names.
+
+    `moves` maps each old path to the (case_id, new path) of every case whose
+    id reduced to that name. Each of them gets the file: copies for all but
+    the last, which takes the file itself. Rows are keyed by case, so a case
+    only ever reads its own rows from a file it shares. Returns the
+    (case_id, new path) pairs that got a file.
+    """
+    moved = []
+    for old, cases in moves.items():
+        if not os.path.exists(old):
+            continue
+        if os.path.exists(old + '-wal'):
+            conn = sqlite3.connect(old)
+            try:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            finally:
+                conn.close()
+        cases = [(case_id, new) for case_id, new in cases if not os.path.exists(new)]
+        for i, (case_id, new) in enumerate(cases):
+            if i < len(cases) - 1:
+                shutil.copy2(old, new)
+            else:
+                os.replace(old, new)
+            moved.append((case_id, new))
+        if cases:
+            shards.remove(old)
+    return moved
+
+
+def _create_index(conn, name, table, columns):
+    conn.execute(text(
+        f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'
+    ))
+
+
+def migration_001_case_indexes(conn):
+    """Composite indexes for case-scoped graph queries"""
+    _create_index(conn, 'ix_entities_case_id_type', 'entities', ['case_id', 'type'])
+    _create_index(conn, 'ix_connections_case_id_source', 'connections', ['case_id', 'source'])
+    _create_index(conn, 'ix_connections_case_id_target', 'connections', ['case_id', 'target'])
+    _create_index(conn, 'ix_connections_case_id_timestamp', 'connections', ['case_id', 'timestamp'])
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text('ANALYZE'))
+
+
+def migration_002_keyset_indexes(conn):
+    """(case_id, id) indexes so keyset pages of a case are a single seek"""
+    _create_index(conn, 'ix_entities_case_id_id', 'entities', ['case_id', 'id'])
+    _create_index(conn, 'ix_connections_case_id_id', 'connections', ['case_id', 'id'])
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def migration_003_case_version(conn):
+    """Per-case version counter used to key cached responses"""
+    _add_column(conn, 'cases', 'version', "INTEGER NOT NULL DEFAULT 1")
+
+
+def migration_004_search_index(conn):
+    """FTS5 index over case, entity and connection text (SQLite only)"""
+    if conn.dialect.name == 'sqlite':
+        search_index.create(conn)
+
+
+def migration_005_timeline_indexes(conn):
+    """Time-window indexes; (case_id, timestamp, type) covers timeline counts"""
+    _create_index(conn, 'ix_entities_case_id_timestamp', 'entities', ['case_id', 'timestamp'])
+    _create_index(conn, 'ix_connections_case_timeline', 'connections', ['case_id', 'timestamp', 'type'])
+    conn.execute(text('DROP INDEX IF EXISTS ix_connections_case_id_timestamp'))
+
+
+def migration_006_analytics_tables(conn):
+    """Stored per-case and per-entity graph analytics"""
+    db.metadata.create_all(conn, tables=[
+        db.metadata.tables['case_analytics'], db.metadata.tables['entity_analytics']
+    ])
+
+
+def migration_007_jobs(conn):
+    """Background job table for extraction ingest progress"""
+    db.metadata.create_all(conn, tables=[db.metadata.tables['jobs']])
+
+
+def migration_008_entity_identifiers(conn):
+    """Cross-case identifier index, filled from existing entity metadata"""
+    db.metadata.create_all(conn, tables=[db.metadata.tables['entity_identifiers']])
+    identifiers.rebuild(conn)
+
+
+def migration_009_graph_changes(conn):
+    """Per-case change log behind /graph/changes (SQLite only)"""
+    if conn.dialect.name == 'sqlite':
+        changes.create(conn)
+
+
+def migration_010_job_rows(conn):
+    """Row progress of case delete, archive and restore jobs"""
+    _add_column(conn, 'jobs', 'rows_total', 'INTEGER')
+    _add_column(conn, 'jobs', 'rows_done', 'INTEGER DEFAULT 0')
+
+
+def migration_011_layouts(conn):
+    """Stored server-side graph layouts"""
+    db.metadata.create_all(conn, tables=[
+        db.metadata.tables['case_layouts'], db.metadata.tables['entity_layouts']
+    ])
+
+
+def migration_012_case_storage(conn):
+    """Where each case's rows are stored: here, or in a hot or cold shard file"""
+    _add_column(conn, 'cases', 'storage', 'VARCHAR(10)')
+
+
+def migration_013_facets(conn):
+    """Materialized case facet counts and per-case statistics (SQLite only)"""
+    if conn.dialect.name == 'sqlite':
+        facets.create(conn)
+
+
+def migration_014_phone_e164(conn):
+    """Key indexed phone numbers in E.164 form with the default country code"""
+    identifiers.renormalize(conn, 'phone')
+
+
+def migration_015_shard_file_names(conn):
+    """Rename shard files to names unique to their case id (SQLite only)"""
+    if conn.dialect.name != 'sqlite':
+        return
+    hot_folder, cold_folder = app.config['SHARD_FOLDER'], app.config['SHARD_COLD_FOLDER']
+    moves = {}
+    hot = set()
+    for case_id, storage in conn.execute(text('SELECT id, storage FROM cases WHERE storage IS NOT NULL')):
+        if storage == 'hot':
+            hot.add(shards.shard_path(hot_folder, case_id))
+            targets = [(hot_folder, False)]
+        else:
+            targets = [(cold_folder, True), (cold_folder, False)]
+        for folder, compressed in targets:
+            moves.setdefault(_legacy_path(folder, case_id, '.db.gz' if compressed else '.db'), []).append(
+                (case_id, shards.shard_path(folder, case_id, compressed)))
+    # Cold shards are read-only; they are claimed when thawed
+    for case_id, path in _move_legacy_files(moves):
+        if path in hot:
+            shards.create(path, lambda shard: shards.claim(shard, case_id))
+
+
+def migration_016_archive_file_names(conn):
+    """Rename archive files to names unique to their case id"""
+    folder = app.config['ARCHIVE_FOLDER']
+    moves = {}
+    for case_id in conn.execute(text("SELECT id FROM cases WHERE status = 'archived'")).scalars():
+        old = _legacy_path(folder, case_id)
+        if case_id in archive.archived_cases(old):
+            moves.setdefault(old, []).append((case_id, archive.archive_path(folder, case_id)))
+    # A file shared by several cases is copied to each; every copy keeps one case
+    for case_id, path in _move_legacy_files(moves):
+        archive_conn = sqlite3.connect(path)
+        try:
+            tables = [row[0] for row in archive_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                key = 'id' if table == 'cases' else 'case_id'
+                archive_conn.execute(f'DELETE FROM {table} WHERE {key} != ?', (case_id,))
+            archive_conn.commit()
+        finally:
+            archive_conn.close()
+
+
+def shard_migration_013_case_stats(conn):
+    """Per-case statistics of a shard's rows"""
+    facets.create(conn, list(facets.COUNTED_TABLES))
+
+
+MIGRATIONS = [
+    (1, migration_001_case_indexes),
+    (2, migration_002_keyset_indexes),
+    (3, migration_003_case_version),
+    (4, migration_004_search_index),
+    (5, migration_005_timeline_indexes),
+    (6, migration_006_analytics_tables),
+    (7, migration_007_jobs),
+    (8, migration_008_entity_identifiers),
+    (9, migration_009_graph_changes),
+    (10, migration_010_job_rows),
+    (11, migration_011_layouts),
+    (12, migration_012_case_storage),
+    (13, migration_013_facets),
+    (14, migration_014_phone_e164),
+    (15, migration_015_shard_file_names),
+    (16, migration_016_archive_file_names),
+]
+
+# Migrations that change the schema of case shards, applied to shard files
+# created before them; a shard records its version in PRAGMA user_version
+SHARD_MIGRATIONS = [
+    (13, shard_migration_013_case_stats),
+]
+
+# Tables created by migrations rather than by the models
+MIGRATION_TABLES = search_index.FTS_TABLES + facets.TABLES + ['graph_changes', 'schema_migrations']
+
+
+def applied_versions(conn):
+    """Return the set of migration versions already applied"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def run_migrations(engine=None):
+    """Apply all pending migrations; must run inside an app context"""
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as conn:
+        if not inspect(conn).has_table('cases'):
+            db.metadata.create_all(conn)
+        done = applied_versions(conn)
+        for version, migration in MIGRATIONS:
+            if version in done:
+                continue
+            migration(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, applied_at) VALUES (:v, :t)'),
+                {'v': version, 't': datetime.utcnow()}
+            )
+            applied.append(version)
+    if engine.dialect.name == 'sqlite':
+        for path in glob.glob(os.path.join(app.config['SHARD_FOLDER'], '*.db')):
+            shards.create(path, upgrade_shard)
+    return applied
+
+
+def create_shard(conn, case_id):
+    """Schema of a new shard of a case (see shards.py): the row tables with
+    their indexes, full-text index and change log, at the latest migration"""
+    db.metadata.create_all(conn, tables=[db.metadata.tables[name] for name in SHARD_TABLES])
+    migration_001_case_indexes(conn)
+    migration_002_keyset_indexes(conn)
+    migration_005_timeline_indexes(conn)
+    search_index.create(conn, [name for name in SHARD_TABLES if name in search_index.INDEXED_TABLES])
+    changes.create(conn)
+    for _, migration in SHARD_MIGRATIONS:
+        migration(conn)
+    shards.claim(conn, case_id)
+    conn.execute(text(f'PRAGMA user_version = {MIGRATIONS[-1][0]}'))
+
+
+def upgrade_shard(conn):
+    """Apply the shard migrations a shard file is missing"""
+    version = conn.execute(text('PRAGMA user_version')).scalar()
+    for shard_version, migration in SHARD_MIGRATIONS:
+        if shard_version > version:
+            migration(conn)
+    conn.execute(text(f'PRAGMA user_version = {MIGRATIONS[-1][0]}'))
+
+
+def reset_database():
+    """Drop every table, including migration-managed ones, and rebuild the schema"""
+    db.drop_all()
+    with db.engine.begin() as conn:
+        for table in MIGRATION_TABLES:
+            conn.execute(text(f'DROP TABLE IF EXISTS {table}'))
+    db.create_all()
+    return run_migrations()
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        applied = run_migrations()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Database schema is up to date.")
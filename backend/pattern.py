@@ -0,0 +1,408 @@
+"""Pattern (motif) queries over a case's typed connections.
+
+A pattern names node variables with optional constraints and lists edges
+between them:
+
+    {"nodes": {"person": {"type": "person"}, "burner": {"type": "phone"},
+               "handler": {"type": "person"}},
+     "edges": [{"source": "person", "target": "burner", "type": "Phone Call"},
+               {"source": "burner", "target": "handler", "type": "Phone Call",
+                "min_weight": 2, "from": "2024-06-01", "to": "2024-07-01"}],
+     "within_days": 7, "ordered": true}
+
+Nodes take `type` (a name or a list) and `id`; edges take `type`,
+`min_weight`, `max_weight`, `from`, `to` and `directed` (default true; false
+matches either direction). `within_days` keeps matches whose connections all
+fall within that many days of each other, and `ordered` requires their
+timestamps to follow the order of `edges`. Distinct variables bind distinct
+entities and distinct connections.
+
+Matching runs over a MatchIndex: every connection in numpy arrays, with
+CSR offsets by source and by target and a sorted (source, target) key, all
+built once per case version. The edge with the fewest candidates seeds the
+match and the rest are joined in order of estimated fan-out, edges closing a
+cycle first, so filters prune as early as possible. Each join is a
+vectorized expansion of the partial matches through an index, done in
+batches, so a result limit or the deadline stops the work early.
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+# Most node variables and edges in one pattern
+MAX_NODES = 8
+MAX_EDGES = 12
+# Index slots expanded per batch; bounds memory on hub entities
+BATCH_SLOTS = 250000
+
+
+class PatternError(ValueError):
+    """Invalid pattern; the message is returned to the client"""
+
+
+def _codes(values):
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), np.int64, len(values))
+    return index, codes
+
+
+def _csr(keys, n):
+    order = np.argsort(keys, kind='stable')
+    return np.searchsorted(keys[order], np.arange(n + 1)), order
+
+
+def _epoch_seconds(timestamp):
+    return (timestamp - EPOCH).total_seconds() if timestamp is not None else np.nan
+
+
+class MatchIndex:
+    """Connections of one case as arrays, indexed by source, target and pair"""
+
+    def __init__(self, entities, connections):
+        """Build from (id, type) entity rows and (id, source, target, type,
+        weight, timestamp) connection rows"""
+        self.ids = []
+        self.positions = {}
+        types = []
+        for entity_id, entity_type in entities:
+            self.positions[entity_id] = len(self.ids)
+            self.ids.append(entity_id)
+            types.append(entity_type)
+
+        self.edge_ids = []
+        sources, targets, edge_types, weights, stamps = [], [], [], [], []
+        for edge_id, source, target, edge_type, weight, timestamp in connections:
+            for entity_id in (source, target):
+                if entity_id not in self.positions:
+                    # Dangling endpoint: matches untyped node variables only
+                    self.positions[entity_id] = len(self.ids)
+                    self.ids.append(entity_id)
+                    types.append(None)
+            self.edge_ids.append(edge_id)
+            sources.append(self.positions[source])
+            targets.append(self.positions[target])
+            edge_types.append(edge_type)
+            weights.append(weight if weight is not None else 1)
+            stamps.append(_epoch_seconds(timestamp))
+
+        n = len(self.ids)
+        self.node_types, self.node_type = _codes(types)
+        self.edge_types, self.edge_type = _codes(edge_types)
+        self.source = np.asarray(sources, dtype=np.int64)
+        self.target = np.asarray(targets, dtype=np.int64)
+        self.weight = np.asarray(weights, dtype=np.float64)
+        self.timestamp = np.asarray(stamps, dtype=np.float64)
+        self.outgoing = _csr(self.source, n)
+        self.incoming = _csr(self.target, n)
+        pairs = self.source * n + self.target
+        self.pair_order = np.argsort(pairs, kind='stable')
+        self.pair_keys = pairs[self.pair_order]
+
+    def __len__(self):
+        return len(self.edge_ids)
+
+
+def _names(value, field):
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+        return value
+    raise PatternError(f'{field} must be a name or a list of names')
+
+
+def _type_mask(codes, index, names):
+    wanted = [index[name] for name in names if name in index]
+    return np.isin(codes, wanted)
+
+
+def _number(spec, field, where):
+    value = spec.get(field)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise PatternError(f'{where}: {field} must be a number')
+    return value
+
+
+def _instant(spec, field, where):
+    value = spec.get(field)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PatternError(f'{where}: {field} must be an ISO-8601 date or time')
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return _epoch_seconds(parsed)
+
+
+class Pattern:
+    """A validated pattern with its node and edge candidate masks"""
+
+    NODE_FIELDS = {'type', 'id'}
+    EDGE_FIELDS = {'source', 'target', 'type', 'min_weight', 'max_weight', 'from', 'to', 'directed'}
+
+    def __init__(self, index, spec):
+        nodes, edges = spec.get('nodes'), spec.get('edges')
+        if not isinstance(nodes, dict) or not nodes or len(nodes) > MAX_NODES:
+            raise PatternError(f'nodes must map 1 to {MAX_NODES} variable names to constraints')
+        if not isinstance(edges, list) or not edges or len(edges) > MAX_EDGES:
+            raise PatternError(f'edges must list 1 to {MAX_EDGES} edges')
+
+        self.index = index
+        self.variables = list(nodes)
+        self.node_masks = {}
+        for name, constraints in nodes.items():
+            constraints = constraints or {}
+            if not isinstance(constraints, dict) or set(constraints) - self.NODE_FIELDS:
+                raise PatternError(f"node {name}: constraints may only be {', '.join(sorted(self.NODE_FIELDS))}")
+            mask = np.ones(len(index.ids), dtype=bool)
+            if 'type' in constraints:
+                mask &= _type_mask(index.node_type, index.node_types,
+                                   _names(constraints['type'], f'node {name}: type'))
+            if 'id' in constraints:
+                pinned = np.zeros_like(mask)
+                position = index.positions.get(constraints['id'])
+                if position is not None:
+                    pinned[position] = True
+                mask &= pinned
+            self.node_masks[name] = mask
+
+        self.edges = []
+        for number, edge in enumerate(edges):
+            where = f'edge {number}'
+            if not isinstance(edge, dict) or set(edge) - self.EDGE_FIELDS:
+                raise PatternError(f"{where}: fields may only be {', '.join(sorted(self.EDGE_FIELDS))}")
+            source, target = edge.get('source'), edge.get('target')
+            if source not in nodes or target not in nodes:
+                raise PatternError(f'{where}: source and target must be node variables')
+            if source == target:
+                raise PatternError(f'{where}: source and target must be different variables')
+            mask = np.ones(len(index), dtype=bool)
+            if 'type' in edge:
+                mask &= _type_mask(index.edge_type, index.edge_types, _names(edge['type'], f'{where}: type'))
+            low, high = _number(edge, 'min_weight', where), _number(edge, 'max_weight', where)
+            if low is not None:
+                mask &= index.weight >= low
+            if high is not None:
+                mask &= index.weight <= high
+            start, end = _instant(edge, 'from', where), _instant(edge, 'to', where)
+            if start is not None:
+                mask &= index.timestamp >= start
+            if end is not None:
+                mask &= index.timestamp <= end
+            directed = edge.get('directed', True)
+            if not isinstance(directed, bool):
+                raise PatternError(f'{where}: directed must be true or false')
+            forward = mask & self.node_masks[source][index.source] & self.node_masks[target][index.target]
+            backward = None if directed else (
+                mask & self.node_masks[target][index.source] & self.node_masks[source][index.target])
+            self.edges.append({'source': source, 'target': target, 'forward': forward, 'backward': backward})
+
+        span = _number(spec, 'within_days', 'pattern')
+        self.span = span * 86400 if span is not None else None
+        self.ordered = spec.get('ordered', False)
+        if not isinstance(self.ordered, bool):
+            raise PatternError('ordered must be true or false')
+        self.timed = self.span is not None or self.ordered
+        self.plan = self._plan()
+
+    def _candidates(self, edge):
+        count = int(edge['forward'].sum())
+        return count + int(edge['backward'].sum()) if edge['backward'] is not None else count
+
+    def _plan(self):
+        """Join order: (edge number, bound variable or None, estimated rows per bound row)"""
+        counts = [self._candidates(edge) for edge in self.edges]
+        first = int(np.argmin(counts))
+        plan = [(first, None, counts[first])]
+        bound = {self.edges[first]['source'], self.edges[first]['target']}
+        remaining = set(range(len(self.edges))) - {first}
+        while remaining:
+            options = []
+            for number in remaining:
+                edge = self.edges[number]
+                ends = {edge['source'], edge['target']} & bound
+                if len(ends) == 2:
+                    options.append((0, number, None, 0))
+                elif ends:
+                    known = ends.pop()
+                    column = self.index.source if known == edge['source'] else self.index.target
+                    reach = np.count_nonzero(np.bincount(column[edge['forward']])) if counts[number] else 0
+                    fanout = counts[number] / max(reach, 1)
+                    options.append((1, number, known, fanout))
+            if not options:
+                raise PatternError('the edges must connect every node variable into one pattern')
+            _, number, known, fanout = min(options, key=lambda option: (option[0], option[3]))
+            plan.append((number, known, fanout))
+            bound |= {self.edges[number]['source'], self.edges[number]['target']}
+            remaining.discard(number)
+        if bound != set(self.variables):
+            raise PatternError('every node variable must be used by an edge')
+        return plan
+
+
+def _ranges(starts, counts):
+    """Row of each slot and the slot itself, for ranges `starts[i]:starts[i] + counts[i]`"""
+    total = int(counts.sum())
+    rows = np.repeat(np.arange(len(counts)), counts)
+    slots = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return rows, slots
+
+
+class Matcher:
+    """Run a Pattern's plan, yielding partial-match tables in batches"""
+
+    def __init__(self, pattern, limit, deadline):
+        self.pattern = pattern
+        self.index = pattern.index
+        self.limit = limit
+        self.deadline = deadline
+        self.timed_out = False
+
+    def run(self):
+        """Complete matches as {variable or edge number: array} tables"""
+        first, _, _ = self.pattern.plan[0]
+        edge = self.pattern.edges[first]
+        index = self.index
+        tables = []
+        for mask, near, far in ((edge['forward'], index.source, index.target),
+                                (edge['backward'], index.target, index.source)):
+            if mask is None:
+                continue
+            edges = np.flatnonzero(mask)
+            tables.append({edge['source']: near[edges], edge['target']: far[edges], first: edges})
+        seeds = {key: np.concatenate([table[key] for table in tables]) for key in tables[0]}
+        seeds = self._timed(seeds, first)
+        yield from self._join(1, seeds)
+
+    def _expired(self):
+        if time.perf_counter() > self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def _join(self, step, table):
+        size = len(table[self.pattern.plan[0][0]])
+        if size == 0:
+            return
+        if step == len(self.pattern.plan):
+            yield table
+            return
+        number, known, _ = self.pattern.plan[step]
+        work = self._slots(number, known, table)
+        # Batches of whole rows holding about BATCH_SLOTS index slots each
+        bounds = np.searchsorted(np.cumsum(work), np.arange(BATCH_SLOTS, int(work.sum()), BATCH_SLOTS))
+        for rows in np.split(np.arange(size), np.unique(bounds)):
+            if self._expired() or self.limit <= 0:
+                return
+            if len(rows):
+                batch = {key: column[rows] for key, column in table.items()}
+                yield from self._join(step + 1, self._extend(number, known, batch))
+
+    def _slots(self, number, known, table):
+        """Index slots each row will scan to join edge `number`"""
+        edge = self.pattern.edges[number]
+        if known is None:
+            return np.ones(len(table[edge['source']]), dtype=np.int64)
+        work = np.zeros(len(table[known]), dtype=np.int64)
+        for (offsets, _), _, _ in self._directions(edge, known):
+            work += offsets[table[known] + 1] - offsets[table[known]]
+        return work
+
+    def _directions(self, edge, known):
+        """(CSR, far endpoint column, mask) for each way edge may leave `known`"""
+        index = self.index
+        out = (index.outgoing, index.target)
+        into = (index.incoming, index.source)
+        near, away = (out, into) if known == edge['source'] else (into, out)
+        ways = [(*near, edge['forward'])]
+        if edge['backward'] is not None:
+            ways.append((*away, edge['backward']))
+        return ways
+
+    def _extend(self, number, known, table):
+        edge = self.pattern.edges[number]
+        index = self.index
+        n = len(index.ids)
+        parts = []
+        if known is None:
+            # Both ends bound: look the pairs up in the sorted pair keys
+            ways = [(table[edge['source']], table[edge['target']], edge['forward'])]
+            if edge['backward'] is not None:
+                ways.append((table[edge['target']], table[edge['source']], edge['backward']))
+            for sources, targets, mask in ways:
+                keys = sources * n + targets
+                starts = np.searchsorted(index.pair_keys, keys, 'left')
+                counts = np.searchsorted(index.pair_keys, keys, 'right') - starts
+                rows, slots = _ranges(starts, counts)
+                edges = index.pair_order[slots]
+                keep = mask[edges]
+                parts.append((rows[keep], edges[keep], None))
+        else:
+            other = edge['target'] if known == edge['source'] else edge['source']
+            for (offsets, order), far, mask in self._directions(edge, known):
+                starts = offsets[table[known]]
+                rows, slots = _ranges(starts, offsets[table[known] + 1] - starts)
+                edges = order[slots]
+                keep = mask[edges]
+                parts.append((rows[keep], edges[keep], far[edges[keep]]))
+
+        rows = np.concatenate([part[0] for part in parts])
+        joined = {key: column[rows] for key, column in table.items()}
+        joined[number] = np.concatenate([part[1] for part in parts])
+        keep = np.ones(len(rows), dtype=bool)
+        if known is not None:
+            joined[other] = np.concatenate([part[2] for part in parts])
+            for variable in self.pattern.variables:
+                if variable != other and variable in table:
+                    keep &= joined[variable] != joined[other]
+        for key in table:
+            if isinstance(key, int):
+                keep &= joined[key] != joined[number]
+        joined = {key: column[keep] for key, column in joined.items()}
+        return self._timed(joined, number)
+
+    def _timed(self, table, number):
+        """Drop rows breaking `within_days` or `ordered` once edge `number` is bound"""
+        pattern = self.pattern
+        if not pattern.timed:
+            return table
+        stamps = self.index.timestamp
+        bound = [key for key in table if isinstance(key, int)]
+        keep = ~np.isnan(stamps[table[number]])
+        if pattern.span is not None and len(bound) > 1:
+            times = np.stack([stamps[table[key]] for key in bound])
+            keep &= times.max(axis=0) - times.min(axis=0) <= pattern.span
+        if pattern.ordered:
+            for earlier, later in ((number - 1, number), (number, number + 1)):
+                if earlier in table and later in table:
+                    keep &= stamps[table[earlier]] <= stamps[table[later]]
+        return {key: column[keep] for key, column in table.items()}
+
+
+def match(index, spec, limit, timeout):
+    """Matches of `spec` in `index`, at most `limit`, within `timeout` seconds.
+
+    Returns (matches, summary): each match maps node variables to entity ids
+    and lists its connection ids in pattern order; the summary reports the
+    join plan and whether the limit or the deadline cut the search short.
+    Raises PatternError for an invalid pattern.
+    """
+    pattern = Pattern(index, spec)
+    matcher = Matcher(pattern, limit, time.perf_counter() + timeout)
+    matches = []
+    for table in matcher.run():
+        count = min(len(table[pattern.variables[0]]), limit - len(matches))
+        for row in range(count):
+            matches.append({
+                'nodes': {variable: index.ids[table[variable][row]] for variable in pattern.variables},
+                'edges': [index.edge_ids[table[number][row]] for number in range(len(pattern.edges))],
+            })
+        matcher.limit = limit - len(matches)
+        if matcher.limit <= 0:
+            break
+    plan = [{'edge': number, 'join': 'seed' if step == 0 else 'expand' if known else 'close', 'from': known,
+             'estimate': round(float(estimate), 2)}
+            for step, (number, known, estimate) in enumerate(pattern.plan)]
+    return matches, {'plan': plan, 'limited': len(matches) >= limit, 'timed_out': matcher.timed_out}
@@ -0,0 +1,137 @@
+"""SQLite FTS5 full-text index over cases, entities and connections.
+
+Each source table has a matching FTS5 table whose rowid is the source row's
+rowid, kept in sync by triggers so every write path (ORM, bulk upserts,
+cascaded deletes) updates the index inside the same transaction. JSON
+columns are flattened to their scalar leaves, so IMEIs, wallet addresses,
+emails and evidence snippets are all searchable.
+
+SQLite may renumber rowids on VACUUM for tables without an INTEGER PRIMARY
+KEY, so call `rebuild()` after vacuuming a database.
+"""
+from sqlalchemy import text
+
+# (source table, FTS columns, SQL producing each column from a row alias)
+INDEXED_TABLES = {
+    'cases': ('cases_fts', ('title', 'body'), ('{row}.title', '{row}.description')),
+    'entities': ('entities_fts', ('label', 'body'), (
+        '{row}.label',
+        "(SELECT group_concat(atom, ' ') FROM json_tree({row}.meta_data) WHERE atom IS NOT NULL)"
+    )),
+    'connections': ('connections_fts', ('type', 'body'), (
+        '{row}.type',
+        "(SELECT group_concat(atom, ' ') FROM json_tree({row}.data) WHERE atom IS NOT NULL)"
+    )),
+}
+
+FTS_TABLES = [fts for fts, _, _ in INDEXED_TABLES.values()]
+
+# Matches in titles and labels outrank matches in descriptions and metadata
+RANKING = 'bm25(10.0, 1.0)'
+
+
+def _values(expressions, row):
+    return ', '.join(expression.format(row=row) for expression in expressions)
+
+
+def create(conn, tables=None):
+    """Create the FTS tables and sync triggers, then index existing rows.
+
+    `tables` limits this to some source tables, e.g. those of a case shard.
+    """
+    tables = tables or list(INDEXED_TABLES)
+    for table in tables:
+        fts, columns, expressions = INDEXED_TABLES[table]
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{', '.join(columns)}, tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', '{RANKING}')"))
+
+        insert = (f"INSERT INTO {fts}(rowid, {', '.join(columns)}) "
+                  f"VALUES (NEW.rowid, {_values(expressions, 'NEW')});")
+        delete = f"DELETE FROM {fts} WHERE rowid = OLD.rowid;"
+        for event, body in (('INSERT', insert), ('DELETE', delete), ('UPDATE', delete + ' ' + insert)):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_{event.lower()} AFTER {event} ON {table} "
+                f"BEGIN {body} END"
+            ))
+    rebuild(conn, tables)
+
+
+def rebuild(conn, tables=None):
+    """Re-index every row from the source tables, or from `tables`"""
+    for table in tables or INDEXED_TABLES:
+        fts, columns, expressions = INDEXED_TABLES[table]
+        conn.execute(text(f"DELETE FROM {fts}"))
+        conn.execute(text(
+            f"INSERT INTO {fts}(rowid, {', '.join(columns)}) "
+            f"SELECT {table}.rowid, {_values(expressions, table)} FROM {table}"
+        ))
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('optimize')"))
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query of quoted prefix terms.
+
+    Quoting keeps punctuation in IMEIs, emails and addresses from being
+    parsed as FTS5 operators; every term must match.
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+SEARCH_QUERIES = {
+    'case': ('cases_fts', """
+        SELECT c.id, c.id AS case_id, c.title AS label,
+               snippet(cases_fts, -1, '[', ']', '...', 12) AS snippet, cases_fts.rank AS score
+        FROM cases_fts JOIN cases c ON c.rowid = cases_fts.rowid
+        WHERE cases_fts MATCH :q AND cases_fts.rowid > :floor
+        ORDER BY cases_fts.rank LIMIT :limit
+    """),
+    'entity': ('entities_fts', """
+        SELECT e.id, e.case_id, e.label,
+               snippet(entities_fts, -1, '[', ']', '...', 12) AS snippet, entities_fts.rank AS score
+        FROM entities_fts JOIN entities e ON e.rowid = entities_fts.rowid
+        WHERE entities_fts MATCH :q AND entities_fts.rowid > :floor
+        ORDER BY entities_fts.rank LIMIT :limit
+    """),
+    'connection': ('connections_fts', """
+        SELECT c.id, c.case_id, c.type AS label,
+               snippet(connections_fts, -1, '[', ']', '...', 12) AS snippet,
+               connections_fts.rank AS score
+        FROM connections_fts JOIN connections c ON c.rowid = connections_fts.rowid
+        WHERE connections_fts MATCH :q AND connections_fts.rowid > :floor
+        ORDER BY connections_fts.rank LIMIT :limit
+    """),
+}
+
+
+def search(conn, query, limit, window=5000, kinds=None):
+    """Best `limit` hits of each kind, ranked by BM25 (lower is better).
+
+    BM25 has to score every match before it can sort, which is slow for
+    terms that hit most of a large corpus. When a table has more than
+    `window` matches only the newest `window` (highest rowid) are ranked.
+    `kinds` limits the search to some of 'case', 'entity' and 'connection'.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    hits = []
+    for kind in kinds or SEARCH_QUERIES:
+        fts, sql = SEARCH_QUERIES[kind]
+        floor = conn.execute(text(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH :q ORDER BY rowid DESC LIMIT 1 OFFSET :window"
+        ), {'q': expression, 'window': window}).scalar()
+        params = {'q': expression, 'limit': limit, 'floor': -1 if floor is None else floor}
+        for row in conn.execute(text(sql), params):
+            hits.append({'kind': kind, **row._asdict()})
+    hits.sort(key=lambda hit: hit['score'])
+    return hits[:limit]
+
+
+def case_rowids_matching(query):
+    """SQL fragment restricting `cases` to rows whose FTS entry matches :fts_query"""
+    return text('cases.rowid IN (SELECT rowid FROM cases_fts WHERE cases_fts MATCH :fts_query)') \
+        .bindparams(fts_query=match_expression(query))
@@ -1,4 +1,5 @@
 from app import app, db, Case, Entity, Connection
+from migrate import reset_database
 from datetime import datetime
 
 def seed_database():
@@ -6,8 +7,7 @@ def seed_database():
     
     with app.app_context():
         # Clear existing data
-        db.drop_all()
-        db.create_all()
+        reset_database()
         
         print("Creating Arjun Varma case...")
         
@@ -0,0 +1,205 @@
+"""Per-case SQLite shard files, in a hot and a cold tier.
+
+In shard mode every case keeps its rows in a SQLite file of its own, and the
+main database is a catalog of cases, jobs and the cross-case identifier
+index. Each connection to a shard attaches the catalog as schema `catalog`.
+SQLite looks an unqualified table name up in `main` first and then in the
+attached databases, so the app's queries run unchanged on a shard
+connection: row tables resolve to the shard, and `cases`, `jobs` and
+`entity_identifiers` to the catalog.
+
+Shards of open cases are hot: writable files in the shard folder, each with
+its own WAL, locks and page cache, so an ingest into one case never grows
+the log or evicts the pages another case is read from. Closing a case
+compacts its shard into the cold tier with `VACUUM INTO`; the copy keeps a
+rollback journal, so it can be opened read-only, and may be gzip-compressed,
+in which case it is unpacked to a cache folder the first time it is opened.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, event
+
+import archive
+
+CATALOG_SCHEMA = 'catalog'
+# Table in each shard recording the case it holds
+OWNER_TABLE = 'shard_case'
+# Files SQLite keeps next to a database
+SIDE_FILES = ('-wal', '-shm', '-journal')
+
+
+def shard_path(folder, case_id, compressed=False):
+    """Shard file of a case in `folder`"""
+    path = os.path.join(folder, archive.case_file_name(case_id) + '.db')
+    return path + '.gz' if compressed else path
+
+
+def cold_path(folder, case_id):
+    """Cold shard of a case, compressed or not, or None if it has none"""
+    for compressed in (True, False):
+        path = shard_path(folder, case_id, compressed)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def claim(conn, case_id):
+    """Record in a shard which case it holds"""
+    conn.exec_driver_sql(f'CREATE TABLE IF NOT EXISTS main.{OWNER_TABLE} (case_id VARCHAR(50) NOT NULL)')
+    conn.exec_driver_sql(f'DELETE FROM main.{OWNER_TABLE}')
+    conn.exec_driver_sql(f'INSERT INTO main.{OWNER_TABLE} (case_id) VALUES (?)', (case_id,))
+
+
+def owner(path):
+    """Case recorded in a shard file by `claim`; None if there is no such file,
+    it is compressed or it records no case"""
+    if path.endswith('.gz') or not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (OWNER_TABLE,)).fetchone():
+            return None
+        row = conn.execute(f'SELECT case_id FROM {OWNER_TABLE}').fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def check_owner(path, case_id):
+    """Raise FileExistsError if the shard file at `path` holds another case"""
+    holder = owner(path)
+    if holder is not None and holder != case_id:
+        raise FileExistsError(f'Shard file {os.path.basename(path)} holds case {holder}, not {case_id}')
+
+
+def remove(path):
+    """Delete a database file and the journal files beside it"""
+    for name in (path, *(path + suffix for suffix in SIDE_FILES)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def create(path, build):
+    """Create a shard file, or open an existing one, and run `build(conn)` on it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    engine = create_engine('sqlite:///' + path)
+    try:
+        with engine.begin() as conn:
+            build(conn)
+    finally:
+        engine.dispose()
+
+
+def compact(source, target, finish=None):
+    """Write a vacuumed, read-only copy of the shard `source` to `target`.
+
+    `finish(conn)` runs on the copy first; VACUUM may renumber rowids, so
+    rowid-keyed indexes such as the full-text index must be rebuilt there.
+    A `target` ending in `.gz` is gzip-compressed.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    plain = target[:-3] if target.endswith('.gz') else target
+    partial = plain + '.partial'
+    remove(partial)
+    conn = sqlite3.connect(source, isolation_level=None)
+    try:
+        conn.execute('VACUUM INTO ?', (partial,))
+    finally:
+        conn.close()
+    if finish:
+        engine = create_engine('sqlite:///' + partial)
+        try:
+            with engine.begin() as conn:
+                finish(conn)
+        finally:
+            engine.dispose()
+        # Read-only connections cannot open a WAL database without its -shm file
+        conn = sqlite3.connect(partial, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            conn.close()
+    if target.endswith('.gz'):
+        with open(partial, 'rb') as raw, gzip.open(target + '.partial', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1 << 20)
+        os.replace(target + '.partial', target)
+        remove(partial)
+    else:
+        os.replace(partial, target)
+    os.chmod(target, 0o444)
+
+
+def thaw(source, target):
+    """Copy a cold shard back to a writable hot file"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + '.partial'
+    opener = gzip.open if source.endswith('.gz') else open
+    with opener(source, 'rb') as cold, open(partial, 'wb') as hot:
+        shutil.copyfileobj(cold, hot, 1 << 20)
+    os.replace(partial, target)
+
+
+class ShardPool:
+    """Bounded LRU of engines on shard files, each attaching the catalog.
+
+    Engines are created on first use; once more than `maxsize` are open the
+    least recently used is disposed. Connections it lent out keep working
+    until they are returned. Cold shards open read-only, compressed ones
+    from a copy unpacked to `cache_folder` that is removed with the engine.
+    """
+
+    def __init__(self, catalog, maxsize=32, cache_folder=None, **engine_options):
+        self.catalog = catalog
+        self.maxsize = maxsize
+        self.cache_folder = cache_folder
+        self.engine_options = engine_options
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, readonly=False):
+        with self.lock:
+            entry = self.engines.get(path)
+            if entry is None:
+                entry = self.engines[path] = self._open(path, readonly)
+            self.engines.move_to_end(path)
+            while len(self.engines) > self.maxsize:
+                self._close(*self.engines.popitem(last=False)[1])
+            return entry[0]
+
+    def release(self, path):
+        """Dispose the engine on `path`, e.g. before the file is moved or removed"""
+        with self.lock:
+            entry = self.engines.pop(path, None)
+        if entry:
+            self._close(*entry)
+
+    def stats(self):
+        with self.lock:
+            return {'open': len(self.engines), 'max': self.maxsize}
+
+    def _open(self, path, readonly):
+        unpacked = None
+        if path.endswith('.gz'):
+            unpacked = os.path.join(self.cache_folder, os.path.basename(path)[:-3])
+            if not os.path.exists(unpacked):
+                thaw(path, unpacked)
+            path = unpacked
+        url = f'sqlite:///file:{path}?mode=ro&uri=true' if readonly else 'sqlite:///' + path
+        engine = create_engine(url, **self.engine_options)
+
+        @event.listens_for(engine, 'connect')
+        def attach_catalog(dbapi_connection, connection_record):
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS {CATALOG_SCHEMA}', (self.catalog,))
+
+        return engine, unpacked
+
+    def _close(self, engine, unpacked):
+        engine.dispose()
+        if unpacked:
+            remove(unpacked)
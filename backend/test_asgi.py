@@ -0,0 +1,54 @@
+"""Tests for serving the app through the ASGI adapter.
+
+    python -m pytest test_asgi.py
+"""
+import asyncio
+import json
+
+import asgi
+
+
+async def _get(path):
+    """Status and body of a GET request sent through asgi.app"""
+    raw_path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': 'GET', 'path': raw_path, 'query_string': query.encode(),
+             'headers': [(b'host', b'testserver')], 'http_version': '1.1', 'client': ('127.0.0.1', 1234)}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_streamed_graph_keeps_request_context(client, monkeypatch):
+    # Small batches make each body many chunks
+    monkeypatch.setitem(asgi.flask_app.config, 'GRAPH_STREAM_BATCH_SIZE', 10)
+    assert client.post('/api/cases', json={'id': 'ASGI-1', 'title': 'ASGI'}).status_code == 201
+    client.post('/api/cases/ASGI-1/entities:bulk',
+                json=[{'id': f'asgi-n{i}', 'label': f'n{i}', 'type': 'phone'} for i in range(100)])
+    client.post('/api/cases/ASGI-1/connections:bulk',
+                json=[{'id': f'asgi-c{i}', 'source': f'asgi-n{i}', 'target': f'asgi-n{(i * 7) % 100}',
+                       'type': 'Call'} for i in range(200)])
+
+    async def stream_all():
+        # Concurrent streams spread each body's chunks over several worker threads
+        return await asyncio.gather(*(_get(f'/api/cases/ASGI-1/graph?format={response_format}')
+                                      for response_format in ('ndjson', 'stream') * 8))
+
+    try:
+        responses = asyncio.run(stream_all())
+    finally:
+        asgi.app.shutdown()
+    for status, body in responses:
+        assert status == 200
+        if body.startswith(b'{"kind"'):
+            kinds = [json.loads(line)['kind'] for line in body.splitlines()]
+            assert (kinds.count('node'), kinds.count('edge')) == (100, 200)
+        else:
+            graph = json.loads(body)
+            assert (len(graph['nodes']), len(graph['edges'])) == (100, 200)
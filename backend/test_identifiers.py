@@ -0,0 +1,35 @@
+"""Tests for cross-case identifier normalization and lookup.
+
+    python -m pytest test_identifiers.py
+"""
+import pytest
+
+import identifiers
+
+
+@pytest.mark.parametrize('value', [
+    '+91 90000 00002', '+91-90000-00002', '919000000002', '0091 9000000002', '09000000002', '9000000002',
+])
+def test_phone_formats_share_one_key(value):
+    assert identifiers.normalize('phone', value) == '+919000000002'
+
+
+def test_phone_keeps_other_country_codes():
+    assert identifiers.normalize('phone', '+44 7700 900123') == '+447700900123'
+    assert identifiers.normalize('phone', '447700900123') == '+447700900123'
+    assert identifiers.normalize('phone', '100') == '100'
+
+
+def test_lookup_matches_number_across_cases_in_different_formats(client):
+    for case_id, phone in (('ID-CASE-1', '+91 90000 00002'), ('ID-CASE-2', '09000000002')):
+        assert client.post('/api/cases', json={'id': case_id, 'title': case_id}).status_code == 201
+        response = client.post(f'/api/cases/{case_id}/entities', json={
+            'id': f'{case_id}-phone', 'label': phone, 'type': 'phone', 'metadata': {'phone': phone},
+        })
+        assert response.status_code == 201
+
+    for value in ('919000000002', '+91 90000-00002', '09000000002'):
+        matches = client.get('/api/entities/lookup', query_string={'value': value, 'kind': 'phone'}).json['matches']
+        assert {(match['case_id'], match['value']) for match in matches} == {
+            ('ID-CASE-1', '+919000000002'), ('ID-CASE-2', '+919000000002'),
+        }
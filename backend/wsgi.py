@@ -0,0 +1,31 @@
+"""Production entry point for the Forensi-Link API.
+
+Serves the app with waitress, a multi-threaded WSGI server that runs on both
+Windows and Linux:
+
+    python wsgi.py
+
+Any WSGI server can import `app` from here instead, for example
+`gunicorn -w 4 --threads 4 wsgi:app`; run `python migrate.py` once before
+starting several worker processes.
+"""
+import os
+
+from app import app, db
+
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    from migrate import run_migrations
+
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+
+    serve(
+        app,
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 5000)),
+        threads=int(os.environ.get('WSGI_THREADS', 8))
+    )
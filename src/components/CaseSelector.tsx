@@ -36,7 +36,7 @@ export const CaseSelector = ({
     const fetchCases = async () => {
       try {
         setIsLoading(true);
-        const cases = await api.getCases();
+        const cases = await api.getCases({ fields: ['id', 'title'] });
         setAvailableCases(cases.map((c: any) => ({ id: c.id, title: c.title })));
       } catch (error) {
         console.error('Failed to fetch cases:', error);
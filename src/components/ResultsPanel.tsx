@@ -33,7 +33,7 @@ export const ResultsPanel = ({ mode, isAnalyzing, hasResults }: ResultsPanelProp
       
       try {
         setIsLoadingGraph(true);
-        const response = await api.getCaseGraph('2025-047-VA');
+        const response = await api.getCaseGraph('2025-047-VA', undefined, true);
         const transformedData = transformGraphData(response);
         setGraphData(transformedData);
       } catch (error) {
@@ -33,10 +33,14 @@ export default function NetworkGraph({ data, timeFilter, activeCluster, pathHigh
         : data.edges
     };
 
+    // Use the backend's stored layout when every node has a position
+    const preset = filteredData.nodes.length > 0 && filteredData.nodes.every(n => n.position);
+
     const cy = cytoscape({
       container: containerRef.current,
       elements: [
         ...filteredData.nodes.map(node => ({
+          position: node.position,
           data: {
             id: node.id,
             label: node.label,
@@ -140,7 +144,7 @@ export default function NetworkGraph({ data, timeFilter, activeCluster, pathHigh
           }
         }
       ],
-      layout: {
+      layout: preset ? { name: 'preset', fit: true } : {
         name: 'cose-bilkent' as any,
         // The following options are specific to cose-bilkent but types may not include them; cast to any if needed.
         nodeDimensionsIncludeLabels: true as any,
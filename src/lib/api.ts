@@ -10,8 +10,9 @@ export const api = {
   },
 
   // Cases
-  async getCases() {
-    const response = await fetch(`${API_BASE_URL}/cases`);
+  async getCases(params?: { fields?: string[] }) {
+    const query = params?.fields ? `?fields=${params.fields.join(',')}` : '';
+    const response = await fetch(`${API_BASE_URL}/cases${query}`);
     if (!response.ok) throw new Error('Failed to fetch cases');
     return response.json();
   },
@@ -22,12 +23,115 @@ export const api = {
     return response.json();
   },
 
-  async getCaseGraph(caseId: string) {
-    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph`);
+  // With `layout`, nodes carry the positions stored by the backend layout
+  async getCaseGraph(caseId: string, window?: { from?: Date; to?: Date }, layout = false) {
+    const queryParams = new URLSearchParams();
+    if (window?.from) queryParams.append('from', window.from.toISOString());
+    if (window?.to) queryParams.append('to', window.to.toISOString());
+    if (layout) queryParams.append('layout', 'true');
+
+    const query = queryParams.toString() ? `?${queryParams.toString()}` : '';
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph${query}`);
+    if (!response.ok) throw new Error(`Failed to fetch graph for case ${caseId}`);
+    return response.json();
+  },
+
+  // Compact columnar graph (see backend/graph_codec.py); decode with transformColumnarGraph
+  async getCaseGraphColumnar(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph`, {
+      headers: { Accept: 'application/vnd.forensilink.columnar+json' },
+    });
+    if (!response.ok) throw new Error(`Failed to fetch graph for case ${caseId}`);
+    return response.json();
+  },
+
+  // Stored node positions; null while the first layout is being computed
+  async getCaseLayout(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/layout`);
+    if (response.status === 202) return null;
+    if (!response.ok) throw new Error(`Failed to fetch layout for case ${caseId}`);
+    return response.json();
+  },
+
+  // Rows changed since the `seq` of a graph response (or of the previous call)
+  async getCaseGraphChanges(caseId: string, since: number) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph/changes?since=${since}`);
+    if (!response.ok) throw new Error(`Failed to fetch graph changes for case ${caseId}`);
+    return response.json();
+  },
+
+  // Live changes of a case as they commit, starting after `since` (the seq of
+  // the graph already loaded); missed ranges are fetched from /graph/changes.
+  // Returns a function closing the stream.
+  streamCaseChanges(caseId: string, since: number, onChanges: (changes: any) => void) {
+    const source = new EventSource(`${API_BASE_URL}/cases/${caseId}/stream?since=${since}`);
+    source.addEventListener('changes', (event) => onChanges(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('resync', async (event) => {
+      let cursor = JSON.parse((event as MessageEvent).data).since;
+      let page;
+      do {
+        page = await api.getCaseGraphChanges(caseId, cursor);
+        onChanges(page);
+        cursor = page.seq;
+      } while (page.has_more);
+    });
+    return () => source.close();
+  },
+
+  // Supernode view of a large case: one node per entity type or community
+  async getCaseGraphLod(caseId: string, lod: 'type' | 'community') {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph?lod=${lod}`);
+    if (response.status === 202) return null; // communities are still being computed
     if (!response.ok) throw new Error(`Failed to fetch graph for case ${caseId}`);
     return response.json();
   },
 
+  async expandSupernode(caseId: string, supernodeId: string) {
+    const response = await fetch(
+      `${API_BASE_URL}/cases/${caseId}/graph/supernodes/${encodeURIComponent(supernodeId)}`
+    );
+    if (!response.ok) throw new Error(`Failed to expand ${supernodeId}`);
+    return response.json();
+  },
+
+  // Subgraphs matching a typed node/edge pattern (see backend/pattern.py)
+  async matchPattern(caseId: string, pattern: Record<string, unknown>) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/match`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(pattern),
+    });
+    const body = await response.json();
+    if (!response.ok) throw new Error(body.error || `Failed to match pattern in case ${caseId}`);
+    return body;
+  },
+
+  // Connection counts per day or hour, by connection type
+  async getTimeline(caseId: string, bucket: 'day' | 'hour' = 'day') {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/timeline?bucket=${bucket}`);
+    if (!response.ok) throw new Error(`Failed to fetch timeline for case ${caseId}`);
+    return response.json();
+  },
+
+  // Stream a case graph as NDJSON, handing each parsed batch of lines to onBatch
+  async streamCaseGraph(caseId: string, onBatch: (items: any[]) => void) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/graph?format=ndjson`);
+    if (!response.ok || !response.body) throw new Error(`Failed to stream graph for case ${caseId}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = done ? '' : lines.pop() ?? '';
+      const items = lines.filter((line) => line.trim()).map((line) => JSON.parse(line));
+      if (items.length) onBatch(items);
+      if (done) break;
+    }
+  },
+
   async createCase(caseData: {
     id: string;
     title: string;
@@ -65,6 +169,8 @@ export const api = {
     return response.json();
   },
 
+  // Deleting, archiving and restoring run in the background: each returns a
+  // job to poll with getJob; the case is gone or moved once it completes
   async deleteCase(caseId: string) {
     const response = await fetch(`${API_BASE_URL}/cases/${caseId}`, {
       method: 'DELETE',
@@ -73,6 +179,92 @@ export const api = {
     return response.json();
   },
 
+  async archiveCase(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/archive`, {
+      method: 'POST',
+    });
+    if (!response.ok) throw new Error(`Failed to archive case ${caseId}`);
+    return response.json();
+  },
+
+  async restoreCase(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/restore`, {
+      method: 'POST',
+    });
+    if (!response.ok) throw new Error(`Failed to restore case ${caseId}`);
+    return response.json();
+  },
+
+  async shardCase(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/shard`, {
+      method: 'POST',
+    });
+    if (!response.ok) throw new Error(`Failed to move case ${caseId} to a shard`);
+    return response.json();
+  },
+
+  // Cross-case identifiers: every entity holding a phone, IMEI, email or wallet
+  async lookupIdentifier(value: string, kind?: string) {
+    const queryParams = new URLSearchParams({ value });
+    if (kind) queryParams.append('kind', kind);
+
+    const response = await fetch(`${API_BASE_URL}/entities/lookup?${queryParams.toString()}`);
+    if (!response.ok) throw new Error(`Failed to look up ${value}`);
+    return response.json();
+  },
+
+  async getCaseLinks(caseId: string) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/links`);
+    if (!response.ok) throw new Error(`Failed to fetch links for case ${caseId}`);
+    return response.json();
+  },
+
+  // Extraction ingest: upload a UFDR file, then poll the returned job
+  async uploadExtraction(caseId: string, file: File) {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/ingest`, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!response.ok) throw new Error(`Failed to upload extraction for case ${caseId}`);
+    return response.json();
+  },
+
+  async getJob(jobId: string) {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    if (!response.ok) throw new Error(`Failed to fetch job ${jobId}`);
+    return response.json();
+  },
+
+  // Graph traversal
+  async getPath(caseId: string, source: string, target: string, options?: { maxHops?: number; weighted?: boolean }) {
+    const queryParams = new URLSearchParams({ source, target });
+    if (options?.maxHops) queryParams.append('max_hops', String(options.maxHops));
+    if (options?.weighted) queryParams.append('weighted', 'true');
+
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/paths?${queryParams.toString()}`);
+    if (!response.ok) throw new Error(`Failed to find path in case ${caseId}`);
+    return response.json();
+  },
+
+  async getNeighbors(caseId: string, entityId: string, hops = 1) {
+    const response = await fetch(`${API_BASE_URL}/cases/${caseId}/neighbors/${entityId}?hops=${hops}`);
+    if (!response.ok) throw new Error(`Failed to fetch neighbors of ${entityId}`);
+    return response.json();
+  },
+
+  // Fetch one keyset page of a list endpoint, e.g. listPage('cases/2025-047-VA/connections')
+  async listPage(path: string, params: { limit: number; after?: string | null; fields?: string[] }) {
+    const queryParams = new URLSearchParams({ limit: String(params.limit) });
+    if (params.after) queryParams.append('after', params.after);
+    if (params.fields) queryParams.append('fields', params.fields.join(','));
+
+    const response = await fetch(`${API_BASE_URL}/${path}?${queryParams.toString()}`);
+    if (!response.ok) throw new Error(`Failed to fetch ${path}`);
+    return response.json() as Promise<{ items: any[]; next_cursor: string | null }>;
+  },
+
   // Search cases
   async searchCases(params?: {
     status?: string;
@@ -92,6 +284,24 @@ export const api = {
     return response.json();
   },
 
+  // Case counts per status, crime type and officer, under the same filters as searchCases
+  async getCaseFacets(params?: {
+    status?: string;
+    crime_type?: string;
+    officer_id?: string;
+    search?: string;
+  }) {
+    const queryParams = new URLSearchParams();
+    for (const [name, value] of Object.entries(params ?? {})) {
+      if (value) queryParams.append(name, value);
+    }
+
+    const url = `${API_BASE_URL}/search/facets${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
+    const response = await fetch(url);
+    if (!response.ok) throw new Error('Failed to fetch case facets');
+    return response.json();
+  },
+
   // Entities
   async getEntities(caseId: string) {
     const response = await fetch(`${API_BASE_URL}/cases/${caseId}/entities`);
@@ -158,6 +368,7 @@ export function transformGraphData(apiResponse: any) {
       icon: node.icon,
       metadata: node.metadata,
       timestamp: node.timestamp ? new Date(node.timestamp) : undefined,
+      position: node.x != null && node.y != null ? { x: node.x, y: node.y } : undefined,
     })),
     edges: apiResponse.edges.map((edge: any) => ({
       id: edge.id,
@@ -170,3 +381,50 @@ export function transformGraphData(apiResponse: any) {
     })),
   };
 }
+
+// Transform a columnar graph payload to the same GraphData shape
+export function transformColumnarGraph(columnar: any) {
+  const { ids, nodes, edges } = columnar;
+  const decode = (column: { values: any[]; codes: number[] }, i: number) => column.values[column.codes[i]];
+  const toDate = (ms: number | null) => (ms === null ? undefined : new Date(ms));
+
+  return {
+    nodes: Array.from({ length: nodes.count }, (_, i) => ({
+      id: ids[i],
+      label: nodes.label[i],
+      type: decode(nodes.type, i),
+      size: nodes.size[i],
+      icon: decode(nodes.icon, i),
+      metadata: nodes.metadata[i],
+      timestamp: toDate(nodes.timestamp[i]),
+      position: nodes.x?.[i] != null ? { x: nodes.x[i], y: nodes.y[i] } : undefined,
+    })),
+    edges: Array.from({ length: edges.count }, (_, i) => ({
+      id: edges.id[i],
+      source: ids[edges.source[i]],
+      target: ids[edges.target[i]],
+      type: decode(edges.type, i),
+      weight: edges.weight[i],
+      data: edges.data[i],
+      timestamp: toDate(edges.timestamp[i]),
+    })),
+  };
+}
+
+// Apply a /graph/changes response to a graph from transformGraphData
+export function applyGraphChanges(graph: ReturnType<typeof transformGraphData>, changes: any) {
+  const changed = transformGraphData(changes);
+  const merge = <T extends { id: string }>(items: T[], updates: T[], removed: string[]) => {
+    const byId = new Map(items.map((item) => [item.id, item]));
+    removed.forEach((id) => byId.delete(id));
+    updates.forEach((item) => byId.set(item.id, item));
+    return Array.from(byId.values());
+  };
+  // Changed rows carry no layout; updated nodes keep the position they had
+  const positioned = new Map(graph.nodes.map((node) => [node.id, node.position]));
+  changed.nodes.forEach((node) => { node.position = node.position ?? positioned.get(node.id); });
+  return {
+    nodes: merge(graph.nodes, changed.nodes, changes.removed.nodes),
+    edges: merge(graph.edges, changed.edges, changes.removed.edges),
+  };
+}
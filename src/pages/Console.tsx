@@ -19,7 +19,7 @@ const Console = () => {
   useEffect(() => {
     const fetchCaseData = async () => {
       try {
-        const response = await api.getCaseGraph('2025-047-VA');
+        const response = await api.getCaseGraph('2025-047-VA', undefined, true);
         const caseResponse = await api.getCase('2025-047-VA');
         setGraphData(transformGraphData(response));
         setCaseInfo(caseResponse.case);
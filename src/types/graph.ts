@@ -8,6 +8,8 @@ export interface GraphNode {
   icon: string;
   metadata: Record<string, any>;
   timestamp?: Date;
+  // Server-side layout position, when the graph was fetched with a layout
+  position?: { x: number; y: number };
 }
 
 export interface GraphEdge {